@@ -1,4 +1,5 @@
-from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import *
+from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import main_logic_flow
+import sys
 
 
 # this will first run the initial setup a single time then will loop over the main logic loop flow forever
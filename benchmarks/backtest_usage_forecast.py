@@ -0,0 +1,118 @@
+"""
+    Replay recorded node group usage through the reactive (threshold only) & the forecasting scale up decisions &
+    measure how long each leaves the node group under provisioned every time the usage crosses the threshold, run from
+    the repo root with "python -m benchmarks.backtest_usage_forecast [usage_history.json]"
+
+    the recorded usage is a usage history JSON as saved by the "file" usage_history_store, when no file is given a
+    synthetic 3 day series with a daily ramp is replayed instead
+"""
+from spotinst_kubernetes_cluster_autoscaler.usage_forecast import forecast_usage
+import argparse
+import json
+import math
+import random
+
+SYNTHETIC_DAYS = 3
+SYNTHETIC_INTERVAL_SECONDS = 60
+
+
+def synthetic_usage(days: int = SYNTHETIC_DAYS, interval_seconds: int = SYNTHETIC_INTERVAL_SECONDS) -> list:
+    """
+        A daily cycle of usage between ~30% at night & ~95% at the daily peak with some noise, one sample every
+        interval_seconds
+    """
+    random.seed(42)
+    samples = []
+    for sample_time in range(0, days * 86400, interval_seconds):
+        daily_phase = math.sin(2 * math.pi * (sample_time % 86400) / 86400 - math.pi / 2)
+        cpu = 62 + 33 * daily_phase + random.gauss(0, 2)
+        memory = 55 + 25 * daily_phase + random.gauss(0, 2)
+        samples.append((sample_time, cpu, memory))
+    return samples
+
+
+def replay(samples: list, method: str, horizon_seconds: float, boot_seconds: float, window_seconds: float,
+           max_cpu_usage: float, max_memory_usage: float, alpha: float, beta: float) -> dict:
+    """
+        Replay the samples in order, at each one deciding to scale up the way the autoscaler would (reactive on the
+        sample itself & forecasting on the window of samples up to it), then for every crossing of the threshold
+        measure how many seconds pass between the crossing & a node started by that decision being ready
+    """
+    reactive_triggers = []
+    forecast_triggers = []
+    for index, (sample_time, cpu, memory) in enumerate(samples):
+        reactive_trigger = cpu >= max_cpu_usage or memory >= max_memory_usage
+        window = [sample for sample in samples[:index + 1] if sample_time - sample[0] <= window_seconds]
+        forecast_cpu, forecast_memory = forecast_usage(window, method=method, horizon_seconds=horizon_seconds,
+                                                       alpha=alpha, beta=beta)
+        reactive_triggers.append(reactive_trigger)
+        forecast_triggers.append(reactive_trigger or forecast_cpu >= max_cpu_usage or
+                                 forecast_memory >= max_memory_usage)
+
+    # noise around the threshold isn't a new ramp, only crossings after window_seconds below the threshold count
+    crossings = []
+    last_reactive_trigger_time = None
+    for index, (sample_time, _, _) in enumerate(samples):
+        if reactive_triggers[index] is True:
+            if last_reactive_trigger_time is None or sample_time - last_reactive_trigger_time > window_seconds:
+                crossings.append(index)
+            last_reactive_trigger_time = sample_time
+    reactive_under_provisioned = []
+    forecast_under_provisioned = []
+    early_triggers = set()
+    for crossing_index in crossings:
+        crossing_time = samples[crossing_index][0]
+        # the forecast decision is the start of the run of forecast triggers leading up to the crossing
+        decision_index = crossing_index
+        while decision_index > 0 and forecast_triggers[decision_index - 1] is True and \
+                reactive_triggers[decision_index - 1] is False:
+            decision_index -= 1
+            early_triggers.add(decision_index)
+        reactive_under_provisioned.append(boot_seconds)
+        forecast_under_provisioned.append(max(samples[decision_index][0] + boot_seconds - crossing_time, 0))
+
+    false_alarms = sum(1 for index in range(len(samples)) if forecast_triggers[index] and
+                       not reactive_triggers[index] and index not in early_triggers)
+    return {
+        "samples": len(samples),
+        "crossings": len(crossings),
+        "reactive_under_provisioned_seconds": sum(reactive_under_provisioned),
+        "forecast_under_provisioned_seconds": sum(forecast_under_provisioned),
+        "forecast_false_alarm_samples": false_alarms
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="backtest the scale up usage forecast against recorded usage")
+    parser.add_argument("history", nargs="?", help="usage history JSON file, defaults to a synthetic daily cycle")
+    parser.add_argument("--group", help="the node group (elastigroup ID) of the history to replay, defaults to all")
+    parser.add_argument("--method", default="holt", choices=["linear", "holt"])
+    parser.add_argument("--horizon-seconds", type=float, default=240)
+    parser.add_argument("--boot-seconds", type=float, default=240)
+    parser.add_argument("--window-seconds", type=float, default=600)
+    parser.add_argument("--max-cpu-usage", type=float, default=80)
+    parser.add_argument("--max-memory-usage", type=float, default=80)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--beta", type=float, default=0.3)
+    arguments = parser.parse_args()
+
+    if arguments.history is None:
+        series = {"synthetic": synthetic_usage()}
+    else:
+        with open(arguments.history) as history_file:
+            series = {group_name: [tuple(sample) for sample in group_samples]
+                      for group_name, group_samples in json.load(history_file).items()
+                      if arguments.group is None or group_name == arguments.group}
+
+    for group_name, group_samples in series.items():
+        results = replay(group_samples, method=arguments.method, horizon_seconds=arguments.horizon_seconds,
+                         boot_seconds=arguments.boot_seconds, window_seconds=arguments.window_seconds,
+                         max_cpu_usage=arguments.max_cpu_usage, max_memory_usage=arguments.max_memory_usage,
+                         alpha=arguments.alpha, beta=arguments.beta)
+        print(group_name + " (" + str(results["samples"]) + " samples, " + str(results["crossings"]) +
+              " threshold crossings, " + arguments.method + " forecast)")
+        print("reactive under provisioned:    " + str(round(results["reactive_under_provisioned_seconds"])) +
+              " seconds")
+        print("forecasting under provisioned: " + str(round(results["forecast_under_provisioned_seconds"])) +
+              " seconds")
+        print("forecast false alarm samples:  " + str(results["forecast_false_alarm_samples"]))
@@ -0,0 +1,107 @@
+"""
+    Run a full scaling decision against a synthetic cluster of any size served by a local stand in for the kubernetes,
+    metrics-server & spotinst APIs & report the wall time, peak RSS & number of API requests it took, run from the repo
+    root with "python -m benchmarks.benchmark_large_cluster --nodes 10000 --pods 300000"
+
+    the legacy per call KubeGetScaleData methods (get_cpu_and_mem_usage & check_pods_stuck_do_to_insufficient_resource)
+    are measured the same way after the full decision, run with --help for the cluster shape & autoscaler options
+"""
+from benchmarks.synthetic_cluster import SyntheticCluster, start_fake_api_server
+from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import create_kube_connection, \
+    create_spotinst_connections, read_configurations, run_scaling_decision
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import urllib.request
+
+
+def peak_rss_mb() -> float:
+    """
+        The peak resident memory of this process so far in MB (ru_maxrss is in KB on linux)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def request_counts(server_url: str) -> dict:
+    """
+        The number of requests the fake API server got so far, per API call
+    """
+    with urllib.request.urlopen(server_url + "/benchmark/requests") as response:
+        return json.loads(response.read())
+
+
+def measure(name: str, server_url: str, call) -> dict:
+    """
+        Run a call & measure the wall time, the peak RSS after it & the API requests it made
+    """
+    requests_before = request_counts(server_url)
+    start_time = time.perf_counter()
+    call()
+    wall_seconds = time.perf_counter() - start_time
+    requests_after = request_counts(server_url)
+    return {
+        "name": name,
+        "wall_seconds": wall_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "requests": {api: requests_after[api] - requests_before.get(api, 0) for api in sorted(requests_after)
+                     if requests_after[api] != requests_before.get(api, 0)}
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark a scaling decision against a synthetic large cluster")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--pods", type=int, default=30000)
+    parser.add_argument("--pending-pods", type=int, default=1000)
+    parser.add_argument("--node-groups", type=int, default=1, help="split the nodes between this many node groups")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--raw-json", action="store_true", help="read pods & nodes without the client models")
+    parser.add_argument("--skip-legacy", action="store_true", help="don't measure the legacy per call methods")
+    arguments = parser.parse_args()
+
+    cluster = SyntheticCluster(nodes=arguments.nodes, pods=arguments.pods, pending_pods=arguments.pending_pods,
+                               node_groups=arguments.node_groups)
+    server_process, server_url = start_fake_api_server(cluster)
+    try:
+        os.environ.update({
+            "KUBE_API_ENDPOINT": server_url,
+            "KUBE_TOKEN": "benchmark",
+            "SPOTINST_TOKEN": "benchmark",
+            "SPOTINST_API_URL": server_url,
+            "SPOTINST_ACCOUNT": "act-benchmark",
+            "ELASTIGROUP_ID": "sig-benchmark",
+            "LIST_PAGE_SIZE": str(arguments.page_size),
+            "RAW_JSON_LISTING": str(arguments.raw_json),
+            "MAX_NODE_COUNT": str(arguments.nodes * 2)
+        })
+        with tempfile.TemporaryDirectory() as empty_config_dir:
+            configuration = read_configurations(empty_config_dir)
+        if arguments.node_groups > 1:
+            configuration["node_groups"] = [{"elastigroup_id": "sig-benchmark-" + str(group),
+                                             "node_selector_label": "node-group=group-" + str(group)}
+                                            for group in range(arguments.node_groups)]
+        kube_connection = create_kube_connection(configuration)
+        spotinst_connections = create_spotinst_connections(configuration)
+        baseline_rss_mb = peak_rss_mb()
+
+        results = [measure("scaling_decision", server_url, lambda: run_scaling_decision(
+            configuration, kube_connection, spotinst_connections))]
+        if arguments.skip_legacy is False:
+            results.append(measure("get_cpu_and_mem_usage", server_url, kube_connection.get_cpu_and_mem_usage))
+            results.append(measure("check_pods_stuck_do_to_insufficient_resource", server_url,
+                                   kube_connection.check_pods_stuck_do_to_insufficient_resource))
+    finally:
+        server_process.terminate()
+
+    print()
+    print("cluster of " + str(arguments.nodes) + " nodes, " + str(arguments.pods) + " running pods & " +
+          str(arguments.pending_pods) + " pending pods in " + str(arguments.node_groups) + " node groups (page size " +
+          str(arguments.page_size) + ", raw json " + str(arguments.raw_json) + ")")
+    print("baseline peak RSS: " + str(round(baseline_rss_mb, 1)) + " MB")
+    for result in results:
+        print(result["name"] + ": " + str(round(result["wall_seconds"], 3)) + " seconds, peak RSS " +
+              str(round(result["peak_rss_mb"], 1)) + " MB, requests " +
+              ", ".join(api + "=" + str(count) for api, count in result["requests"].items()))
@@ -0,0 +1,52 @@
+"""
+    Compare the kubernetes quantity parser against the si_prefix based unit_converter it replaced, run from the repo
+    root with "python -m benchmarks.benchmark_quantity_parser"
+"""
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_quantity import parse_quantity
+from si_prefix import si_parse
+import random
+import timeit
+
+# the mix of quantity strings a real cluster repeats over & over again
+QUANTITIES = ["100m", "250m", "500m", "1", "2", "1500m", "64Mi", "128Mi", "256Mi", "512Mi", "1Gi", "2Gi", "4Gi",
+              "8039352Ki", "3920m", "123456789n", "16Gi", "100Mi", "50m", "10m"]
+SAMPLE_SIZE = 100000
+REPEATS = 5
+
+
+def legacy_unit_converter(unit_added_string: str) -> float:
+    """
+        the unit_converter implementation before the kubernetes quantity parser was added
+    """
+    custom_unit_ratio = {
+        "Ki": 1024,
+        "Mi": 1024 * 1024,
+        "Gi": 1024 * 1024 * 1024
+    }
+    try:
+        unit_in_float = float(si_parse(unit_added_string))
+    except AttributeError:
+        if unit_added_string[-2:] in custom_unit_ratio:
+            unit_in_float = float(unit_added_string[:-2]) * custom_unit_ratio[unit_added_string[-2:]]
+        else:
+            raise TypeError
+    return unit_in_float
+
+
+def run_benchmark(parse_function) -> float:
+    """
+        Parse SAMPLE_SIZE random quantities REPEATS times & return the best time in seconds
+    """
+    random.seed(42)
+    sample = [random.choice(QUANTITIES) for _ in range(SAMPLE_SIZE)]
+    return min(timeit.repeat(lambda: [parse_function(quantity) for quantity in sample], number=1, repeat=REPEATS))
+
+
+if __name__ == "__main__":
+    legacy_seconds = run_benchmark(legacy_unit_converter)
+    parse_quantity.cache_clear()
+    new_seconds = run_benchmark(parse_quantity)
+    print("parsing " + str(SAMPLE_SIZE) + " quantities (best of " + str(REPEATS) + ")")
+    print("legacy unit_converter: " + str(round(legacy_seconds, 4)) + " seconds")
+    print("parse_quantity:        " + str(round(new_seconds, 4)) + " seconds")
+    print("speedup:               " + str(round(legacy_seconds / new_seconds, 1)) + "x")
@@ -0,0 +1,61 @@
+"""
+    Measure the cold start of the cronjob entry point, each repeat runs in a fresh python process & measures how long
+    importing main_logic_flow & reading the configuration take & which optional heavy modules got imported on the way,
+    run from the repo root with "python -m benchmarks.benchmark_startup --config-dir config"
+
+    for a per module breakdown of the import time run "python -X importtime autoscaler_runner.py" instead
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# modules only needed when a feature using them is configured, none of them should be imported by a plain start up
+OPTIONAL_MODULES = ("prometheus_client", "pstats")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import read_configurations
+imported_time = time.perf_counter()
+read_configurations(sys.argv[1])
+configured_time = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported_time - start_time,
+    "read_configurations_seconds": configured_time - imported_time,
+    "optional_modules_imported": [module for module in sys.argv[2:] if module in sys.modules]
+}))
+"""
+
+
+def measure_startup(config_dir: str) -> dict:
+    """
+        Start a fresh python process, import main_logic_flow & read the configuration in it
+    """
+    start_time = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, config_dir] + list(OPTIONAL_MODULES),
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start_time
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the cold start of the autoscaler")
+    parser.add_argument("--config-dir", help="the config folder to read, defaults to an empty one")
+    parser.add_argument("--repeats", type=int, default=5, help="the best of this many fresh processes is reported")
+    arguments = parser.parse_args()
+
+    os.environ.setdefault("SPOTINST_TOKEN", "benchmark")
+    os.environ.setdefault("ELASTIGROUP_ID", "sig-benchmark")
+    with tempfile.TemporaryDirectory() as empty_config_dir:
+        config_dir = arguments.config_dir or empty_config_dir
+        results = [measure_startup(config_dir) for _ in range(arguments.repeats)]
+
+    print("best of " + str(arguments.repeats) + " fresh processes")
+    for measurement in ("process_seconds", "import_seconds", "read_configurations_seconds"):
+        print(measurement + ": " + str(round(min(result[measurement] for result in results) * 1000, 1)) + " ms")
+    print("optional modules imported: " + (", ".join(results[0]["optional_modules_imported"]) or "none"))
@@ -0,0 +1,289 @@
+"""
+    A synthetic kubernetes cluster of any size & a local stand in for the kubernetes, metrics-server & spotinst APIs
+    serving it, used by the benchmarks to run the autoscaler against clusters far larger then the test fixtures
+
+    every node, pod & metric is generated from its index alone (no randomness & nothing held in memory) so a cluster of
+    10k nodes & 300k pods costs the server nothing until it's listed & every run is against the exact same cluster
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import multiprocessing
+import threading
+
+# (instance type, allocatable cpu, allocatable memory) of the node instance types, as reported by real nodes
+INSTANCE_TYPES = [("m5.xlarge", "3920m", "15896232Ki"), ("m5.2xlarge", "7910m", "31889568Ki"),
+                  ("c5.4xlarge", "15890m", "31376236Ki"), ("r5.2xlarge", "7910m", "64313856Ki")]
+ZONES = ["us-east-1a", "us-east-1b", "us-east-1c"]
+CPU_REQUESTS = ["10m", "50m", "100m", "100m", "250m", "250m", "500m", "1", "1500m", "2"]
+MEMORY_REQUESTS = ["32Mi", "64Mi", "128Mi", "128Mi", "256Mi", "512Mi", "1Gi", "1Gi", "2Gi", "4Gi"]
+INSUFFICIENT_RESOURCES = ["cpu", "memory", "cpu, {0} Insufficient memory", "nvidia.com/gpu", "ephemeral-storage"]
+CREATION_TIMESTAMP = "2021-05-26T08:00:00Z"
+PENDING_SINCE = "2021-05-26T08:47:02Z"
+
+
+class SyntheticCluster:
+    """
+       Generates the kubernetes API JSON of each node, pod & node metric of a synthetic cluster by their index
+    """
+
+    def __init__(self, nodes: int, pods: int, pending_pods: int, node_groups: int = 1):
+        """
+           Arguments:
+               :param nodes: the number of nodes in the cluster
+               :param pods: the number of running pods, spread evenly across the nodes
+               :param pending_pods: the number of pending pods, most of them unschedulable due to lack of resources
+               :param node_groups: the number of node groups the nodes are split between by their "node-group" label
+        """
+        self.nodes = nodes
+        self.pods = pods
+        self.pending_pods = pending_pods
+        self.node_groups = node_groups
+
+    def node_name(self, index: int) -> str:
+        return "ip-10-" + str(index // 65536 % 256) + "-" + str(index // 256 % 256) + "-" + str(index % 256) + \
+            ".ec2.internal"
+
+    def node(self, index: int) -> dict:
+        instance_type, allocatable_cpu, allocatable_memory = INSTANCE_TYPES[index % len(INSTANCE_TYPES)]
+        return {
+            "metadata": {
+                "name": self.node_name(index),
+                "uid": "node-" + str(index),
+                "creationTimestamp": CREATION_TIMESTAMP,
+                "labels": {
+                    "kubernetes.io/hostname": self.node_name(index),
+                    "kubernetes.io/os": "linux",
+                    "node.kubernetes.io/instance-type": instance_type,
+                    "topology.kubernetes.io/zone": ZONES[index % len(ZONES)],
+                    "node-group": "group-" + str(index % self.node_groups)
+                }
+            },
+            "status": {
+                "allocatable": {"cpu": allocatable_cpu, "memory": allocatable_memory, "pods": "110",
+                                "ephemeral-storage": "95551679124"},
+                "capacity": {"cpu": allocatable_cpu, "memory": allocatable_memory, "pods": "110"}
+            }
+        }
+
+    def container(self, name: str, index: int) -> dict:
+        return {
+            "name": name,
+            "image": "registry.example.com/service-" + str(index % 50) + ":1.0." + str(index % 7),
+            "resources": {
+                "requests": {"cpu": CPU_REQUESTS[index % len(CPU_REQUESTS)],
+                             "memory": MEMORY_REQUESTS[index * 3 % len(MEMORY_REQUESTS)]},
+                "limits": {"memory": MEMORY_REQUESTS[(index * 3 + 1) % len(MEMORY_REQUESTS)]}
+            }
+        }
+
+    def pod_spec(self, index: int) -> dict:
+        spec = {"containers": [self.container("app-" + str(container), index + container)
+                               for container in range(1 + index % 3)]}
+        # every 10th pod has an init container, every 5th a node selector & every 7th a node affinity
+        if index % 10 == 0:
+            spec["initContainers"] = [self.container("init", index + 5)]
+        if index % 5 == 0:
+            spec["nodeSelector"] = {"node-group": "group-" + str(index % self.node_groups)}
+        if index % 7 == 0:
+            spec["affinity"] = {"nodeAffinity": {"requiredDuringSchedulingIgnoredDuringExecution": {
+                "nodeSelectorTerms": [{"matchExpressions": [{
+                    "key": "topology.kubernetes.io/zone", "operator": "In", "values": [ZONES[index % len(ZONES)]]
+                }]}]
+            }}}
+        return spec
+
+    def pod_metadata(self, name: str, index: int) -> dict:
+        metadata = {
+            "name": name,
+            "namespace": "namespace-" + str(index % 40),
+            "uid": name,
+            "creationTimestamp": CREATION_TIMESTAMP,
+            "labels": {"app": "service-" + str(index % 50), "pod-template-hash": "5d8f7c9b" + str(index % 10)},
+            "ownerReferences": [{"apiVersion": "apps/v1", "kind": "ReplicaSet", "name": "service-" + str(index % 50),
+                                 "uid": "replicaset-" + str(index % 50), "controller": True}]
+        }
+        # every 20th pod belongs to a DaemonSet so it isn't moved when its node is removed
+        if index % 20 == 0:
+            metadata["ownerReferences"][0]["kind"] = "DaemonSet"
+        return metadata
+
+    def running_pod(self, index: int) -> dict:
+        name = "running-" + str(index)
+        spec = self.pod_spec(index)
+        spec["nodeName"] = self.node_name(index % self.nodes)
+        return {
+            "metadata": self.pod_metadata(name, index),
+            "spec": spec,
+            "status": {
+                "phase": "Running",
+                "conditions": [{"type": "PodScheduled", "status": "True", "lastTransitionTime": CREATION_TIMESTAMP},
+                               {"type": "Ready", "status": "True", "lastTransitionTime": CREATION_TIMESTAMP}]
+            }
+        }
+
+    def pending_pod(self, index: int) -> dict:
+        name = "pending-" + str(index)
+        # every 4th pending pod was already scheduled & is only waiting for its containers to start
+        if index % 4 == 3:
+            condition = {"type": "PodScheduled", "status": "True", "lastTransitionTime": PENDING_SINCE}
+        else:
+            insufficient = INSUFFICIENT_RESOURCES[index % len(INSUFFICIENT_RESOURCES)].format(self.nodes)
+            condition = {"type": "PodScheduled", "status": "False", "reason": "Unschedulable",
+                         "lastTransitionTime": PENDING_SINCE,
+                         "message": "0/" + str(self.nodes) + " nodes are available: " + str(self.nodes) +
+                                    " Insufficient " + insufficient + "."}
+        return {
+            "metadata": self.pod_metadata(name, index),
+            "spec": self.pod_spec(index),
+            "status": {"phase": "Pending", "conditions": [condition]}
+        }
+
+    def node_metric(self, index: int) -> dict:
+        # between 40% & 70% of a 4 core/16Gi node used
+        return {
+            "metadata": {"name": self.node_name(index), "creationTimestamp": CREATION_TIMESTAMP},
+            "timestamp": CREATION_TIMESTAMP,
+            "window": "20s",
+            "usage": {"cpu": str(1600000000 + index % 31 * 40000000) + "n",
+                      "memory": str(6400000 + index % 29 * 160000) + "Ki"}
+        }
+
+    def list_node_metrics(self, label_selector: str = None) -> list:
+        """
+            Arguments:
+                :param label_selector: optional "key=value" selector to filter the metrics by the labels of their node
+
+            Returns:
+                :return the metrics-server metrics of the matching nodes
+        """
+        selector = dict([label_selector.split("=", 1)]) if label_selector else {}
+        return [self.node_metric(index) for index in range(self.nodes)
+                if selector.items() <= self.node(index)["metadata"].get("labels", {}).items()]
+
+    def list_objects(self, kind: str, offset: int, limit: int, label_selector: str = None) -> tuple:
+        """
+            Generate a single page of a kubernetes LIST
+
+            Arguments:
+                :param kind: "nodes", "running_pods" or "pending_pods"
+                :param offset: the index to start the page at (the continue token of the previous page)
+                :param limit: the maximum number of objects in the page, 0 for all of them
+                :param label_selector: optional "key=value" selector to filter the objects by
+
+            Returns:
+                :return items: the objects in the page
+                :return next_offset: the index to start the next page at, None if this is the last page
+        """
+        total, generate = {"nodes": (self.nodes, self.node), "running_pods": (self.pods, self.running_pod),
+                           "pending_pods": (self.pending_pods, self.pending_pod)}[kind]
+        selector = dict([label_selector.split("=", 1)]) if label_selector else {}
+        items = []
+        index = offset
+        while index < total and (limit == 0 or len(items) < limit):
+            item = generate(index)
+            if selector.items() <= item["metadata"].get("labels", {}).items():
+                items.append(item)
+            index += 1
+        return items, index if index < total else None
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """
+       Serves the synthetic cluster as the kubernetes API (nodes & pods LISTs with limit/continue paging), the
+       metrics-server & the spotinst elastigroup API, counting the requests to each
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status: int = 200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def count_request(self, name: str):
+        with self.server.request_counts_lock:
+            self.server.request_counts[name] = self.server.request_counts.get(name, 0) + 1
+
+    def send_list(self, kind: str, query: dict):
+        items, next_offset = self.server.cluster.list_objects(
+            kind, offset=int(query.get("continue", ["0"])[0] or 0), limit=int(query.get("limit", ["0"])[0]),
+            label_selector=query.get("labelSelector", [None])[0])
+        metadata = {"resourceVersion": "1"}
+        if next_offset is not None:
+            metadata["continue"] = str(next_offset)
+        self.send_json({"kind": "List", "apiVersion": "v1", "metadata": metadata, "items": items})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        cluster = self.server.cluster
+        if url.path == "/benchmark/requests":
+            with self.server.request_counts_lock:
+                self.send_json(dict(self.server.request_counts))
+        elif url.path == "/api/v1/nodes":
+            self.count_request("kubernetes_list_nodes")
+            self.send_list("nodes", query)
+        elif url.path == "/api/v1/pods":
+            phase = query.get("fieldSelector", [""])[0].replace("status.phase=", "")
+            self.count_request("kubernetes_list_" + phase.lower() + "_pods")
+            self.send_list("pending_pods" if phase == "Pending" else "running_pods", query)
+        elif url.path == "/apis/metrics.k8s.io/v1beta1/nodes":
+            # the metrics-server doesn't page its responses
+            self.count_request("metrics_server_list_nodes")
+            self.send_json({"kind": "NodeMetricsList", "apiVersion": "metrics.k8s.io/v1beta1", "metadata": {},
+                            "items": cluster.list_node_metrics(query.get("labelSelector", [None])[0])})
+        elif url.path.startswith("/aws/ec2/group/"):
+            self.count_request("spotinst_get_group")
+            group_nodes = cluster.nodes // cluster.node_groups
+            self.send_json({"response": {"items": [{"capacity": {"target": group_nodes, "minimum": 0,
+                                                                 "maximum": group_nodes * 2}}]}})
+        else:
+            self.send_json({"kind": "Status", "code": 404}, status=404)
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.count_request("spotinst_update_group")
+        self.send_json({"response": {"status": {"code": 200}}})
+
+
+def serve(cluster: SyntheticCluster, port_queue, port: int = 0):
+    """
+        Serve the synthetic cluster until the process is killed
+
+        Arguments:
+            :param cluster: the SyntheticCluster to serve
+            :param port_queue: a queue the port the server listens on is put on once it's ready
+            :param port: the port to listen on, 0 for any free port
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeApiHandler)
+    server.daemon_threads = True
+    server.cluster = cluster
+    server.request_counts = {}
+    server.request_counts_lock = threading.Lock()
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_fake_api_server(cluster: SyntheticCluster) -> tuple:
+    """
+        Start serving the synthetic cluster on a separate process, so generating & serializing the cluster doesn't
+        count towards the CPU & memory of the autoscaler being benchmarked
+
+        Arguments:
+            :param cluster: the SyntheticCluster to serve
+
+        Returns:
+            :return process: the server process, terminate it once done
+            :return url: the base URL of the server, for both the kubernetes & the spotinst API
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(cluster, port_queue), daemon=True)
+    process.start()
+    return process, "http://127.0.0.1:" + str(port_queue.get(timeout=30))
@@ -0,0 +1,24 @@
+from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import *
+import argparse
+
+
+# this reruns the scaling decision against runs recorded with "snapshot_record_dir", offline & as fast as possible, the
+# configuration is read the same way as the autoscaler reads it so thresholds can be tuned against the recorded runs
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="replay the scaling decision against recorded runs")
+    parser.add_argument("recordings", nargs="+", help="snapshot-*.json.gz files written by the autoscaler")
+    arguments = parser.parse_args()
+
+    # the spotinst token is never used offline but is still required by the configuration
+    os.environ.setdefault("SPOTINST_TOKEN", "replay")
+    configuration = read_configurations(os.getenv("CONFIG_DIR", "config"))
+    try:
+        for recording_path in sorted(arguments.recordings):
+            replayed = replay_snapshot(configuration, recording_path)
+            for elastigroup_id, action_taken in replayed["actions_taken"].items():
+                print(recording_path + ": elastigroup " + elastigroup_id + " " + str(action_taken) + ", resized to " +
+                      str(replayed["resized_to"][elastigroup_id]) + " in " + str(round(replayed["wall_seconds"], 3)) +
+                      " seconds")
+    except Exception as e:
+        print(e, file=sys.stderr)
+        exit(2)
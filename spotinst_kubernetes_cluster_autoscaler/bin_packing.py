@@ -0,0 +1,120 @@
+from typing import List, Optional, Sequence, Tuple
+
+
+def pod_fits(pod_requests: Sequence[float], free_resources: Sequence[float]) -> bool:
+    """
+        Check if a pod fits in the free resources of a node, on every resource dimension
+
+        Arguments:
+            :param pod_requests: the pod requested resources, in the same order as free_resources
+            :param free_resources: the free resources of the node
+
+        Returns:
+            :return True if the pod fits, False otherwise
+    """
+    return all(requested <= free for requested, free in zip(pod_requests, free_resources))
+
+
+def dominant_share(pod_requests: Sequence[float], node_shape: Sequence[float]) -> float:
+    """
+        Get the largest share of a node a pod requests out of all the resource dimensions (its "dominant" resource),
+        used to order pods from largest to smallest when the dimensions are in different units
+
+        Arguments:
+            :param pod_requests: the pod requested resources, in the same order as node_shape
+            :param node_shape: the resources of the node to measure the share against
+
+        Returns:
+            :return the largest share, infinite if the pod requests a resource the node doesn't have
+    """
+    shares = [0]
+    for requested, allocatable in zip(pod_requests, node_shape):
+        if allocatable > 0:
+            shares.append(requested / allocatable)
+        elif requested > 0:
+            shares.append(float("inf"))
+    return max(shares)
+
+
+def first_fit_decreasing(pods_requests: List[Sequence[float]],
+                         node_shape: Sequence[float]) -> Tuple[List[List[float]], List[Sequence[float]]]:
+    """
+        Pack pods onto the fewest new nodes of a single shape using the first fit decreasing heuristic, the pods are
+        sorted by their dominant share of the node & each is placed on the first node it fits on, opening a new node
+        only when it fits on none of them
+
+        Arguments:
+            :param pods_requests: the requested resources of each pod to pack, for example (cpu, memory) tuples
+            :param node_shape: the allocatable resources of a single node, in the same order as the pods requests
+
+        Returns:
+            :return nodes_free_resources: the free resources left on each of the new nodes
+            :return unplaceable_pods: the requests of the pods which are larger then an empty node so can't be placed
+    """
+    nodes_free_resources = []
+    unplaceable_pods = []
+    for pod_requests in sorted(pods_requests, key=lambda requests: dominant_share(requests, node_shape),
+                               reverse=True):
+        if pod_fits(pod_requests, node_shape) is False:
+            unplaceable_pods.append(pod_requests)
+            continue
+        for node_free_resources in nodes_free_resources:
+            if pod_fits(pod_requests, node_free_resources) is True:
+                break
+        else:
+            node_free_resources = list(node_shape)
+            nodes_free_resources.append(node_free_resources)
+        for dimension, requested in enumerate(pod_requests):
+            node_free_resources[dimension] -= requested
+    return nodes_free_resources, unplaceable_pods
+
+
+def nodes_needed_for_pods(pods_requests: List[Sequence[float]], node_shape: Sequence[float]) -> int:
+    """
+        Calculate how many new nodes of a single shape are needed to place all the given pods
+
+        Arguments:
+            :param pods_requests: the requested resources of each pod to place, for example (cpu, memory) tuples
+            :param node_shape: the allocatable resources of a single node, in the same order as the pods requests
+
+        Returns:
+            :return the number of new nodes needed, pods which are larger then an empty node are ignored as no number of
+            nodes of that shape will let them be placed
+    """
+    nodes_free_resources, _ = first_fit_decreasing(pods_requests, node_shape)
+    return len(nodes_free_resources)
+
+
+def place_onto_nodes(pods_requests: List[Sequence[float]],
+                     nodes_free_resources: List[Sequence[float]]) -> Optional[Tuple[List[List[float]], List[int]]]:
+    """
+        Try to place pods onto the free resources of existing nodes using the first fit decreasing heuristic (largest
+        pods first, each on the first node it fits on) & tell which node each pod was placed on
+
+        Arguments:
+            :param pods_requests: the requested resources of each pod to place, for example (cpu, memory) tuples
+            :param nodes_free_resources: the free resources of each of the existing nodes, in the same order as the pods
+            requests, these aren't changed
+
+        Returns:
+            :return nodes_free_resources: the free resources left on each of the nodes after placing all the pods
+            :return placements: the index (in nodes_free_resources) of the node each pod was placed on, in the same
+            order as pods_requests
+            :return None rather then both if not all of the pods could be placed
+    """
+    nodes_free_resources = [list(node_free_resources) for node_free_resources in nodes_free_resources]
+    placements = [0] * len(pods_requests)
+    # the largest free amount of each resource on any node is used to rank the pods from largest to smallest
+    largest_free = [max([max(free, 0) for free in dimension] or [0]) for dimension in zip(*nodes_free_resources)]
+    for pod_index in sorted(range(len(pods_requests)),
+                            key=lambda index: dominant_share(pods_requests[index], largest_free), reverse=True):
+        pod_requests = pods_requests[pod_index]
+        for node_index, node_free_resources in enumerate(nodes_free_resources):
+            if pod_fits(pod_requests, node_free_resources) is True:
+                for dimension, requested in enumerate(pod_requests):
+                    node_free_resources[dimension] -= requested
+                placements[pod_index] = node_index
+                break
+        else:
+            return None
+    return nodes_free_resources, placements
@@ -0,0 +1,263 @@
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from spotinst_kubernetes_cluster_autoscaler.cluster_snapshot import ClusterSnapshot, GroupTotals, NodePods
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_get_scaling_data import node_record, pending_pod_record, \
+    pod_is_movable, pod_requested_resources
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import label_selector_matches, object_key
+import threading
+
+# requests are summed as integer nano units (bytes for memory) so adding & later subtracting the same pod always gets
+# back to exactly the same total, no matter how many events were applied
+NANO = 1000000000
+
+
+class ClusterAggregator:
+    """
+       Running totals of the cluster requests & allocatable resources per node & per node group, fed by each event of a
+       KubeWatchCache & updated in O(1) per pod event (O(node groups) per node event), so taking a snapshot costs the
+       number of nodes no matter how many pods the cluster runs
+    """
+
+    def __init__(self, label_selectors: Iterable[Optional[str]] = (), extended_resources: Tuple[str, ...] = ()):
+        """
+           Arguments:
+               :param label_selectors: the label selectors of the node groups to keep totals of, the totals of the
+               whole cluster (None) are always kept
+               :param extended_resources: optional names of resources other then CPU & memory (for example
+               "nvidia.com/gpu") to keep the totals of too
+        """
+        self.lock = threading.Lock()
+        self.label_selectors = [None] + [selector for selector in label_selectors if selector is not None]
+        self.extended_resources = tuple(extended_resources)
+        # the integer scale of each resource dimension, CPU cores & the extended resources are kept in nano units
+        self.scales = (NANO, 1) + (NANO,) * len(self.extended_resources)
+        self._clear("nodes")
+        self._clear("pods")
+
+    def _clear(self, kind: str):
+        """
+            Forget everything known about one of the kinds, must be called with the lock held (or from __init__)
+
+            Arguments:
+                :param kind: "nodes" or "pods"
+        """
+        if kind == "nodes":
+            # node name to NodeRecord & to the label selectors it matches
+            self.nodes = {}
+            self.node_groups = {}
+            # label selector to the [allocatable, requested] of each resource dimension & to the node names
+            self.group_totals = {selector: [[0] * len(self.scales), [0] * len(self.scales)]
+                                 for selector in self.label_selectors}
+            self.group_node_names = {selector: set() for selector in self.label_selectors}
+            # the requests of pods on nodes that are unknown yet still count in the whole cluster totals
+            if hasattr(self, "requests_by_node"):
+                for node_requests in self.requests_by_node.values():
+                    self._add_vector(self.group_totals[None][1], node_requests, 1)
+        else:
+            # pod key to the (node_name, requested, movable) of each running pod
+            self.running_pods = {}
+            # node name to a dict of pod key to the (requested, movable) of its running pods
+            self.pods_by_node = {}
+            # node name to the requested of each resource dimension of all of its running pods
+            self.requests_by_node = {}
+            # pod key to the PendingPodRecord of each pending pod
+            self.pending_pods = {}
+            for selector in self.label_selectors:
+                self.group_totals[selector][1] = [0] * len(self.scales)
+
+    @staticmethod
+    def _add_vector(totals: list, values: Tuple[int, ...], sign: int):
+        for index, value in enumerate(values):
+            totals[index] += sign * value
+
+    def _add_requests(self, node_name: Optional[str], requested: Tuple[int, ...], sign: int):
+        """
+            Add (or with sign -1 remove) the requests of a pod to its node & to every node group the node is in, must be
+            called with the lock held
+        """
+        node_requests = self.requests_by_node.setdefault(node_name, [0] * len(self.scales))
+        self._add_vector(node_requests, requested, sign)
+        if not any(node_requests) and not self.pods_by_node.get(node_name):
+            del self.requests_by_node[node_name]
+        for selector in self.node_groups.get(node_name, [None]):
+            self._add_vector(self.group_totals[selector][1], requested, sign)
+
+    def _remove_pod(self, key: str):
+        """
+            Remove whatever a pod added to the totals, must be called with the lock held
+        """
+        self.pending_pods.pop(key, None)
+        running_pod = self.running_pods.pop(key, None)
+        if running_pod is None:
+            return
+        node_name, requested, _ = running_pod
+        node_pods = self.pods_by_node[node_name]
+        del node_pods[key]
+        if not node_pods:
+            del self.pods_by_node[node_name]
+        self._add_requests(node_name, requested, -1)
+
+    def _add_pod(self, key: str, pod):
+        """
+            Add a pod to the totals, only running pods have their requests counted & pending pods are kept as records,
+            must be called with the lock held
+        """
+        phase = pod.status.phase if pod.status is not None else None
+        if phase == "Pending":
+            self.pending_pods[key] = pending_pod_record(pod, self.extended_resources)
+        elif phase == "Running":
+            requested = tuple(round(value * scale) for value, scale in
+                              zip(pod_requested_resources(pod, self.extended_resources), self.scales))
+            movable = pod_is_movable(pod)
+            node_name = pod.spec.node_name
+            self.running_pods[key] = (node_name, requested, movable)
+            self.pods_by_node.setdefault(node_name, {})[key] = (requested, movable)
+            self._add_requests(node_name, requested, 1)
+
+    def _move_node_requests(self, node_name: str, sign: int):
+        """
+            Add (or with sign -1 remove) a node allocatable & its pods requests to every node group it's in other then
+            the whole cluster (which counts the pods requests no matter the node), must be called with the lock held
+        """
+        node = self.nodes[node_name]
+        allocatable = tuple(round(value * scale) for value, scale in
+                            zip((node.allocatable_cpu, node.allocatable_memory) + node.extended_allocatable,
+                                self.scales))
+        node_requests = self.requests_by_node.get(node_name, ())
+        for selector in self.node_groups[node_name]:
+            group_totals = self.group_totals[selector]
+            self._add_vector(group_totals[0], allocatable, sign)
+            if selector is not None:
+                self._add_vector(group_totals[1], node_requests, sign)
+            if sign > 0:
+                self.group_node_names[selector].add(node_name)
+            else:
+                self.group_node_names[selector].discard(node_name)
+
+    def _remove_node(self, node_name: str):
+        """
+            Remove a node & take it out of its node groups, must be called with the lock held
+        """
+        if node_name not in self.nodes:
+            return
+        self._move_node_requests(node_name, -1)
+        del self.nodes[node_name]
+        del self.node_groups[node_name]
+
+    def _add_node(self, node):
+        """
+            Add a node & put it in every node group its labels match, must be called with the lock held
+        """
+        record = node_record(node, self.extended_resources)
+        self.nodes[record.name] = record
+        self.node_groups[record.name] = [selector for selector in self.label_selectors
+                                         if label_selector_matches(record.labels, selector)]
+        self._move_node_requests(record.name, 1)
+
+    def replace(self, kind: str, items: list):
+        """
+            Rebuild the totals of one of the kinds from scratch, used after each (re)LIST of the watch cache
+
+            Arguments:
+                :param kind: which kind the items are, "nodes" or "pods"
+                :param items: the kubernetes objects returned by the LIST
+        """
+        with self.lock:
+            if kind == "nodes":
+                self._clear("nodes")
+                for node in items:
+                    self._add_node(node)
+            else:
+                # the node groups hold the requests of their nodes pods so those are taken out first
+                for node_name in list(self.nodes):
+                    self._move_node_requests(node_name, -1)
+                self._clear("pods")
+                for node_name in list(self.nodes):
+                    self._move_node_requests(node_name, 1)
+                for pod in items:
+                    self._add_pod(object_key(pod), pod)
+
+    def apply_event(self, kind: str, event_type: str, item):
+        """
+            Update the totals with a single watch event, the previous version of the object is taken out & the new one
+            put in so an update costs the same as an add
+
+            Arguments:
+                :param kind: which kind the event is for, "nodes" or "pods"
+                :param event_type: the watch event type, "ADDED", "MODIFIED" or "DELETED"
+                :param item: the kubernetes object the event is about
+        """
+        if event_type not in ("ADDED", "MODIFIED", "DELETED"):
+            return
+        with self.lock:
+            if kind == "nodes":
+                self._remove_node(item.metadata.name)
+                if event_type != "DELETED":
+                    self._add_node(item)
+            else:
+                key = object_key(item)
+                self._remove_pod(key)
+                if event_type != "DELETED":
+                    self._add_pod(key, item)
+
+    def _unscale(self, values: list) -> list:
+        return [value / scale for value, scale in zip(values, self.scales)]
+
+    def node_pods(self, node_name: str) -> Optional[NodePods]:
+        """
+            Arguments:
+                :param node_name: the node to get the running pods of
+
+            Returns:
+                :return the NodePods of the pods running on the node as of now, None if it runs none
+        """
+        with self.lock:
+            node_pods = self.pods_by_node.get(node_name)
+            if node_pods is None:
+                return None
+            return NodePods([(tuple(self._unscale(requested)), movable) for requested, movable in node_pods.values()])
+
+    def take_snapshot(self, usage_by_node: dict, taken_at: Optional[datetime] = None) -> ClusterSnapshot:
+        """
+            Take a ClusterSnapshot of the totals, copying only the per node & per node group numbers (& the pending
+            pods) so it costs the number of nodes rather then the number of pods, the running pods of a node are only
+            read if the scale down simulation asks for them
+
+            Arguments:
+                :param usage_by_node: a dict of node name to a [used_cpu, used_memory] list as reported by the
+                metrics-server
+                :param taken_at: when the snapshot was taken, defaults to now
+
+            Returns:
+                :return a ClusterSnapshot of the cluster
+        """
+        with self.lock:
+            nodes = list(self.nodes.values())
+            requests_by_node = {node_name: self._unscale(node_requests)
+                                for node_name, node_requests in self.requests_by_node.items()}
+            group_totals = {}
+            for selector, (allocatable, requested) in self.group_totals.items():
+                allocatable = self._unscale(allocatable)
+                requested = self._unscale(requested)
+                group_totals[selector] = GroupTotals(
+                    allocatable_cpu=allocatable[0], allocatable_memory=allocatable[1], requested_cpu=requested[0],
+                    requested_memory=requested[1], node_names=frozenset(self.group_node_names[selector]),
+                    extended_allocatable=tuple(allocatable[2:]), extended_requested=tuple(requested[2:]))
+            pending_pods = list(self.pending_pods.values())
+        return ClusterSnapshot(nodes=nodes, pods_by_node=AggregatedNodePods(self), usage_by_node=usage_by_node,
+                               pending_pods=pending_pods, taken_at=taken_at, requests_by_node=requests_by_node,
+                               group_totals=group_totals, extended_resources=self.extended_resources)
+
+
+class AggregatedNodePods:
+    """
+       Looks up the running pods of a node in a ClusterAggregator only when asked, standing in for the pods_by_node
+       dict of a ClusterSnapshot
+    """
+
+    def __init__(self, aggregator: ClusterAggregator):
+        self.aggregator = aggregator
+
+    def get(self, node_name: str, default=None) -> Optional[NodePods]:
+        node_pods = self.aggregator.node_pods(node_name)
+        return default if node_pods is None else node_pods
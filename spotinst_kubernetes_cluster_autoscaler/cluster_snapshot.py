@@ -0,0 +1,553 @@
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+from spotinst_kubernetes_cluster_autoscaler.bin_packing import nodes_needed_for_pods, place_onto_nodes, pod_fits
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import label_selector_matches
+
+
+class CompactRecord:
+    """
+       Base of the records a ClusterSnapshot is made of, each keeps only the few fields the scaling decision reads in
+       __slots__ so a snapshot of a large cluster costs tens of bytes per object rather then a dict (or a whole
+       kubernetes client model) each
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and \
+            all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + "(" + ", ".join(field + "=" + repr(getattr(self, field))
+                                                     for field in self.__slots__) + ")"
+
+
+class NodeRecord(CompactRecord):
+    """
+       A cluster node, its name, labels & allocatable CPU cores & memory bytes (& allocatable amount of each of the
+       extended resources of the ClusterSnapshot it's in)
+    """
+
+    __slots__ = ("name", "labels", "allocatable_cpu", "allocatable_memory", "extended_allocatable")
+
+    def __init__(self, name: Optional[str], labels: Optional[dict], allocatable_cpu: float,
+                 allocatable_memory: float, extended_allocatable: Tuple[float, ...] = ()):
+        self.name = name
+        self.labels = labels
+        self.allocatable_cpu = allocatable_cpu
+        self.allocatable_memory = allocatable_memory
+        self.extended_allocatable = extended_allocatable
+
+
+class PendingPodRecord(CompactRecord):
+    """
+       A pending pod, since when it's pending (unix time), if it's stuck due to lack of resources & for stuck pods
+       the node label it's required to run on & its requests
+    """
+
+    __slots__ = ("pending_since", "stuck", "node_affinity", "requests")
+
+    def __init__(self, pending_since: Optional[float], stuck: bool, node_affinity: Optional[dict] = None,
+                 requests: Tuple[float, ...] = (0, 0)):
+        self.pending_since = pending_since
+        self.stuck = stuck
+        self.node_affinity = node_affinity
+        self.requests = requests
+
+
+class GroupTotals(CompactRecord):
+    """
+       The totals of a single node group as kept up to date by a ClusterAggregator, the allocatable & requested CPU
+       cores & memory bytes (& amount of each of the extended resources) of its nodes & the names of those nodes
+    """
+
+    __slots__ = ("allocatable_cpu", "allocatable_memory", "requested_cpu", "requested_memory", "node_names",
+                 "extended_allocatable", "extended_requested")
+
+    def __init__(self, allocatable_cpu: float, allocatable_memory: float, requested_cpu: float,
+                 requested_memory: float, node_names: frozenset, extended_allocatable: Tuple[float, ...] = (),
+                 extended_requested: Tuple[float, ...] = ()):
+        self.allocatable_cpu = allocatable_cpu
+        self.allocatable_memory = allocatable_memory
+        self.requested_cpu = requested_cpu
+        self.requested_memory = requested_memory
+        self.node_names = node_names
+        self.extended_allocatable = extended_allocatable
+        self.extended_requested = extended_requested
+
+
+class NodePods:
+    """
+       The running pods placed on a single node as parallel arrays of their requested CPU cores & memory bytes & if
+       each is movable (see pod_is_movable), summing them is a tight loop over the arrays & each pod costs 17 bytes,
+       the requests of any extended resources are only kept as the total of all of the pods
+    """
+
+    __slots__ = ("cpu", "memory", "movable", "extended")
+
+    def __init__(self, pods: Optional[List[Tuple[Tuple[float, float], bool]]] = None):
+        """
+           Arguments:
+               :param pods: optional list of ((requested_cpu, requested_memory), movable) of pods to start with
+        """
+        self.cpu = array("d")
+        self.memory = array("d")
+        self.movable = bytearray()
+        self.extended = []
+        for requests, movable in pods or []:
+            self.append(requests, movable)
+
+    def append(self, requests: Tuple[float, ...], movable: bool):
+        """
+            Arguments:
+                :param requests: the (requested_cpu, requested_memory) of the pod, optionally followed by the requested
+                amount of each extended resource
+                :param movable: if the pod needs another node to run on if this node is removed
+        """
+        self.cpu.append(requests[0])
+        self.memory.append(requests[1])
+        self.movable.append(movable)
+        if len(requests) > 2:
+            if not self.extended:
+                self.extended = [0] * (len(requests) - 2)
+            for index, requested in enumerate(requests[2:]):
+                self.extended[index] += requested
+
+    def __len__(self) -> int:
+        return len(self.movable)
+
+    def total_requests(self) -> list:
+        """
+            Returns:
+                :return the [requested_cpu, requested_memory] of all of the pods together, followed by the total
+                requested amount of each extended resource if any were appended
+        """
+        return [sum(self.cpu), sum(self.memory)] + self.extended
+
+    def movable_requests(self) -> list:
+        """
+            Returns:
+                :return a list of the (requested_cpu, requested_memory) of each of the movable pods
+        """
+        return [(cpu, memory) for cpu, memory, movable in zip(self.cpu, self.memory, self.movable) if movable]
+
+
+class ClusterSnapshot:
+    """
+       A point in time summary of the whole cluster (the allocatable resources & labels of each node, the resources
+       requested & used on each node & the pending pods), taken once per scaling decision & then split in memory by
+       the label selector of each node group so managing many node groups costs a single LIST of the cluster
+    """
+
+    def __init__(self, nodes: list, pods_by_node: dict, usage_by_node: dict, pending_pods: list,
+                 taken_at: Optional[datetime] = None, requests_by_node: Optional[dict] = None,
+                 group_totals: Optional[dict] = None, extended_resources: Tuple[str, ...] = ()):
+        """
+           Arguments:
+               :param nodes: a list of the NodeRecord of each node
+               :param pods_by_node: a dict of node name to the NodePods of the running pods placed on it (or anything
+               else with the same get method)
+               :param usage_by_node: a dict of node name to a [used_cpu, used_memory] list as reported by the
+               metrics-server
+               :param pending_pods: a list of the PendingPodRecord of each pending pod
+               :param taken_at: when the snapshot was taken, defaults to now
+               :param requests_by_node: optional dict of node name to the [requested_cpu, requested_memory] of its
+               running pods, summed from pods_by_node if None
+               :param group_totals: optional dict of label selector to the GroupTotals of the node group, node groups
+               missing from it have their totals summed from the nodes
+               :param extended_resources: the names of the resources other then CPU & memory (for example
+               "nvidia.com/gpu") the node records & the requests of each node hold the amount of, in the same order
+        """
+        self.nodes = nodes
+        self.pods_by_node = pods_by_node
+        # the total requests of each node, used by all of the usage calculations
+        if requests_by_node is None:
+            requests_by_node = {}
+            for node_name, node_pods in pods_by_node.items():
+                requests_by_node[node_name] = node_pods.total_requests()
+        self.requests_by_node = requests_by_node
+        self.group_totals = group_totals or {}
+        self.extended_resources = tuple(extended_resources)
+        self.usage_by_node = usage_by_node
+        self.pending_pods = pending_pods
+        self.taken_at = taken_at or datetime.now(timezone.utc)
+        # the index (in pending_pods) of each stuck pod with no node affinity/selector to the label selector of the
+        # single node group it counts against, None until assign_unpinned_stuck_pods is called
+        self.unpinned_stuck_pods_group = None
+
+    def group_nodes(self, node_selector_label: Optional[str] = None) -> list:
+        """
+            Get the nodes of a single node group
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return a list of the NodeRecord of the nodes matching the selector
+        """
+        return [node for node in self.nodes if label_selector_matches(node.labels, node_selector_label)]
+
+    def get_connected_nodes_count(self, node_selector_label: Optional[str] = None) -> int:
+        """
+            Get the number of nodes of a node group connected to the cluster
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return the number of matching nodes
+        """
+        if node_selector_label in self.group_totals:
+            return len(self.group_totals[node_selector_label].node_names)
+        return len(self.group_nodes(node_selector_label))
+
+    def get_cpu_and_mem_usage(self, node_selector_label: Optional[str] = None) -> Tuple[int, int]:
+        """
+            Get the CPU & memory usage percentage of a node group, calculated the same way as
+            KubeGetScaleData.get_cpu_and_mem_usage (the highest of requested & used out of the allocatable)
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return used_cpu_percentage: CPU usage percentage of the node group
+                :return used_memory_percentage: memory usage percentage of the node group
+        """
+        group_totals = self.group_totals.get(node_selector_label)
+        if group_totals is not None:
+            allocatable_cpu = group_totals.allocatable_cpu
+            allocatable_memory = group_totals.allocatable_memory
+            group_node_names = group_totals.node_names
+            per_node_totals = (self.usage_by_node,)
+        else:
+            allocatable_cpu = 0
+            allocatable_memory = 0
+            group_node_names = set()
+            for node in self.group_nodes(node_selector_label):
+                allocatable_cpu += node.allocatable_cpu
+                allocatable_memory += node.allocatable_memory
+                group_node_names.add(node.name)
+            per_node_totals = (self.usage_by_node, self.requests_by_node)
+
+        totals = []
+        for per_node in per_node_totals:
+            cpu = 0
+            memory = 0
+            for node_name, node_values in per_node.items():
+                if node_selector_label is None or node_name in group_node_names:
+                    cpu += node_values[0]
+                    memory += node_values[1]
+            totals.append((cpu, memory))
+        if group_totals is not None:
+            totals.append((group_totals.requested_cpu, group_totals.requested_memory))
+        (used_cpu, used_memory), (requested_cpu, requested_memory) = totals
+
+        used_cpu_percentage = int(max(used_cpu, requested_cpu) / allocatable_cpu * 100)
+        used_memory_percentage = int(max(used_memory, requested_memory) / allocatable_memory * 100)
+        return used_cpu_percentage, used_memory_percentage
+
+    def get_extended_resources_usage(self, node_selector_label: Optional[str] = None) -> dict:
+        """
+            Get the usage percentage of each of the extended resources of a node group, unlike CPU & memory these have
+            no metrics-server usage so this is the requested out of the allocatable
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return a dict of extended resource name to its usage percentage, resources none of the node group
+                nodes have are left out
+        """
+        group_totals = self.group_totals.get(node_selector_label)
+        if group_totals is not None:
+            allocatable = list(group_totals.extended_allocatable)
+            requested = list(group_totals.extended_requested)
+        else:
+            allocatable = [0] * len(self.extended_resources)
+            requested = [0] * len(self.extended_resources)
+            for node in self.group_nodes(node_selector_label):
+                for index, node_allocatable in enumerate(node.extended_allocatable):
+                    allocatable[index] += node_allocatable
+                node_requests = self.requests_by_node.get(node.name, ())
+                for index, node_requested in enumerate(node_requests[2:]):
+                    requested[index] += node_requested
+        return {resource_name: int(requested[index] / allocatable[index] * 100)
+                for index, resource_name in enumerate(self.extended_resources) if allocatable[index] > 0}
+
+    def get_number_of_pending_pods(self) -> int:
+        """
+            Returns:
+                :return the number of pods pending in the cluster
+        """
+        return len(self.pending_pods)
+
+    def pending_pods_exist(self, minimum_pending_seconds: int = 5) -> bool:
+        """
+            Check if there are pods pending for longer then minimum_pending_seconds (as of when the snapshot was
+            taken), pods which have no record of since when they are pending are assumed to be pending long enough
+
+            Arguments:
+                :param minimum_pending_seconds: the minimum number of seconds a pod needs to be in a pending state
+                for it to count
+
+            Returns:
+                :return True if there are pods stuck waiting longer then minimum_pending_seconds, False otherwise
+        """
+        taken_at = self.taken_at.timestamp()
+        for pending_pod in self.pending_pods:
+            if pending_pod.pending_since is None or taken_at - pending_pod.pending_since >= minimum_pending_seconds:
+                return True
+        return False
+
+    def check_node_group_labels(self, node_selector_label: Optional[str] = None) -> dict:
+        """
+            Get the labels of a node group, taken from its first node (see KubeGetScaleData.check_node_group_labels)
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return a dict of all labels that the node has, empty if the node group has no nodes
+        """
+        for node in self.nodes:
+            if label_selector_matches(node.labels, node_selector_label):
+                return node.labels or {}
+        return {}
+
+    def group_stuck_pods(self, node_selector_label: Optional[str] = None,
+                         minimum_pending_seconds: int = 0) -> Iterator[PendingPodRecord]:
+        """
+            Iterate over the pending pods which can't be placed due to lack of gpu/cpu/memory & which could be placed on
+            the node group (they have no node affinity/selector or one that matches the node group labels)
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+                :param minimum_pending_seconds: the minimum number of seconds a pod needs to be in a pending state
+                for it to count, pods with no record of since when they are pending always count
+
+            Returns:
+                :return an iterator over the PendingPodRecord of the matching pending pods
+        """
+        taken_at = self.taken_at.timestamp()
+        node_group_labels = None
+        for index, pending_pod in enumerate(self.pending_pods):
+            if pending_pod.stuck is False:
+                continue
+            if pending_pod.pending_since is not None and taken_at - pending_pod.pending_since < minimum_pending_seconds:
+                continue
+            if node_selector_label is None:
+                yield pending_pod
+                continue
+            if not pending_pod.node_affinity:
+                if self.unpinned_stuck_pods_group is None or \
+                        self.unpinned_stuck_pods_group.get(index) == node_selector_label:
+                    yield pending_pod
+                continue
+            if node_group_labels is None:
+                node_group_labels = self.check_node_group_labels(node_selector_label)
+            if pending_pod.node_affinity.items() <= node_group_labels.items():
+                yield pending_pod
+
+    def assign_unpinned_stuck_pods(self, node_selector_labels: List[Optional[str]]):
+        """
+            Assign each stuck pod with no node affinity/selector (which could be placed on any node group) to a single
+            node group so only that node group scales up for it, this is the first node group whose node shape (see
+            get_node_shape) fits the pod requests or the first node group if none of them do
+
+            Arguments:
+                :param node_selector_labels: the label selectors of the node groups which scale up for stuck pods, in
+                the order they are configured in
+        """
+        if not node_selector_labels:
+            self.unpinned_stuck_pods_group = {}
+            return
+        node_shapes = [(node_selector_label, self.get_node_shape(node_selector_label))
+                       for node_selector_label in node_selector_labels]
+        self.unpinned_stuck_pods_group = {}
+        for index, pending_pod in enumerate(self.pending_pods):
+            if pending_pod.stuck is False or pending_pod.node_affinity:
+                continue
+            self.unpinned_stuck_pods_group[index] = next(
+                (node_selector_label for node_selector_label, node_shape in node_shapes
+                 if node_shape is not None and pod_fits(pending_pod.requests, node_shape)), node_selector_labels[0])
+
+    def check_pods_stuck_do_to_insufficient_resource(self, node_selector_label: Optional[str] = None) -> bool:
+        """
+            Check if there are any pending pods which can't be placed due to lack of gpu/cpu/memory & which could be
+            placed on the node group
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return True if there are pods pending due to lack of gpu/cpu/mem, False otherwise
+        """
+        for _ in self.group_stuck_pods(node_selector_label):
+            return True
+        return False
+
+    def get_number_of_stuck_pods(self, node_selector_label: Optional[str] = None,
+                                 minimum_pending_seconds: int = 0) -> int:
+        """
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+                :param minimum_pending_seconds: the minimum number of seconds a pod needs to be in a pending state
+                for it to count
+
+            Returns:
+                :return the number of pods pending due to lack of gpu/cpu/mem which could be placed on the node group
+        """
+        return sum(1 for _ in self.group_stuck_pods(node_selector_label, minimum_pending_seconds))
+
+    def get_node_shape(self, node_selector_label: Optional[str] = None) -> Optional[Tuple[float, ...]]:
+        """
+            Get the allocatable resources a new node of the node group is expected to have, this is the smallest
+            allocatable CPU & memory (& amount of each of the extended resources) of the node group existing nodes so
+            mixed instance types never underestimate the number of nodes needed
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return the (cpu, memory, *extended resources) allocatable of a node, None if the node group has no
+                nodes
+        """
+        group_nodes = self.group_nodes(node_selector_label)
+        if not group_nodes:
+            return None
+        return (min(node.allocatable_cpu for node in group_nodes),
+                min(node.allocatable_memory for node in group_nodes)) + \
+            tuple(min(node.extended_allocatable[index] if len(node.extended_allocatable) > index else 0
+                      for node in group_nodes) for index in range(len(self.extended_resources)))
+
+    def get_nodes_needed_for_stuck_pods(self, node_selector_label: Optional[str] = None) -> Optional[int]:
+        """
+            Bin pack the requests of the node group stuck pods onto new nodes of the node group shape to know how many
+            nodes need to be added for all of them to be placed
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+
+            Returns:
+                :return the number of nodes needed, None if it can't be known as the node group has no nodes to take
+                the shape of
+        """
+        node_shape = self.get_node_shape(node_selector_label)
+        if node_shape is None:
+            return None
+        return nodes_needed_for_pods([pending_pod.requests for pending_pod in
+                                      self.group_stuck_pods(node_selector_label)], node_shape)
+
+    def _node_requests(self, node: NodeRecord) -> list:
+        return self.requests_by_node.get(node.name, [0, 0])
+
+    def _node_utilization(self, node: NodeRecord) -> float:
+        node_requests = self._node_requests(node)
+        return max(node_requests[0] / node.allocatable_cpu if node.allocatable_cpu > 0 else 1,
+                   node_requests[1] / node.allocatable_memory if node.allocatable_memory > 0 else 1)
+
+    def _group_total_used(self, node_selector_label: Optional[str], group_node_names: set) -> list:
+        """
+            Get the [cpu, memory] a node group uses, the highest of requested & used on each, moving pods between the
+            node group nodes doesn't change it only the allocatable it's divided by
+        """
+        total_used = [0, 0]
+        for per_node in (self.requests_by_node, self.usage_by_node):
+            for dimension in (0, 1):
+                total_used[dimension] = max(total_used[dimension], sum(
+                    node_values[dimension] for node_name, node_values in per_node.items()
+                    if node_selector_label is None or node_name in group_node_names))
+        return total_used
+
+    def _extended_usage_checks(self, group_nodes: list, max_extended_usage: Optional[dict]) -> list:
+        """
+            Get the extended resources a scale down has to keep below their max usage, each as a [index, max usage,
+            total requested, remaining allocatable] list where index is its position in extended_resources
+        """
+        extended_checks = []
+        for index, resource_name in enumerate(self.extended_resources):
+            if (max_extended_usage or {}).get(resource_name) is not None:
+                extended_checks.append([index, max_extended_usage[resource_name],
+                                        sum(self._node_requests(node)[2 + index] for node in group_nodes
+                                            if len(self._node_requests(node)) > 2 + index),
+                                        sum(node.extended_allocatable[index] for node in group_nodes)])
+        return extended_checks
+
+    @staticmethod
+    def _usage_stays_below(used: float, allocatable: float, max_usage: float) -> bool:
+        return used <= 0 or (allocatable > 0 and used / allocatable * 100 < max_usage)
+
+    def get_safe_scale_down_count(self, node_selector_label: Optional[str] = None, min_nodes: int = 0,
+                                  max_cpu_usage: float = 100, max_memory_usage: float = 100,
+                                  max_extended_usage: Optional[dict] = None) -> int:
+        """
+            Simulate removing the node group least utilized nodes one at a time, each is only counted as safe to remove
+            if all of its movable pods (see pod_is_movable), including the ones moved onto it by the previous removals,
+            can be repacked onto the free requests of the remaining nodes & the remaining nodes CPU & memory usage stays
+            below the scale up thresholds (so the scale down doesn't just trigger a scale up on the next run)
+
+            Arguments:
+                :param node_selector_label: the label selector of the node group, None for all the nodes in the
+                cluster
+                :param min_nodes: the minimum number of nodes the node group has to keep
+                :param max_cpu_usage: the CPU usage percentage the remaining nodes must stay below
+                :param max_memory_usage: the memory usage percentage the remaining nodes must stay below
+                :param max_extended_usage: optional dict of extended resource name to the usage percentage of it the
+                remaining nodes must stay below, the pods are still only repacked by their CPU & memory
+
+            Returns:
+                :return the largest number of nodes which can be removed from the node group, 0 if none can
+        """
+        group_nodes = self.group_nodes(node_selector_label)
+        total_used = self._group_total_used(node_selector_label, {node.name for node in group_nodes})
+        remaining_allocatable = [sum(node.allocatable_cpu for node in group_nodes),
+                                 sum(node.allocatable_memory for node in group_nodes)]
+        extended_checks = self._extended_usage_checks(group_nodes, max_extended_usage)
+
+        # the nodes are tried from the least utilized up, the free resources of the ones still kept & the requests of
+        # the pods moved onto each of them so far are tracked in the same order as the candidates
+        candidate_nodes = sorted(group_nodes, key=self._node_utilization)
+        kept_free_resources = [[node.allocatable_cpu - self._node_requests(node)[0],
+                                node.allocatable_memory - self._node_requests(node)[1]] for node in candidate_nodes]
+        kept_moved_pods = [[] for _ in candidate_nodes]
+
+        safe_scale_down_count = 0
+        for candidate_node in candidate_nodes:
+            if len(group_nodes) - safe_scale_down_count <= min_nodes:
+                break
+            candidate_allocatable = [remaining_allocatable[0] - candidate_node.allocatable_cpu,
+                                     remaining_allocatable[1] - candidate_node.allocatable_memory]
+            candidate_extended_allocatable = [extended_check[3] - candidate_node.extended_allocatable[extended_check[0]]
+                                              for extended_check in extended_checks]
+            if not (candidate_allocatable[0] > 0 and candidate_allocatable[1] > 0 and
+                    self._usage_stays_below(total_used[0], candidate_allocatable[0], max_cpu_usage) and
+                    self._usage_stays_below(total_used[1], candidate_allocatable[1], max_memory_usage) and
+                    all(self._usage_stays_below(extended_check[2], allocatable, extended_check[1])
+                        for extended_check, allocatable in zip(extended_checks, candidate_extended_allocatable))):
+                break
+            candidate_pods = self.pods_by_node.get(candidate_node.name)
+            pods_to_move = (candidate_pods.movable_requests() if candidate_pods is not None else []) + \
+                kept_moved_pods[0]
+            placed = place_onto_nodes(pods_to_move, kept_free_resources[1:])
+            if placed is None:
+                break
+            kept_free_resources, placements = placed
+            kept_moved_pods = kept_moved_pods[1:]
+            for pod_requests, node_index in zip(pods_to_move, placements):
+                kept_moved_pods[node_index].append(pod_requests)
+            remaining_allocatable = candidate_allocatable
+            for extended_check, allocatable in zip(extended_checks, candidate_extended_allocatable):
+                extended_check[3] = allocatable
+            safe_scale_down_count += 1
+        return safe_scale_down_count
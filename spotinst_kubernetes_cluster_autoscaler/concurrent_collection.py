@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+from spotinst_kubernetes_cluster_autoscaler.profiling import profile_in_thread
+import sys
+
+
+def run_concurrently(calls: Dict[str, Callable], max_workers: int = 4, timeout_seconds: Optional[float] = None) -> dict:
+    """
+        Run a set of independent calls (API requests & the like) concurrently on a bounded thread pool & wait for all of
+        them to finish, so the time it takes is that of the slowest call rather then the sum of all of them
+
+        Arguments:
+            :param calls: a dict of a name for each call to the function to call (with no arguments)
+            :param max_workers: the maximum number of calls to run at the same time
+            :param timeout_seconds: the overall deadline in seconds for all of the calls together (they run at the same
+            time so it isn't per call), defaults to waiting forever, a call still running past it isn't cancelled so
+            each call should bound its own requests with a timeout too
+
+        Returns:
+            :return a dict of each call name to what that call returned
+
+        Raises:
+            :raise TimeoutError: if any of the calls didn't finish by the timeout_seconds deadline
+            :raise Exception: the exception raised by the first failed call (in the order of calls)
+    """
+    executor = ThreadPoolExecutor(max_workers=max(min(max_workers, len(calls)), 1))
+    try:
+        futures = {call_name: executor.submit(profile_in_thread(call)) for call_name, call in calls.items()}
+        wait(futures.values(), timeout=timeout_seconds)
+        results = {}
+        for call_name, future in futures.items():
+            if not future.done():
+                print("collecting " + call_name + " didn't finish within " + str(timeout_seconds) + " seconds",
+                      file=sys.stderr)
+                raise TimeoutError("collecting " + call_name + " timed out")
+            if future.exception() is not None:
+                print("collecting " + call_name + " failed", file=sys.stderr)
+                raise future.exception()
+            results[call_name] = future.result()
+        return results
+    finally:
+        # don't block on calls that are still running after a failure or a timeout, their results are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,63 @@
 import os
+import sys
 from parse_it import ParseIt
 from typing import Optional
 
+# the config file types ParseIt reads, in its default priority order
+CONFIG_FILE_TYPES = ("env", "json", "yaml", "yml", "toml", "tml", "hcl", "tf", "conf", "cfg", "ini", "xml")
+
+# the configuration variables which can be set per node group in "node_groups", any of them not set in a node group
+# entry falls back to the top level value of the same name
+NODE_GROUP_CONFIGURATION_KEYS = (
+    "elastigroup_id",
+    "spotinst_account",
+    "node_selector_label",
+    "min_node_count",
+    "max_node_count",
+    "max_memory_usage",
+    "min_memory_usage",
+    "max_cpu_usage",
+    "min_cpu_usage",
+    "extended_resources",
+    "seconds_to_check",
+    "scale_up_count",
+    "scale_up_bin_packing",
+    "scale_down_count",
+    "scale_down_simulation",
+    "scale_up_stabilization_seconds",
+    "scale_down_stabilization_seconds",
+    "scale_up_active",
+    "scale_down_active",
+    "scale_on_pending_pods",
+    "usage_smoothing",
+    "usage_ewma_alpha",
+    "usage_percentile",
+    "usage_forecast",
+    "usage_forecast_horizon_seconds",
+    "usage_forecast_alpha",
+    "usage_forecast_beta"
+)
+
+
+def config_type_priority(config_folder: str) -> list:
+    """
+        Get the ParseIt config_type_priority of a config folder, the cli args & envvars followed by only the config file
+        types actually present in it (in the ParseIt default order) so reading each configuration variable doesn't look
+        for config files of every other type
+
+        Arguments:
+            :param config_folder: the folder the config files are in (searched recursively) or a single config file
+
+        Returns:
+            :return the list of config types to pass to ParseIt as config_type_priority
+    """
+    present_file_types = set()
+    if os.path.isfile(config_folder):
+        present_file_types.add(os.path.splitext(config_folder)[1][1:])
+    for _, _, file_names in os.walk(config_folder):
+        present_file_types.update(os.path.splitext(file_name)[1][1:] for file_name in file_names)
+    return ["cli_args", "env_vars"] + [file_type for file_type in CONFIG_FILE_TYPES if file_type in present_file_types]
+
 
 def decide_kube_connection_method(kube_api_endpoint: Optional[str] = None,
                                   kubeconfig_path: Optional[str] = None,) -> str:
@@ -40,7 +96,8 @@ def read_configurations(config_folder: str = "config") -> dict:
     print("reading config variables")
 
     config = {}
-    parser = ParseIt(config_location=config_folder, recurse=True)
+    parser = ParseIt(config_type_priority=config_type_priority(config_folder), config_location=config_folder,
+                     recurse=True)
 
     config["kube_token"] = parser.read_configuration_variable("kube_token", default_value=None)
     config["kube_api_endpoint"] = parser.read_configuration_variable("kube_api_endpoint", default_value=None)
@@ -51,19 +108,131 @@ def read_configurations(config_folder: str = "config") -> dict:
     config["min_memory_usage"] = parser.read_configuration_variable("min_memory_usage", default_value=50)
     config["max_cpu_usage"] = parser.read_configuration_variable("max_cpu_usage", default_value=80)
     config["min_cpu_usage"] = parser.read_configuration_variable("min_cpu_usage", default_value=50)
+    config["extended_resources"] = parser.read_configuration_variable("extended_resources", default_value=None)
     config["seconds_to_check"] = parser.read_configuration_variable("seconds_to_check", default_value=30)
     config["spotinst_token"] = parser.read_configuration_variable("spotinst_token", required=True)
     config["kube_connection_method"] = decide_kube_connection_method(kube_api_endpoint=config["kube_api_endpoint"],
                                                                      kubeconfig_path=config["kubeconfig_path"])
-    config["elastigroup_id"] = parser.read_configuration_variable("elastigroup_id", required=True)
+    config["node_groups"] = parser.read_configuration_variable("node_groups", default_value=None)
+    # the top level elastigroup_id is only required if no node_groups are configured
+    config["elastigroup_id"] = parser.read_configuration_variable("elastigroup_id", default_value=None,
+                                                                  required=config["node_groups"] is None)
+    config["spotinst_connect_timeout"] = parser.read_configuration_variable("spotinst_connect_timeout",
+                                                                            default_value=5)
+    config["spotinst_read_timeout"] = parser.read_configuration_variable("spotinst_read_timeout", default_value=30)
+    config["spotinst_retries"] = parser.read_configuration_variable("spotinst_retries", default_value=3)
+    config["spotinst_backoff_factor"] = parser.read_configuration_variable("spotinst_backoff_factor",
+                                                                           default_value=0.5)
+    config["spotinst_api_url"] = parser.read_configuration_variable("spotinst_api_url",
+                                                                    default_value="https://api.spotinst.io")
+    config["capacity_max_age_seconds"] = parser.read_configuration_variable("capacity_max_age_seconds",
+                                                                            default_value=300)
     config["min_node_count"] = parser.read_configuration_variable("min_node_count", default_value=2)
     config["max_node_count"] = parser.read_configuration_variable("max_node_count", default_value=100)
-    config["spotinst_account"] = parser.read_configuration_variable("spotinst_account", required=True)
+    config["spotinst_account"] = parser.read_configuration_variable("spotinst_account", default_value=None,
+                                                                    required=config["node_groups"] is None)
     config["scale_up_count"] = parser.read_configuration_variable("scale_up_count", default_value=1)
+    config["scale_up_bin_packing"] = parser.read_configuration_variable("scale_up_bin_packing", default_value=False)
     config["scale_down_count"] = parser.read_configuration_variable("scale_down_count", default_value=1)
+    config["scale_down_simulation"] = parser.read_configuration_variable("scale_down_simulation",
+                                                                         default_value=False)
+    config["scale_up_stabilization_seconds"] = parser.read_configuration_variable("scale_up_stabilization_seconds",
+                                                                                  default_value=0)
+    config["scale_down_stabilization_seconds"] = parser.read_configuration_variable(
+        "scale_down_stabilization_seconds", default_value=0)
+    config["node_boot_timeout_seconds"] = parser.read_configuration_variable("node_boot_timeout_seconds",
+                                                                             default_value=600)
     config["scale_up_active"] = parser.read_configuration_variable("scale_up_active", default_value=True)
     config["scale_down_active"] = parser.read_configuration_variable("scale_down_active", default_value=True)
     config["scale_on_pending_pods"] = parser.read_configuration_variable("scale_on_pending_pods", default_value=True)
     config["node_selector_label"] = parser.read_configuration_variable("node_selector_label", default_value=None)
+    config["list_page_size"] = parser.read_configuration_variable("list_page_size", default_value=500)
+    config["raw_json_listing"] = parser.read_configuration_variable("raw_json_listing", default_value=False)
+    config["collection_max_workers"] = parser.read_configuration_variable("collection_max_workers", default_value=4)
+    config["collection_timeout_seconds"] = parser.read_configuration_variable("collection_timeout_seconds",
+                                                                              default_value=60)
+    config["usage_smoothing"] = parser.read_configuration_variable("usage_smoothing", default_value=None)
+    config["usage_ewma_alpha"] = parser.read_configuration_variable("usage_ewma_alpha", default_value=0.3)
+    config["usage_percentile"] = parser.read_configuration_variable("usage_percentile", default_value=50)
+    config["usage_forecast"] = parser.read_configuration_variable("usage_forecast", default_value=None)
+    config["usage_forecast_horizon_seconds"] = parser.read_configuration_variable("usage_forecast_horizon_seconds",
+                                                                                  default_value=240)
+    config["usage_forecast_alpha"] = parser.read_configuration_variable("usage_forecast_alpha", default_value=0.5)
+    config["usage_forecast_beta"] = parser.read_configuration_variable("usage_forecast_beta", default_value=0.3)
+    config["usage_window_seconds"] = parser.read_configuration_variable("usage_window_seconds", default_value=600)
+    config["usage_history_size"] = parser.read_configuration_variable("usage_history_size", default_value=60)
+    config["usage_history_store"] = parser.read_configuration_variable("usage_history_store", default_value="memory")
+    config["usage_history_file_path"] = parser.read_configuration_variable("usage_history_file_path",
+                                                                           default_value="usage_history.json")
+    config["usage_history_configmap_name"] = parser.read_configuration_variable(
+        "usage_history_configmap_name", default_value="spotinst-kubernetes-cluster-autoscaler-usage-history")
+    config["usage_history_configmap_namespace"] = parser.read_configuration_variable(
+        "usage_history_configmap_namespace", default_value="default")
+    config["scaling_state_store"] = parser.read_configuration_variable("scaling_state_store", default_value="memory")
+    config["scaling_state_file_path"] = parser.read_configuration_variable("scaling_state_file_path",
+                                                                           default_value="scaling_state.json")
+    config["scaling_state_configmap_name"] = parser.read_configuration_variable(
+        "scaling_state_configmap_name", default_value="spotinst-kubernetes-cluster-autoscaler-scaling-state")
+    config["scaling_state_configmap_namespace"] = parser.read_configuration_variable(
+        "scaling_state_configmap_namespace", default_value="default")
+    config["run_mode"] = parser.read_configuration_variable("run_mode", default_value="cronjob")
+    config["daemon_interval_seconds"] = parser.read_configuration_variable("daemon_interval_seconds",
+                                                                           default_value=60)
+    config["metrics_port"] = parser.read_configuration_variable("metrics_port", default_value=None)
+    config["metrics_pushgateway"] = parser.read_configuration_variable("metrics_pushgateway", default_value=None)
+    config["metrics_job_name"] = parser.read_configuration_variable(
+        "metrics_job_name", default_value="spotinst-kubernetes-cluster-autoscaler")
+    config["profile_output_path"] = parser.read_configuration_variable("profile_output_path", default_value=None)
+    config["snapshot_record_dir"] = parser.read_configuration_variable("snapshot_record_dir", default_value=None)
 
     return config
+
+
+def get_node_groups(config: dict) -> list:
+    """
+    Will create a list of the configuration of each node group the autoscaler manages, when "node_groups" isn't
+    configured that is a single node group made of the top level configuration
+
+    Arguments:
+        :param config: the config dict as returned by read_configurations
+
+    Returns:
+        :return node_groups: a list of dicts, each with all of the NODE_GROUP_CONFIGURATION_KEYS
+
+    Raises:
+        :raise ValueError: if a node group has no elastigroup_id or spotinst_account, if the same elastigroup_id is
+        configured twice or if its extended_resources aren't a dict of resource name to a dict of max_usage & min_usage
+    """
+    node_group_entries = config["node_groups"] if config["node_groups"] is not None else [{}]
+    node_groups = []
+    for node_group_entry in node_group_entries:
+        node_group = {key: node_group_entry.get(key, config[key]) for key in NODE_GROUP_CONFIGURATION_KEYS}
+        if node_group["elastigroup_id"] is None or node_group["spotinst_account"] is None:
+            print("each of the node_groups must have an elastigroup_id & a spotinst_account", file=sys.stderr)
+            raise ValueError
+        if node_group["elastigroup_id"] in [existing["elastigroup_id"] for existing in node_groups]:
+            print("elastigroup " + node_group["elastigroup_id"] + " is configured in more then one of the node_groups",
+                  file=sys.stderr)
+            raise ValueError
+        for resource_name, thresholds in (node_group["extended_resources"] or {}).items():
+            if not isinstance(thresholds, dict) or set(thresholds) - {"max_usage", "min_usage"}:
+                print("the extended_resources thresholds of " + str(resource_name) +
+                      " must be a dict of max_usage &/or min_usage", file=sys.stderr)
+                raise ValueError
+        node_groups.append(node_group)
+    return node_groups
+
+
+def get_extended_resources(config: dict) -> tuple:
+    """
+    Will create the list of the resources other then CPU & memory any of the node groups has thresholds for, these are
+    summed in the same pass over the cluster nodes & pods as CPU & memory
+
+    Arguments:
+        :param config: the config dict as returned by read_configurations
+
+    Returns:
+        :return a sorted tuple of the extended resource names, empty if none of the node groups has any
+    """
+    return tuple(sorted({resource_name for node_group in get_node_groups(config)
+                         for resource_name in node_group["extended_resources"] or {}}))
@@ -1,8 +1,14 @@
 from kubernetes import client, config
-from typing import Optional, Tuple
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, Tuple
+import json
 import sys
-import time
-from si_prefix import si_parse
+from spotinst_kubernetes_cluster_autoscaler.cluster_snapshot import ClusterSnapshot, NodePods, NodeRecord, \
+    PendingPodRecord
+from spotinst_kubernetes_cluster_autoscaler.concurrent_collection import run_concurrently
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_quantity import parse_quantity
+from spotinst_kubernetes_cluster_autoscaler.metrics import API_CALL_DURATION, LISTED_OBJECTS, timed
 
 
 def unit_converter(unit_added_string: str) -> float:
@@ -18,20 +24,7 @@ def unit_converter(unit_added_string: str) -> float:
         Raises::
             :raise TypeError: if trying to parse an unknown unit type
             """
-    custom_unit_ratio = {
-        "Ki": 1024,
-        "Mi": 1024 * 1024,
-        "Gi": 1024 * 1024 * 1024
-    }
-    try:
-        unit_in_float = float(si_parse(unit_added_string))
-    except AttributeError:
-        if unit_added_string[-2:] in custom_unit_ratio:
-            unit_in_float = float(unit_added_string[:-2]) * custom_unit_ratio[unit_added_string[-2:]]
-        else:
-            raise TypeError
-
-    return unit_in_float
+    return parse_quantity(unit_added_string)
 
 
 def check_pod_node_affinity(pod) -> dict:
@@ -63,6 +56,247 @@ def check_pod_node_affinity(pod) -> dict:
     return response
 
 
+def pod_stuck_do_to_insufficient_resource(pod) -> bool:
+    """
+        Check if a pending pod is unschedulable due to lack of gpu/cpu/memory/ephemeral-storage or due to no node
+        matching its node affinity/selector
+
+        Arguments:
+            :param pod: the pending pod object to check
+
+        Returns:
+            :return True if the pod is stuck due to lack of resources, False otherwise
+    """
+    try:
+        condition = pod.status.conditions[0]
+    except (AttributeError, TypeError, IndexError):
+        return False
+    if condition.reason != "Unschedulable" or "nodes" not in str(condition.message):
+        return False
+    return ("cpu" in condition.message) or ("memory" in condition.message) or ("gpu" in condition.message) or \
+        ("ephemeral-storage" in condition.message) or ("node affinity/selector" in condition.message)
+
+
+def pod_pending_since(pod) -> Optional[datetime]:
+    """
+        Check since when a pod is waiting to be scheduled, this is the last transition time of its "PodScheduled"
+        condition if it has one & the pod creation time otherwise
+
+        Arguments:
+            :param pod: the pod object to check
+
+        Returns:
+            :return the timezone aware datetime the pod is pending since, None if the pod has neither
+    """
+    try:
+        for condition in pod.status.conditions or []:
+            if condition.type == "PodScheduled" and condition.last_transition_time is not None:
+                return condition.last_transition_time
+    except AttributeError:
+        pass
+    try:
+        return pod.metadata.creation_timestamp
+    except AttributeError:
+        return None
+
+
+def container_requested_resources(container, extended_resources: Tuple[str, ...] = ()) -> Tuple[float, ...]:
+    """
+        Get the CPU & memory (& optionally any other resources) a single container requests
+
+        Arguments:
+            :param container: the container object to check
+            :param extended_resources: optional names of other resources to get the requests of too (for example
+            "nvidia.com/gpu" or "ephemeral-storage")
+
+        Returns:
+            :return requested_cpu: the requested CPU cores, 0 if not set
+            :return requested_memory: the requested memory bytes, 0 if not set
+            :return followed by the requested amount of each of the extended_resources in the same order, 0 if not set
+    """
+    if container.resources is None or container.resources.requests is None:
+        return (0, 0) + (0,) * len(extended_resources)
+    container_requests = container.resources.requests
+    requested_cpu = unit_converter(container_requests['cpu']) if "cpu" in container_requests else 0
+    requested_memory = unit_converter(container_requests['memory']) if "memory" in container_requests else 0
+    if not extended_resources:
+        return requested_cpu, requested_memory
+    return (requested_cpu, requested_memory) + tuple(
+        unit_converter(container_requests[resource_name]) if resource_name in container_requests else 0
+        for resource_name in extended_resources)
+
+
+def pod_requested_resources(pod, extended_resources: Tuple[str, ...] = ()) -> Tuple[float, ...]:
+    """
+        Get the CPU & memory (& optionally any other resources) a pod requests, calculated the same way the kubernetes
+        scheduler does which is the sum of its containers requests or the largest of its init containers requests if
+        that is higher
+
+        Arguments:
+            :param pod: the pod object to check
+            :param extended_resources: optional names of other resources to get the requests of too (for example
+            "nvidia.com/gpu" or "ephemeral-storage")
+
+        Returns:
+            :return requested_cpu: the requested CPU cores
+            :return requested_memory: the requested memory bytes
+            :return followed by the requested amount of each of the extended_resources in the same order
+    """
+    try:
+        containers = pod.spec.containers or []
+        init_containers = pod.spec.init_containers or []
+    except AttributeError:
+        return (0, 0) + (0,) * len(extended_resources)
+    # the CPU & memory only case is by far the most common & is kept to plain scalars as it runs for every pod
+    if not extended_resources:
+        requested_cpu = 0
+        requested_memory = 0
+        for container in containers:
+            container_cpu, container_memory = container_requested_resources(container)
+            requested_cpu += container_cpu
+            requested_memory += container_memory
+        for init_container in init_containers:
+            container_cpu, container_memory = container_requested_resources(init_container)
+            requested_cpu = max(requested_cpu, container_cpu)
+            requested_memory = max(requested_memory, container_memory)
+        return requested_cpu, requested_memory
+    requested = [0] * (2 + len(extended_resources))
+    for container in containers:
+        for index, container_requested in enumerate(container_requested_resources(container, extended_resources)):
+            requested[index] += container_requested
+    # init containers run one at a time before the other containers so only the largest of them matters
+    for init_container in init_containers:
+        init_container_requested = container_requested_resources(init_container, extended_resources)
+        for index, container_requested in enumerate(init_container_requested):
+            requested[index] = max(requested[index], container_requested)
+    return tuple(requested)
+
+
+def pod_is_movable(pod) -> bool:
+    """
+        Check if a pod would need to be placed on another node if the node it runs on is removed, DaemonSet pods &
+        static (mirror) pods are tied to their node so are removed together with it
+
+        Arguments:
+            :param pod: the pod object to check
+
+        Returns:
+            :return True if the pod needs another node to run on if its node is removed, False otherwise
+    """
+    try:
+        if "kubernetes.io/config.mirror" in (pod.metadata.annotations or {}):
+            return False
+        for owner_reference in pod.metadata.owner_references or []:
+            if owner_reference.kind == "DaemonSet":
+                return False
+    except AttributeError:
+        pass
+    return True
+
+
+def node_record(node, extended_resources: Tuple[str, ...] = ()) -> NodeRecord:
+    """
+        Summarize a node into the compact record a ClusterSnapshot is made of
+
+        Arguments:
+            :param node: the node object to summarize
+            :param extended_resources: optional names of other resources to keep the allocatable amount of too
+
+        Returns:
+            :return the NodeRecord of the node
+    """
+    allocatable = node.status.allocatable
+    return NodeRecord(name=node.metadata.name if node.metadata is not None else None,
+                      labels=node.metadata.labels if node.metadata is not None else None,
+                      allocatable_cpu=unit_converter(allocatable['cpu']),
+                      allocatable_memory=unit_converter(allocatable['memory']),
+                      extended_allocatable=tuple(unit_converter(allocatable[resource_name])
+                                                 if resource_name in allocatable else 0
+                                                 for resource_name in extended_resources))
+
+
+def pending_pod_record(pod, extended_resources: Tuple[str, ...] = ()) -> PendingPodRecord:
+    """
+        Summarize a pending pod into the compact record a ClusterSnapshot is made of, only a pod stuck due to lack of
+        resources keeps its node affinity & requests
+
+        Arguments:
+            :param pod: the pending pod object to summarize
+            :param extended_resources: optional names of other resources to keep the requested amount of too, after
+            the CPU & memory in the same order
+
+        Returns:
+            :return the PendingPodRecord of the pod
+    """
+    pending_since = pod_pending_since(pod)
+    pending_since = pending_since.timestamp() if pending_since is not None else None
+    if pod_stuck_do_to_insufficient_resource(pod) is True:
+        return PendingPodRecord(pending_since, True, node_affinity=check_pod_node_affinity(pod),
+                                requests=pod_requested_resources(pod, extended_resources))
+    return PendingPodRecord(pending_since, False)
+
+
+# the kubernetes client models a RawKubeObject stands in for, only their attributes can be read from one
+RAW_OBJECT_MODELS = (client.V1PodList, client.V1NodeList, client.V1ListMeta, client.V1Pod, client.V1Node,
+                     client.V1ObjectMeta, client.V1OwnerReference, client.V1PodSpec, client.V1Container,
+                     client.V1ResourceRequirements, client.V1Affinity, client.V1NodeAffinity, client.V1NodeSelector,
+                     client.V1NodeSelectorTerm, client.V1NodeSelectorRequirement, client.V1PreferredSchedulingTerm,
+                     client.V1PodStatus, client.V1PodCondition, client.V1NodeSpec, client.V1NodeStatus)
+
+
+@lru_cache(maxsize=None)
+def raw_attribute_keys() -> dict:
+    """
+        Get the JSON key each attribute of the kubernetes client models in RAW_OBJECT_MODELS is serialized as
+
+        Returns:
+            :return a dict of the snake_case attribute name to its camelCase JSON key (for example "node_name" to
+            "nodeName" or "_continue" to "continue")
+    """
+    attribute_keys = {}
+    for model in RAW_OBJECT_MODELS:
+        attribute_keys.update(model.attribute_map)
+    return attribute_keys
+
+
+class RawKubeObject:
+    """
+       Read only access to a parsed kubernetes API JSON object using the same snake_case attribute names as the
+       kubernetes client models, nested objects are only wrapped when accessed so unlike the client model deserializer
+       no work is done for the (many) fields the autoscaler never reads, any attribute the client models don't have
+       (including private & dunder names other then "_continue") raises an AttributeError like it would on a model
+    """
+
+    __slots__ = ("raw",)
+
+    # fields which are free form string maps in the kubernetes API, these are returned as is (like the client models do)
+    map_fields = {"labels", "annotations", "nodeSelector", "requests", "limits", "allocatable", "capacity"}
+    # fields which are timestamps in the kubernetes API, these are returned as timezone aware datetime objects
+    time_fields = {"creationTimestamp", "lastTransitionTime", "lastProbeTime", "startTime"}
+
+    def __init__(self, raw: dict):
+        """
+           Arguments:
+               :param raw: the parsed JSON object
+        """
+        self.raw = raw
+
+    def __getattr__(self, attribute_name: str):
+        key = raw_attribute_keys().get(attribute_name)
+        if key is None:
+            raise AttributeError(type(self).__name__ + " object has no attribute " + attribute_name)
+        value = self.raw.get(key)
+        if value is None or key in self.map_fields:
+            return value
+        if key in self.time_fields:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if isinstance(value, dict):
+            return RawKubeObject(value)
+        if isinstance(value, list):
+            return [RawKubeObject(item) if isinstance(item, dict) else item for item in value]
+        return value
+
+
 class KubeGetScaleData:
     """
        This class does everything related to kubernetes, this includes figuring out the current number of nodes that
@@ -71,7 +305,9 @@ class KubeGetScaleData:
     """
 
     def __init__(self, connection_method: str, api_endpoint: str = Optional[str], context_name: Optional[str] = None,
-                 token: Optional[str] = None, kubeconfig_path: Optional[str] = None):
+                 token: Optional[str] = None, kubeconfig_path: Optional[str] = None, page_size: int = 500,
+                 raw_json: bool = False, max_workers: int = 4, call_timeout_seconds: Optional[float] = None,
+                 extended_resources: Tuple[str, ...] = ()):
         """
            Init the kubernetes connection while auto figure out the best connection auth method
 
@@ -82,6 +318,18 @@ class KubeGetScaleData:
                :param context_name: the name of the context inside the kubeconfig to use if "kube_config" is used
                :param token: if connecting via "api" the bearer token to auth with
                :param kubeconfig_path: if using kubeconfig the path to the kubeconfig file
+               :param page_size: the maximum number of objects to request from the API per page when listing pods &
+               nodes, this bounds the memory needed to hold a single page no matter the size of the cluster
+               :param raw_json: if True pods & nodes are read straight from the parsed API JSON responses rather then
+               deserialized into the kubernetes client models first, which is a lot cheaper on large clusters
+               :param max_workers: the maximum number of independent API calls (nodes, pods & metrics) to run at the
+               same time when collecting the cluster usage
+               :param call_timeout_seconds: the overall deadline in seconds for those API calls together, each
+               kubernetes & metrics-server request is also given it as its client side timeout so a request stuck on a
+               dead connection can't outlive it, defaults to waiting forever
+               :param extended_resources: optional names of resources other then CPU & memory (for example
+               "nvidia.com/gpu", "ephemeral-storage" or "hugepages-2Mi") to sum the requests & allocatable of in each
+               snapshot too
 
             Raises:
                 :raise ValueError: if passing a connection_method that isn't on the list of choices
@@ -114,6 +362,184 @@ class KubeGetScaleData:
             self.v1 = self.kube_client.CoreV1Api()
             self.custom_object_api = self.kube_client.CustomObjectsApi()
 
+        self.page_size = page_size
+        self.raw_json = raw_json
+        self.max_workers = max_workers
+        self.call_timeout_seconds = call_timeout_seconds
+        self.request_kwargs = {"_request_timeout": call_timeout_seconds} if call_timeout_seconds is not None else {}
+        self.extended_resources = tuple(extended_resources)
+        # only set when running as a daemon, in which case nodes & pods are read from it rather then from the API
+        self.watch_cache = None
+        # only set when running as a daemon, in which case the requests totals are read from it rather then summed
+        self.aggregator = None
+        # only set when recording the runs, in which case everything read for a snapshot is passed through it
+        self.recorder = None
+        # only set when replaying a recorded run, in which case snapshots are taken as of when it was recorded
+        self.snapshot_time = None
+
+    def attach_watch_cache(self, watch_cache):
+        """
+            Read all nodes & pods data from a watch backed in memory cache rather then LIST them from the kubernetes
+            API on every call
+
+            Arguments:
+                :param watch_cache: a started KubeWatchCache object
+        """
+        self.watch_cache = watch_cache
+
+    def attach_aggregator(self, aggregator):
+        """
+            Take snapshots from the running totals of a ClusterAggregator (fed by a KubeWatchCache) rather then summing
+            all of the cluster pods on every snapshot, only the node metrics are still read from the API
+
+            Arguments:
+                :param aggregator: a ClusterAggregator object
+        """
+        self.aggregator = aggregator
+
+    def attach_recorder(self, recorder):
+        """
+            Record all of the nodes, pods & node metrics read for each snapshot
+
+            Arguments:
+                :param recorder: a SnapshotRecorder object
+        """
+        self.recorder = recorder
+
+    def _paginate(self, list_function: Callable, api_name: str, **kwargs) -> Iterator:
+        """
+            Page through a kubernetes API LIST using the limit/continue tokens, yielding the objects a page at a time
+            so only a single page is held in memory at any given time, the objects are RawKubeObject objects if
+            raw_json is set & kubernetes client models otherwise
+
+            Arguments:
+                :param list_function: the CoreV1Api list function to page through
+                :param api_name: the "api" label each page request is timed under, only the requests themselves are
+                timed rather then the processing of the objects they return
+                :param kwargs: any other arguments to pass to each list_function call (selectors, timeouts, etc)
+
+            Returns:
+                :return an iterator over all the listed objects
+        """
+        continue_token = None
+        while True:
+            if self.raw_json is True:
+                with API_CALL_DURATION.labels(api=api_name).time():
+                    response = list_function(watch=False, limit=self.page_size, _continue=continue_token,
+                                             _preload_content=False, **self.request_kwargs, **kwargs)
+                    response_data = response.data
+                page = RawKubeObject(json.loads(response_data))
+            else:
+                with API_CALL_DURATION.labels(api=api_name).time():
+                    page = list_function(watch=False, limit=self.page_size, _continue=continue_token,
+                                         **self.request_kwargs, **kwargs)
+            for item in page.items:
+                yield item
+            continue_token = page.metadata._continue if page.metadata is not None else None
+            if not continue_token:
+                break
+
+    def _iterate_nodes(self, label_selector: Optional[str] = None, timeout_seconds: int = 10) -> Iterator:
+        """
+            Iterate over the cluster nodes, from the watch cache if one is attached or page by page from the kubernetes
+            API otherwise
+
+            Arguments:
+                :param label_selector: optional label to filter the nodes by, should be a string in the format of
+                "key=value"
+                :param timeout_seconds: the timeout of each API request if one is needed
+
+            Returns:
+                :return an iterator over the matching node objects
+        """
+        if self.watch_cache is not None:
+            nodes = iter(self.watch_cache.list_nodes(label_selector=label_selector))
+        else:
+            nodes = self._paginate(self.v1.list_node, "kubernetes_list_nodes", label_selector=label_selector,
+                                   timeout_seconds=timeout_seconds)
+        if self.recorder is not None and label_selector is None:
+            return self.recorder.record_nodes(nodes)
+        return nodes
+
+    def _iterate_pods(self, phase: str, timeout_seconds: int = 10) -> Iterator:
+        """
+            Iterate over the cluster pods in a given phase, from the watch cache if one is attached or page by page from
+            the kubernetes API otherwise
+
+            Arguments:
+                :param phase: the pod phase to filter by (for example "Running" or "Pending")
+                :param timeout_seconds: the timeout of each API request if one is needed
+
+            Returns:
+                :return an iterator over the matching pod objects
+        """
+        if self.watch_cache is not None:
+            pods = iter(self.watch_cache.list_pods(phase=phase))
+        else:
+            pods = self._paginate(self.v1.list_pod_for_all_namespaces, "kubernetes_list_" + phase.lower() + "_pods",
+                                  field_selector="status.phase=" + phase, timeout_seconds=timeout_seconds)
+        if self.recorder is not None:
+            return self.recorder.record_pods(phase, pods)
+        return pods
+
+    @timed
+    def _sum_nodes_allocatable(self, label_selector: Optional[str] = None) -> Tuple[float, float, set]:
+        """
+            Sum the allocatable CPU & memory of the cluster nodes, streamed page by page
+
+            Arguments:
+                :param label_selector: optional label to filter the nodes by, should be a string in the format of
+                "key=value"
+
+            Returns:
+                :return allocatable_cpu: the total allocatable CPU cores of the matching nodes
+                :return allocatable_memory: the total allocatable memory bytes of the matching nodes
+                :return selected_node_names: the names of the matching nodes, empty if label_selector isn't set
+        """
+        allocatable_cpu = 0
+        allocatable_memory = 0
+        selected_node_names = set()
+        for node in self._iterate_nodes(label_selector=label_selector):
+            allocatable_cpu += unit_converter(node.status.allocatable['cpu'])
+            allocatable_memory += unit_converter(node.status.allocatable['memory'])
+            if label_selector is not None:
+                selected_node_names.add(node.metadata.name)
+        return allocatable_cpu, allocatable_memory, selected_node_names
+
+    @timed
+    def _sum_pods_requests_by_node(self) -> dict:
+        """
+            Sum the requested CPU & memory of all running pods per the node each is placed on, streamed page by page so
+            memory is bound by the number of nodes rather then the number of pods
+
+            Returns:
+                :return a dict of node name to a [requested_cpu, requested_memory] list
+        """
+        requests_by_node = {}
+        for pod in self._iterate_pods("Running"):
+            node_requests = requests_by_node.setdefault(pod.spec.node_name, [0, 0])
+            requested_cpu, requested_memory = pod_requested_resources(pod)
+            node_requests[0] += requested_cpu
+            node_requests[1] += requested_memory
+        return requests_by_node
+
+    @timed
+    def _list_pods_by_node(self) -> dict:
+        """
+            Summarize the requested CPU & memory of each running pod per the node it's placed on, streamed page by page
+
+            Returns:
+                :return a dict of node name to the NodePods of the pods placed on it
+        """
+        pods_by_node = {}
+        for pod in self._iterate_pods("Running"):
+            node_pods = pods_by_node.get(pod.spec.node_name)
+            if node_pods is None:
+                node_pods = pods_by_node[pod.spec.node_name] = NodePods()
+            node_pods.append(pod_requested_resources(pod, self.extended_resources), pod_is_movable(pod))
+        return pods_by_node
+
+    @timed
     def get_cpu_and_mem_usage(self, node_selector_label: Optional[str] = None) -> Tuple[int, int]:
         """
             Get the CPU & memory usage percentage of the cluster by figuring out the highest of the requested CPU & mem
@@ -129,41 +555,27 @@ class KubeGetScaleData:
                 :return used_memory_percentage: memory usage percentage of the cluster
         """
 
-        allocatable_cpu = 0
-        allocatable_memory = 0
-        used_cpu = 0
-        used_memory = 0
-        requested_cpu = 0
-        requests_memory = 0
-
-        nodes_list = self.v1.list_node(label_selector=node_selector_label)
-        for node in nodes_list.items:
-            allocatable_cpu += unit_converter(node.status.allocatable['cpu'])
-            allocatable_memory += unit_converter(node.status.allocatable['memory'])
-
-        if node_selector_label is None:
-            pod_list = self.v1.list_pod_for_all_namespaces(watch=False, field_selector="status.phase=Running",
-                                                           timeout_seconds=10)
-            pod_list_items = pod_list.items
-        else:
-            pod_list_items = []
-            for node in nodes_list.items:
-                pod_list = self.v1.list_pod_for_all_namespaces(watch=False, timeout_seconds=10,
-                                                               field_selector="status.phase=Running,spec.nodeName=" +
-                                                                              str(node.metadata.name))
-                pod_list_items += pod_list.items
-
-        for pod in pod_list_items:
-            for container in pod.spec.containers:
-                if (container.resources.requests is not None) and ("cpu" in container.resources.requests):
-                    requested_cpu += unit_converter(container.resources.requests['cpu'])
-                if (container.resources.requests is not None) and ("memory" in container.resources.requests):
-                    requests_memory += unit_converter(container.resources.requests['memory'])
-
-        current_used_metrics = self.custom_object_api.list_cluster_custom_object('metrics.k8s.io', 'v1beta1', 'nodes')
-        for metric_node in current_used_metrics['items']:
-            used_cpu += unit_converter(metric_node['usage']['cpu'])
-            used_memory += unit_converter(metric_node['usage']['memory'])
+        # the nodes LIST, the pods LIST & the metrics-server call don't depend on each other so are run concurrently,
+        # the running pods & the node metrics are joined against the names of the nodes matching node_selector_label
+        # once all are done (the metrics-server is asked for the matching nodes only too so its response is the size
+        # of the node group rather then the cluster)
+        collected = run_concurrently({
+            "nodes": lambda: self._sum_nodes_allocatable(label_selector=node_selector_label),
+            "pods": self._sum_pods_requests_by_node,
+            "metrics": lambda: self._sum_nodes_usage_by_node(label_selector=node_selector_label)
+        }, max_workers=self.max_workers, timeout_seconds=self.call_timeout_seconds)
+        allocatable_cpu, allocatable_memory, selected_node_names = collected["nodes"]
+
+        totals = []
+        for per_node in (collected["pods"], collected["metrics"]):
+            cpu = 0
+            memory = 0
+            for node_name, node_values in per_node.items():
+                if node_selector_label is None or node_name in selected_node_names:
+                    cpu += node_values[0]
+                    memory += node_values[1]
+            totals.append((cpu, memory))
+        (requested_cpu, requests_memory), (used_cpu, used_memory) = totals
 
         max_used_requested_cpu = max([used_cpu, requested_cpu])
         max_used_requested_memory = max([used_memory, requests_memory])
@@ -173,6 +585,7 @@ class KubeGetScaleData:
 
         return used_cpu_percentage, used_memory_percentage
 
+    @timed
     def get_number_of_pending_pods(self) -> int:
         """
             Get the number of pods that are stuck pending
@@ -180,39 +593,51 @@ class KubeGetScaleData:
             Returns:
                 :return current number of pods stuck pending
         """
-        pending_pod_list = self.v1.list_pod_for_all_namespaces(watch=False, field_selector="status.phase=Pending",
-                                                               timeout_seconds=10)
-        return pending_pod_list.items.__len__()
+        pending_pods_number = 0
+        for _ in self._iterate_pods("Pending"):
+            pending_pods_number += 1
+        return pending_pods_number
 
-    def pending_pods_exist(self, seconds_to_wait_between_checks: int = 5) -> bool:
+    @timed
+    def pending_pods_exist(self, minimum_pending_seconds: int = 5) -> bool:
         """
             Check if there's a pod that cant start do to not having enough resources to be placed and only alert if
-            there are pods that are stuck waiting longer then seconds_to_wait_between_checks
+            there are pods that are stuck waiting longer then minimum_pending_seconds, the time each pod is waiting is
+            taken from the pod itself (see pod_pending_since) so no waiting & rechecking is needed, pods which have no
+            record of since when they are pending are assumed to be pending long enough
 
             Arguments:
-                :param seconds_to_wait_between_checks: the number of seconds to wait to recheck if the pods are still
-                in a pending state
+                :param minimum_pending_seconds: the minimum number of seconds a pod needs to be in a pending state
+                for it to count
 
             Returns:
-                :return True if there are pods stuck waiting longer then seconds_to_wait_between_checks, False otherwise
+                :return True if there are pods stuck waiting longer then minimum_pending_seconds, False otherwise
         """
-        pending_pods = False
-        if self.get_number_of_pending_pods() > 0:
-            time.sleep(seconds_to_wait_between_checks)
-            if self.get_number_of_pending_pods() > 0:
-                pending_pods = True
-        return pending_pods
-
-    def get_connected_nodes_count(self) -> int:
+        now = datetime.now(timezone.utc)
+        for pending_pod in self._iterate_pods("Pending"):
+            pending_since = pod_pending_since(pending_pod)
+            if pending_since is None or (now - pending_since).total_seconds() >= minimum_pending_seconds:
+                return True
+        return False
+
+    @timed
+    def get_connected_nodes_count(self, node_selector_label: Optional[str] = None) -> int:
         """
             Get the current number of nodes connected to the kubernetes cluster
 
+            Arguments:
+                :param node_selector_label: optional label to only count the nodes of a single node group, should be a
+                string in the format of "key=value"
+
             Returns:
                 :return current number of nodes in the elastigroup
         """
-        nodes_list = self.v1.list_node()
-        return nodes_list.items.__len__()
+        connected_nodes_number = 0
+        for _ in self._iterate_nodes(label_selector=node_selector_label):
+            connected_nodes_number += 1
+        return connected_nodes_number
 
+    @timed
     def check_node_group_labels(self, node_selector_label: str = None) -> dict:
         """
             Check what labels are in the "node group", this is done by taking the first server with a matching
@@ -227,41 +652,120 @@ class KubeGetScaleData:
             Returns:
                 :return a dict of all labels that the node has
         """
-        chosen_node = self.v1.list_node(watch=False, timeout_seconds=15, limit=1, label_selector=node_selector_label)
+        if self.watch_cache is not None:
+            return self.watch_cache.list_nodes(label_selector=node_selector_label)[0].metadata.labels
+        chosen_node = self.v1.list_node(watch=False, timeout_seconds=15, limit=1, label_selector=node_selector_label,
+                                        **self.request_kwargs)
         return chosen_node.items[0].metadata.labels
 
-    def check_pods_stuck_do_to_insufficient_resource(self, node_selector_label: str = None) -> bool:
+    @timed
+    def check_pods_stuck_do_to_insufficient_resource(self, node_selector_label: str = None,
+                                                     node_group_labels: Optional[dict] = None) -> bool:
         """
-            Check if there are any pending pods due to lack of gpu/cpu/memory for them to be placed
+            Check if there are any pending pods due to lack of gpu/cpu/memory for them to be placed, the node group
+            labels are only looked up once per check (& only if a pod with a node affinity/selector needs them) & each
+            pod affinity is only calculated once
 
             Arguments:
                 :param node_selector_label: optional label to use to filter the nodes to get the usage from only a
                 subset of nodes that matches that label, defaults to all nodes, should be a string in the format of
                 "key=value"
+                :param node_group_labels: optional already known labels of the node group (as returned by
+                check_node_group_labels), if not passed they will be looked up when first needed
 
             Returns:
                 :return True if there are pods pending due to lack of gpu/cpu/mem, False otherwise
         """
+        for pending_pod in self._iterate_pods("Pending", timeout_seconds=15):
+            if pod_stuck_do_to_insufficient_resource(pending_pod) is False:
+                continue
+            if node_selector_label is None:
+                return True
+            pod_node_affinity = check_pod_node_affinity(pending_pod)
+            if pod_node_affinity == {}:
+                return True
+            if node_group_labels is None:
+                node_group_labels = self.check_node_group_labels(node_selector_label)
+            if pod_node_affinity.items() <= node_group_labels.items():
+                return True
+        return False
+
+    @timed
+    def _list_nodes_summary(self) -> list:
+        """
+            Summarize all the cluster nodes, streamed page by page
+
+            Returns:
+                :return a list of the NodeRecord of each node
+        """
+        return [node_record(node, self.extended_resources) for node in self._iterate_nodes()]
+
+    @timed
+    def _sum_nodes_usage_by_node(self, label_selector: Optional[str] = None) -> dict:
+        """
+            Get the actually used CPU & memory of each cluster node as reported by the metrics-server
 
-        limited_resources_pending_pod = False
-        pod_list = self.v1.list_pod_for_all_namespaces(watch=False, field_selector="status.phase=Pending",
-                                                       timeout_seconds=15)
-        for pending_pod in pod_list.items:
-            if pending_pod.status.conditions[0].reason == "Unschedulable":
-                if "nodes" in str(pending_pod.status.conditions[0].message):
-                    if ("cpu" in pending_pod.status.conditions[0].message) or \
-                            ("memory" in pending_pod.status.conditions[0].message) or \
-                            ("gpu" in pending_pod.status.conditions[0].message) or \
-                            ("ephemeral-storage" in pending_pod.status.conditions[0].message) or \
-                            ("node affinity/selector" in pending_pod.status.conditions[0].message):
-                        if node_selector_label is None:
-                            limited_resources_pending_pod = True
-                        else:
-                            if check_pod_node_affinity(pending_pod) == {} or \
-                                    check_pod_node_affinity(pending_pod).items() <= \
-                                    self.check_node_group_labels(node_selector_label).items() or \
-                                    check_pod_node_affinity(pending_pod).items() <= \
-                                    self.check_node_group_labels(node_selector_label).items():
-                                limited_resources_pending_pod = True
-                        break
-        return limited_resources_pending_pod
+            Arguments:
+                :param label_selector: optional label to only get the metrics of the nodes matching it, should be a
+                string in the format of "key=value"
+
+            Returns:
+                :return a dict of node name to a [used_cpu, used_memory] list
+        """
+        usage_by_node = {}
+        with API_CALL_DURATION.labels(api="metrics_server_list_nodes").time():
+            if label_selector:
+                current_used_metrics = self.custom_object_api.list_cluster_custom_object(
+                    'metrics.k8s.io', 'v1beta1', 'nodes', label_selector=label_selector, **self.request_kwargs)
+            else:
+                current_used_metrics = self.custom_object_api.list_cluster_custom_object(
+                    'metrics.k8s.io', 'v1beta1', 'nodes', **self.request_kwargs)
+        if self.recorder is not None:
+            self.recorder.record_node_metrics(current_used_metrics)
+        for metric_node in current_used_metrics['items']:
+            node_usage = usage_by_node.setdefault(metric_node.get('metadata', {}).get('name'), [0, 0])
+            node_usage[0] += unit_converter(metric_node['usage']['cpu'])
+            node_usage[1] += unit_converter(metric_node['usage']['memory'])
+        return usage_by_node
+
+    @timed
+    def _summarize_pending_pods(self) -> list:
+        """
+            Summarize all the pending pods of the cluster, streamed page by page
+
+            Returns:
+                :return a list of the PendingPodRecord of each pending pod, only the stuck ones keep their node
+                affinity & requests
+        """
+        return [pending_pod_record(pending_pod, self.extended_resources)
+                for pending_pod in self._iterate_pods("Pending", timeout_seconds=15)]
+
+    @timed
+    def take_snapshot(self) -> ClusterSnapshot:
+        """
+            Take a single snapshot of the whole cluster (nodes, running pods, metrics-server usage & pending
+            pods) which can then be split in memory by node group, the 4 API calls are run concurrently (or only the
+            metrics-server one when a ClusterAggregator is attached)
+
+            Returns:
+                :return a ClusterSnapshot of the cluster
+        """
+        # the recorder needs every object passing through it so recorded runs always read the full cluster
+        if self.aggregator is not None and self.recorder is None:
+            snapshot = self.aggregator.take_snapshot(self._sum_nodes_usage_by_node(), taken_at=self.snapshot_time)
+            LISTED_OBJECTS.labels(kind="nodes").set(len(snapshot.nodes))
+            LISTED_OBJECTS.labels(kind="running_pods").set(len(self.aggregator.running_pods))
+            LISTED_OBJECTS.labels(kind="pending_pods").set(len(snapshot.pending_pods))
+            return snapshot
+        collected = run_concurrently({
+            "nodes": self._list_nodes_summary,
+            "pods": self._list_pods_by_node,
+            "metrics": self._sum_nodes_usage_by_node,
+            "pending_pods": self._summarize_pending_pods
+        }, max_workers=self.max_workers, timeout_seconds=self.call_timeout_seconds)
+        LISTED_OBJECTS.labels(kind="nodes").set(len(collected["nodes"]))
+        LISTED_OBJECTS.labels(kind="running_pods").set(sum(len(node_pods) for node_pods in collected["pods"].values()))
+        LISTED_OBJECTS.labels(kind="pending_pods").set(len(collected["pending_pods"]))
+        return ClusterSnapshot(nodes=collected["nodes"], pods_by_node=collected["pods"],
+                               usage_by_node=collected["metrics"], pending_pods=collected["pending_pods"],
+                               taken_at=self.snapshot_time, extended_resources=self.extended_resources)
@@ -0,0 +1,59 @@
+from functools import lru_cache
+import re
+
+# the binary SI suffixes of the kubernetes quantity grammar & the power of 2 each multiplies by
+BINARY_SI_SUFFIXES = {
+    "Ki": 2 ** 10,
+    "Mi": 2 ** 20,
+    "Gi": 2 ** 30,
+    "Ti": 2 ** 40,
+    "Pi": 2 ** 50,
+    "Ei": 2 ** 60
+}
+
+# the decimal SI suffixes of the kubernetes quantity grammar & the power of 10 exponent of each, these are applied as
+# a decimal exponent (rather then multiplying by a float) so "10500m" is exactly 10.5
+DECIMAL_SI_SUFFIXES = {
+    "n": "e-9",
+    "u": "e-6",
+    "m": "e-3",
+    "": "e0",
+    "k": "e3",
+    "M": "e6",
+    "G": "e9",
+    "T": "e12",
+    "P": "e15",
+    "E": "e18"
+}
+
+QUANTITY_PATTERN = re.compile(r"^([+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+))(?:([eE][+-]?[0-9]+)|([a-zA-Z]*))$")
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(quantity: str) -> float:
+    """
+        Parse a kubernetes resource quantity string (for example "100m", "256Mi", "1.5Gi", "2k" or "1e3") to a float,
+        this supports the full kubernetes quantity grammar (binary SI, decimal SI & decimal exponent suffixes)
+
+        the results are memoized as real clusters repeat the same small set of quantity strings over & over again
+
+        Arguments:
+            :param quantity: the kubernetes quantity string to parse
+
+        Returns:
+            :return the quantity as a unit free float (cores for CPU, bytes for memory, etc)
+
+        Raises:
+            :raise TypeError: if the string isn't a valid kubernetes quantity
+    """
+    match = QUANTITY_PATTERN.match(str(quantity).strip())
+    if match is None:
+        raise TypeError("invalid kubernetes quantity " + repr(quantity))
+    number, exponent, suffix = match.groups()
+    if exponent is not None:
+        return float(number + exponent)
+    if suffix in BINARY_SI_SUFFIXES:
+        return float(number) * BINARY_SI_SUFFIXES[suffix]
+    if suffix in DECIMAL_SI_SUFFIXES:
+        return float(number + DECIMAL_SI_SUFFIXES[suffix])
+    raise TypeError("invalid kubernetes quantity suffix " + repr(quantity))
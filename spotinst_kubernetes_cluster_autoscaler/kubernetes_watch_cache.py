@@ -0,0 +1,241 @@
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from typing import Callable, Optional
+import sys
+import threading
+import time
+
+
+def label_selector_matches(labels: Optional[dict], label_selector: Optional[str] = None) -> bool:
+    """
+        Check if a set of labels matches a kubernetes equality based label selector, supports the same
+        "key=value,key2!=value2,key3,!key4" syntax the kubernetes API accepts (but not the set based "in"/"notin" one)
+
+        Arguments:
+            :param labels: the labels of the object to check, None is treated as no labels
+            :param label_selector: the label selector to match against, None or an empty string matches everything
+
+        Returns:
+            :return True if the labels match the selector, False otherwise
+    """
+    if label_selector is None or label_selector == "":
+        return True
+    labels = labels or {}
+    for requirement in label_selector.split(","):
+        requirement = requirement.strip()
+        if "!=" in requirement:
+            key, value = requirement.split("!=", 1)
+            if labels.get(key.strip()) == value.strip():
+                return False
+        elif "=" in requirement:
+            key, value = requirement.split("=", 1)
+            if labels.get(key.strip().rstrip("=")) != value.strip().lstrip("="):
+                return False
+        elif requirement.startswith("!"):
+            if requirement[1:].strip() in labels:
+                return False
+        elif requirement not in labels:
+            return False
+    return True
+
+
+def object_key(item) -> str:
+    """
+        Get the unique cache key of a kubernetes object
+
+        Arguments:
+            :param item: the kubernetes object
+
+        Returns:
+            :return "namespace/name" for namespaced objects, "name" for cluster wide objects
+    """
+    if item.metadata.namespace is None:
+        return item.metadata.name
+    return item.metadata.namespace + "/" + item.metadata.name
+
+
+class KubeWatchCache:
+    """
+       An in memory cache of the cluster nodes & pods which is kept up to date by kubernetes watch streams (in the
+       same list then watch way the kubernetes informers work), used when running as a long running daemon so each
+       scaling decision is an in memory lookup rather then a full LIST of the cluster
+    """
+
+    def __init__(self, v1, watch_timeout_seconds: int = 300, retry_seconds: int = 5, aggregator=None):
+        """
+           Init the cache, note that no data is fetched until start() is called
+
+           Arguments:
+               :param v1: the kubernetes CoreV1Api object used to list & watch the cluster
+               :param watch_timeout_seconds: the number of seconds each watch request stays open before it's renewed
+               :param retry_seconds: the number of seconds to wait before relisting after an unexpected watch failure
+               :param aggregator: optional ClusterAggregator every (re)LIST & watch event is passed on to so it keeps
+               its running totals up to date, as it holds everything a snapshot needs the cache then keeps only the
+               keys of the objects rather then the objects themselves (& can't be listed)
+        """
+        self.v1 = v1
+        self.watch_timeout_seconds = watch_timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.aggregator = aggregator
+        self.nodes = {}
+        self.pods = {}
+        self.lock = threading.Lock()
+        self.synced = {
+            "nodes": threading.Event(),
+            "pods": threading.Event()
+        }
+        self.threads = []
+        self.stopped = threading.Event()
+
+    def start(self):
+        """
+            Start a background watch thread per resource type, each will do an initial LIST & then keep the cache up
+            to date from the watch stream from then on
+        """
+        for kind, list_function in (("nodes", self.v1.list_node), ("pods", self.v1.list_pod_for_all_namespaces)):
+            informer_thread = threading.Thread(target=self._run_informer, args=(kind, list_function),
+                                               name="watch-" + kind, daemon=True)
+            informer_thread.start()
+            self.threads.append(informer_thread)
+
+    def stop(self):
+        """
+            Signal the watch threads to stop, they will exit when their current watch request ends
+        """
+        self.stopped.set()
+
+    def wait_for_sync(self, timeout: Optional[float] = None) -> bool:
+        """
+            Block until both the nodes & pods caches finished their initial LIST
+
+            Arguments:
+                :param timeout: the maximum number of seconds to wait, None waits forever
+
+            Returns:
+                :return True if both caches are synced, False if the timeout passed first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for synced_event in self.synced.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if synced_event.wait(remaining) is False:
+                return False
+        return True
+
+    def replace(self, kind: str, items: list):
+        """
+            Replace the entire content of one of the caches, used after each (re)LIST
+
+            Arguments:
+                :param kind: which cache to replace, "nodes" or "pods"
+                :param items: the kubernetes objects returned by the LIST
+        """
+        # with an aggregator only the keys are kept so the whole kubernetes objects can be freed once it summarized them
+        keep_objects = self.aggregator is None
+        store = {object_key(item): item if keep_objects else None for item in items}
+        with self.lock:
+            if kind == "nodes":
+                self.nodes = store
+            else:
+                self.pods = store
+        if self.aggregator is not None:
+            self.aggregator.replace(kind, items)
+        self.synced[kind].set()
+
+    def apply_event(self, kind: str, event_type: str, item):
+        """
+            Apply a single watch event to one of the caches
+
+            Arguments:
+                :param kind: which cache the event is for, "nodes" or "pods"
+                :param event_type: the watch event type, "ADDED", "MODIFIED" or "DELETED"
+                :param item: the kubernetes object the event is about
+        """
+        store = self.nodes if kind == "nodes" else self.pods
+        with self.lock:
+            if event_type == "DELETED":
+                store.pop(object_key(item), None)
+            elif event_type in ("ADDED", "MODIFIED"):
+                store[object_key(item)] = item if self.aggregator is None else None
+        if self.aggregator is not None:
+            self.aggregator.apply_event(kind, event_type, item)
+
+    def list_nodes(self, label_selector: Optional[str] = None) -> list:
+        """
+            Get the cached nodes
+
+            Arguments:
+                :param label_selector: optional label selector to filter the nodes by, should be a string in the
+                format of "key=value"
+
+            Returns:
+                :return a list of the matching node objects
+
+            Raises:
+                :raise ValueError: if the cache has an aggregator & so keeps no objects to list
+        """
+        self._check_objects_kept()
+        with self.lock:
+            nodes = list(self.nodes.values())
+        return [node for node in nodes if label_selector_matches(node.metadata.labels, label_selector)]
+
+    def list_pods(self, phase: Optional[str] = None, node_name: Optional[str] = None) -> list:
+        """
+            Get the cached pods
+
+            Arguments:
+                :param phase: optional pod phase to filter by (for example "Running" or "Pending")
+                :param node_name: optional node name to filter by, only returning the pods placed on that node
+
+            Returns:
+                :return a list of the matching pod objects
+
+            Raises:
+                :raise ValueError: if the cache has an aggregator & so keeps no objects to list
+        """
+        self._check_objects_kept()
+        with self.lock:
+            pods = list(self.pods.values())
+        return [pod for pod in pods if (phase is None or pod.status.phase == phase) and
+                (node_name is None or pod.spec.node_name == node_name)]
+
+    def _check_objects_kept(self):
+        """
+            Raises:
+                :raise ValueError: if the cache has an aggregator & so keeps only the keys of the objects
+        """
+        if self.aggregator is not None:
+            print("the watch cache keeps only the object keys when it has an aggregator, take snapshots from the "
+                  "aggregator instead", file=sys.stderr)
+            raise ValueError
+
+    def _run_informer(self, kind: str, list_function: Callable):
+        """
+            The body of each watch thread, LIST the resource, then watch it from the returned resourceVersion and
+            relist whenever the watch expires (HTTP 410) or fails
+
+            Arguments:
+                :param kind: which cache this thread feeds, "nodes" or "pods"
+                :param list_function: the CoreV1Api list function of the resource
+        """
+        while not self.stopped.is_set():
+            try:
+                object_list = list_function(watch=False)
+                self.replace(kind, object_list.items)
+                resource_version = object_list.metadata.resource_version
+                while not self.stopped.is_set():
+                    kube_watch = watch.Watch()
+                    for event in kube_watch.stream(list_function, resource_version=resource_version,
+                                                   timeout_seconds=self.watch_timeout_seconds):
+                        self.apply_event(kind, event["type"], event["object"])
+                    resource_version = kube_watch.resource_version
+            except ApiException as e:
+                if e.status != 410:
+                    print("watching " + kind + " failed, relisting in " + str(self.retry_seconds) + " seconds",
+                          file=sys.stderr)
+                    print(e, file=sys.stderr)
+                    self.stopped.wait(self.retry_seconds)
+            except Exception as e:
+                print("watching " + kind + " failed, relisting in " + str(self.retry_seconds) + " seconds",
+                      file=sys.stderr)
+                print(e, file=sys.stderr)
+                self.stopped.wait(self.retry_seconds)
@@ -1,70 +1,881 @@
+from spotinst_kubernetes_cluster_autoscaler.cluster_aggregator import *
+from spotinst_kubernetes_cluster_autoscaler.cluster_snapshot import *
 from spotinst_kubernetes_cluster_autoscaler.configure import *
 from spotinst_kubernetes_cluster_autoscaler.kubernetes_get_scaling_data import *
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import *
+from spotinst_kubernetes_cluster_autoscaler.metrics import *
+from spotinst_kubernetes_cluster_autoscaler.profiling import *
+from spotinst_kubernetes_cluster_autoscaler.scaling_state import *
+from spotinst_kubernetes_cluster_autoscaler.snapshot_recording import *
 from spotinst_kubernetes_cluster_autoscaler.spotinst_scale import *
+from spotinst_kubernetes_cluster_autoscaler.usage_forecast import *
+from spotinst_kubernetes_cluster_autoscaler.utilization_history import *
+from typing import Tuple, Union
+import time
 
 
-def main_logic_flow():
+@timed
+def pending_pods_scale_up_count(group_configuration: dict, snapshot: ClusterSnapshot) -> int:
     """
-        The main logic process, first read the configuration options, then get the current cluster CPU, Memory usage &
-        check if there are any pod deployments waiting for resources, then pass those params to the logic which decides
-        if it needs to scale up or down and then scale the spotinst elastigroup if needed before exiting
+        Decide how many nodes to add to a node group for its stuck pods, if "scale_up_bin_packing" is set this is the
+        number of nodes the stuck pods requests bin pack onto so they can all be placed in a single step, otherwise (or
+        if the node group has no nodes to take the shape of) it's the fixed "scale_up_count"
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+
+        Returns:
+            :return the number of nodes to add to the node group
+    """
+    if group_configuration["scale_up_bin_packing"] is True:
+        nodes_needed = snapshot.get_nodes_needed_for_stuck_pods(
+            node_selector_label=group_configuration["node_selector_label"])
+        if nodes_needed is not None and nodes_needed > 0:
+            print("the stuck pods need " + str(nodes_needed) + " more nodes to be placed")
+            return nodes_needed
+    return group_configuration["scale_up_count"]
+
+
+@timed
+def low_usage_scale_down_count(group_configuration: dict, snapshot: ClusterSnapshot) -> int:
+    """
+        Decide how many nodes to remove from a node group with low usage, if "scale_down_simulation" is set this is the
+        largest number of its least utilized nodes whose pods can be repacked onto the rest of the node group (see
+        ClusterSnapshot.get_safe_scale_down_count), otherwise it's the fixed "scale_down_count"
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+
+        Returns:
+            :return the number of nodes to remove from the node group, 0 if it isn't safe to remove any
+    """
+    if group_configuration["scale_down_simulation"] is True:
+        safe_scale_down_count = snapshot.get_safe_scale_down_count(
+            node_selector_label=group_configuration["node_selector_label"],
+            min_nodes=group_configuration["min_node_count"],
+            max_cpu_usage=group_configuration["max_cpu_usage"],
+            max_memory_usage=group_configuration["max_memory_usage"],
+            max_extended_usage={resource_name: thresholds.get("max_usage") for resource_name, thresholds in
+                                (group_configuration["extended_resources"] or {}).items()})
+        print("the largest safe scale down count is " + str(safe_scale_down_count))
+        return safe_scale_down_count
+    return group_configuration["scale_down_count"]
+
+
+def extended_resources_usage(group_configuration: dict, snapshot: ClusterSnapshot) -> dict:
+    """
+        Get the usage percentage of each extended resource (GPUs, local storage, hugepages...) the node group has
+        thresholds for in its "extended_resources", these have no metrics-server usage so it's the requested out of the
+        allocatable
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+
+        Returns:
+            :return a dict of extended resource name to its usage percentage, resources none of the node group nodes
+            have are left out
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    snapshot_usage = snapshot.get_extended_resources_usage(
+        node_selector_label=group_configuration["node_selector_label"])
+    group_usage = {}
+    for resource_name in group_configuration["extended_resources"] or {}:
+        if resource_name not in snapshot_usage:
+            continue
+        group_usage[resource_name] = snapshot_usage[resource_name]
+        print("current " + resource_name + " usage is " + str(group_usage[resource_name]) + "%")
+        EXTENDED_RESOURCE_USAGE.labels(elastigroup=elastigroup_id, resource=resource_name).set(
+            group_usage[resource_name])
+    return group_usage
+
+
+def group_scaling_state(group_configuration: dict, connected_nodes: int,
+                        scaling_state: Optional[ScalingState] = None) -> Tuple[int, bool, bool]:
+    """
+        Get what the scaling state knows about a node group, how many of the nodes of its last scale up are still
+        joining the cluster & if it's within its scale up or scale down stabilization window
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param connected_nodes: the number of the node group nodes connected to the cluster
+            :param scaling_state: optional ScalingState the node group scale actions are recorded in, with none there
+            are no nodes in flight & no stabilization windows
+
+        Returns:
+            :return in_flight_nodes: the number of nodes still joining the cluster
+            :return scale_up_waits: True if the node group was scaled up within "scale_up_stabilization_seconds"
+            :return scale_down_waits: True if the node group was scaled within "scale_down_stabilization_seconds"
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    in_flight_nodes = 0
+    scale_up_waits = scale_down_waits = False
+    if scaling_state is not None:
+        in_flight_nodes = scaling_state.in_flight_nodes(elastigroup_id, connected_nodes)
+        scale_up_waits = scaling_state.in_stabilization_window(
+            elastigroup_id, "scale_up", group_configuration["scale_up_stabilization_seconds"])
+        scale_down_waits = scaling_state.in_stabilization_window(
+            elastigroup_id, "scale_down", group_configuration["scale_down_stabilization_seconds"])
+        if in_flight_nodes > 0:
+            print(str(in_flight_nodes) + " nodes of the last scale up haven't joined the cluster yet")
+    IN_FLIGHT_NODES.labels(elastigroup=elastigroup_id).set(in_flight_nodes)
+    return in_flight_nodes, scale_up_waits, scale_down_waits
+
+
+def scale_up_group(group_configuration: dict, spotinst_connection: SpotinstScale, scale_up_count: int,
+                   connected_nodes: int, in_flight_nodes: int,
+                   scaling_state: Optional[ScalingState] = None) -> Optional[str]:
+    """
+        Scale up a node group elastigroup & record the nodes actually added in the scaling state
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param spotinst_connection: the SpotinstScale object used to scale the node group elastigroup
+            :param scale_up_count: the number of nodes to add
+            :param connected_nodes: the number of the node group nodes connected to the cluster
+            :param in_flight_nodes: the number of nodes of the last scale up still joining the cluster
+            :param scaling_state: optional ScalingState to record the scale up in
+
+        Returns:
+            :return action_taken: "scaled_up" or None if no node was added as the elastigroup is at its max_nodes
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    previous_target = spotinst_connection.get_desired_capacity()
+    server_count = spotinst_connection.scale_up(scale_up_count)
+    if server_count is None or server_count <= previous_target:
+        return None
+    print("scaled up to " + str(server_count) + "servers")
+    SCALE_ACTIONS.labels(elastigroup=elastigroup_id, action="scaled_up").inc()
+    # only the nodes this scale up actually added (the max_nodes cap may have cut it short) are expected to join on
+    # top of the ones already connected or still joining
+    if scaling_state is not None:
+        scaling_state.record_scale_up(elastigroup_id, connected_nodes + in_flight_nodes + server_count -
+                                      previous_target)
+    return "scaled_up"
+
+
+def pending_pods_scaling(group_configuration: dict, snapshot: ClusterSnapshot, spotinst_connection: SpotinstScale,
+                         pending_pods_number: int, connected_nodes: int, in_flight_nodes: int, scale_up_waits: bool,
+                         scaling_state: Optional[ScalingState] = None) -> Optional[str]:
+    """
+        Scale up a node group for its stuck pods by as many nodes as they need (see pending_pods_scale_up_count),
+        unless the nodes still joining the cluster will make room for them or it's within its scale up stabilization
+        window
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+            :param spotinst_connection: the SpotinstScale object used to scale the node group elastigroup
+            :param pending_pods_number: the number of pods stuck for lack of resources the node group could provide
+            :param connected_nodes: the number of the node group nodes connected to the cluster
+            :param in_flight_nodes: the number of nodes of the last scale up still joining the cluster
+            :param scale_up_waits: True if the node group is within its scale up stabilization window
+            :param scaling_state: optional ScalingState to record the scale up in
+
+        Returns:
+            :return action_taken: "scaled_up" or None if no rescaling was needed
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    DECISIONS.labels(elastigroup=elastigroup_id, branch="pending_pods").inc()
+    # the nodes still joining are already on their way to place the stuck pods so only the rest are added
+    scale_up_count = pending_pods_scale_up_count(group_configuration, snapshot) - in_flight_nodes
+    if scale_up_count <= 0:
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="pending_pods_in_flight").inc()
+        print("there are " + str(pending_pods_number) + " pending pods but the nodes still joining the "
+              "cluster will make room for them, not scaling up")
+        return None
+    if scale_up_waits is True:
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="scale_up_stabilization").inc()
+        print("there are " + str(pending_pods_number) + " pending pods but the node group was scaled up "
+              "within the last " + str(group_configuration["scale_up_stabilization_seconds"]) +
+              " seconds, not scaling up")
+        return None
+    print("there are " + str(pending_pods_number) + " pending pods, scaling up number of kubernetes nodes")
+    return scale_up_group(group_configuration, spotinst_connection, scale_up_count, connected_nodes,
+                          in_flight_nodes, scaling_state=scaling_state)
+
+
+def spread_over_in_flight_nodes(usage: dict, connected_nodes: int, in_flight_nodes: int) -> dict:
+    """
+        Get the usage once the nodes still joining the cluster join (assuming they're the same size as the connected
+        ones) so a scale up is decided on that usage rather then adding nodes for the same demand again
+
+        Arguments:
+            :param usage: a dict of resource name to its usage percentage over the connected nodes
+            :param connected_nodes: the number of the node group nodes connected to the cluster
+            :param in_flight_nodes: the number of nodes of the last scale up still joining the cluster
+
+        Returns:
+            :return a dict of resource name to its usage percentage over the connected & the joining nodes
+    """
+    if in_flight_nodes <= 0 or connected_nodes <= 0:
+        return usage
+    return {resource_name: int(resource_usage * connected_nodes / (connected_nodes + in_flight_nodes))
+            for resource_name, resource_usage in usage.items()}
+
+
+def high_usage(group_configuration: dict, usage: dict) -> bool:
+    """
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param usage: a dict of resource name ("cpu", "memory" or an extended resource) to its usage percentage
+
+        Returns:
+            :return True if any one of the resources is at or over its max usage, False otherwise
+    """
+    max_usage = {resource_name: thresholds.get("max_usage") for resource_name, thresholds in
+                 (group_configuration["extended_resources"] or {}).items()}
+    max_usage.update(cpu=group_configuration["max_cpu_usage"], memory=group_configuration["max_memory_usage"])
+    return any(max_usage.get(resource_name) is not None and resource_usage >= max_usage[resource_name]
+               for resource_name, resource_usage in usage.items())
+
+
+def low_usage(group_configuration: dict, usage: dict) -> bool:
+    """
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param usage: a dict of resource name ("cpu", "memory" or an extended resource) to its usage percentage
+
+        Returns:
+            :return True if all of the resources with a min usage are under it, False otherwise
+    """
+    min_usage = {resource_name: thresholds.get("min_usage") for resource_name, thresholds in
+                 (group_configuration["extended_resources"] or {}).items()}
+    min_usage.update(cpu=group_configuration["min_cpu_usage"], memory=group_configuration["min_memory_usage"])
+    return all(min_usage.get(resource_name) is None or resource_usage < min_usage[resource_name]
+               for resource_name, resource_usage in usage.items())
+
+
+def low_usage_scaling(group_configuration: dict, snapshot: ClusterSnapshot, spotinst_connection: SpotinstScale,
+                      scaling_state: Optional[ScalingState] = None) -> Optional[str]:
+    """
+        Scale down a node group with low usage by as many nodes as it's safe to remove (see
+        low_usage_scale_down_count)
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+            :param spotinst_connection: the SpotinstScale object used to scale the node group elastigroup
+            :param scaling_state: optional ScalingState to record the scale down in
+
+        Returns:
+            :return action_taken: "scaled_down" or None if it isn't safe to remove any node
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    scale_down_count = low_usage_scale_down_count(group_configuration, snapshot)
+    if scale_down_count <= 0:
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="low_usage_not_safe").inc()
+        print("low memory/cpu usage but removing a node would leave pods with no room to be placed, not "
+              "scaling down")
+        return None
+    DECISIONS.labels(elastigroup=elastigroup_id, branch="low_usage").inc()
+    print("scaling down due to low memory/cpu usage")
+    server_count = spotinst_connection.scale_down(scale_down_count)
+    print("scaled down to " + str(server_count) + "servers")
+    SCALE_ACTIONS.labels(elastigroup=elastigroup_id, action="scaled_down").inc()
+    if scaling_state is not None:
+        scaling_state.record_scale_down(elastigroup_id, server_count)
+    return "scaled_down"
+
+
+def usage_scaling(group_configuration: dict, snapshot: ClusterSnapshot, spotinst_connection: SpotinstScale,
+                  usage: dict, connected_nodes: int, in_flight_nodes: int, scale_up_waits: bool,
+                  scale_down_waits: bool, scaling_state: Optional[ScalingState] = None) -> Optional[str]:
+    """
+        Scale a node group up if any one of its CPU, memory or extended resources usage is high or down if all of
+        them are low, never down while nodes of a scale up are still joining or within the stabilization windows
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+            :param spotinst_connection: the SpotinstScale object used to scale the node group elastigroup
+            :param usage: a dict of resource name ("cpu", "memory" or an extended resource) to its usage percentage
+            :param connected_nodes: the number of the node group nodes connected to the cluster
+            :param in_flight_nodes: the number of nodes of the last scale up still joining the cluster
+            :param scale_up_waits: True if the node group is within its scale up stabilization window
+            :param scale_down_waits: True if the node group is within its scale down stabilization window
+            :param scaling_state: optional ScalingState to record the scale actions in
+
+        Returns:
+            :return action_taken: "scaled_up", "scaled_down" or None if no rescaling was needed
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    scale_up_usage = spread_over_in_flight_nodes(usage, connected_nodes, in_flight_nodes)
+    if scale_up_usage is not usage:
+        print("CPU usage counting the nodes still joining is " + str(scale_up_usage["cpu"]) + "%")
+        print("memory usage counting the nodes still joining is " + str(scale_up_usage["memory"]) + "%")
+    scale_up_active = group_configuration["scale_up_active"] is True
+    scale_down = group_configuration["scale_down_active"] is True and low_usage(group_configuration, usage)
+    # on high cpu/memory/extended resources usage scale up, it's enough to have just one of them be high to scale up
+    if scale_up_active and high_usage(group_configuration, scale_up_usage) and scale_up_waits is True:
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="scale_up_stabilization").inc()
+        print("high memory/cpu usage but the node group was scaled up within the last " +
+              str(group_configuration["scale_up_stabilization_seconds"]) + " seconds, not scaling up")
+    elif scale_up_active and high_usage(group_configuration, scale_up_usage):
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="high_usage").inc()
+        print("scaling up due to high memory/cpu usage")
+        return scale_up_group(group_configuration, spotinst_connection, group_configuration["scale_up_count"],
+                              connected_nodes, in_flight_nodes, scaling_state=scaling_state)
+    # still high usage which the nodes joining will take care of
+    elif scale_up_active and high_usage(group_configuration, usage):
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="high_usage_in_flight").inc()
+        print("high memory/cpu usage but the nodes still joining the cluster will bring it down, not scaling up")
+    # on low cpu/memory usage scale down, all are needed to be low to scale down, never while nodes of a scale up
+    # are still joining or within the stabilization window of the last scale
+    elif scale_down and (in_flight_nodes > 0 or scale_down_waits is True):
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="scale_down_stabilization").inc()
+        print("low memory/cpu usage but the node group was scaled within the last " +
+              str(group_configuration["scale_down_stabilization_seconds"]) + " seconds or has nodes still "
+              "joining the cluster, not scaling down")
+    elif scale_down:
+        return low_usage_scaling(group_configuration, snapshot, spotinst_connection, scaling_state=scaling_state)
+    # otherwise were done here
+    else:
+        DECISIONS.labels(elastigroup=elastigroup_id, branch="no_rescaling").inc()
+        print("no rescaling needed")
+    return None
+
+
+def group_usage(group_configuration: dict, snapshot: ClusterSnapshot,
+                usage_history: Optional[UtilizationHistory] = None) -> Tuple[int, int]:
+    """
+        Get the CPU & memory usage a node group is decided on, its current usage or if there is a usage history the
+        usage smoothed by its "usage_smoothing" method (or the usage forecast by its "usage_forecast" method if that is
+        higher)
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+            :param usage_history: optional UtilizationHistory to record the current usage in
+
+        Returns:
+            :return used_cpu_percentage: the CPU usage percentage to decide on
+            :return used_memory_percentage: the memory usage percentage to decide on
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    used_cpu_percentage, used_memory_percentage = snapshot.get_cpu_and_mem_usage(
+        node_selector_label=group_configuration["node_selector_label"])
+    print("current CPU usage is " + str(used_cpu_percentage) + "%")
+    print("current memory usage is " + str(used_memory_percentage) + "%")
+    CPU_USAGE.labels(elastigroup=elastigroup_id, kind="current").set(used_cpu_percentage)
+    MEMORY_USAGE.labels(elastigroup=elastigroup_id, kind="current").set(used_memory_percentage)
+    if usage_history is None:
+        return used_cpu_percentage, used_memory_percentage
+    usage_history.add_sample(elastigroup_id, used_cpu_percentage, used_memory_percentage)
+    # with no smoothing the history is only kept for the forecast & the current usage is decided on as is
+    if group_configuration["usage_smoothing"] is not None:
+        used_cpu_percentage, used_memory_percentage = usage_history.smoothed_usage(
+            elastigroup_id, method=group_configuration["usage_smoothing"],
+            ewma_alpha=group_configuration["usage_ewma_alpha"],
+            usage_percentile=group_configuration["usage_percentile"])
+        print("smoothed CPU usage is " + str(used_cpu_percentage) + "%")
+        print("smoothed memory usage is " + str(used_memory_percentage) + "%")
+        CPU_USAGE.labels(elastigroup=elastigroup_id, kind="smoothed").set(used_cpu_percentage)
+        MEMORY_USAGE.labels(elastigroup=elastigroup_id, kind="smoothed").set(used_memory_percentage)
+    # when forecasting the decision is made on the higher of the current & the forecast usage so the node group is
+    # scaled up ahead of crossing the threshold (& not scaled down right before a ramp)
+    if group_configuration["usage_forecast"] is not None:
+        forecast_cpu_percentage, forecast_memory_percentage = forecast_usage(
+            usage_history.window_samples(elastigroup_id),
+            method=group_configuration["usage_forecast"],
+            horizon_seconds=group_configuration["usage_forecast_horizon_seconds"],
+            alpha=group_configuration["usage_forecast_alpha"], beta=group_configuration["usage_forecast_beta"])
+        print("forecast CPU usage in " + str(group_configuration["usage_forecast_horizon_seconds"]) +
+              " seconds is " + str(forecast_cpu_percentage) + "%")
+        print("forecast memory usage in " + str(group_configuration["usage_forecast_horizon_seconds"]) +
+              " seconds is " + str(forecast_memory_percentage) + "%")
+        CPU_USAGE.labels(elastigroup=elastigroup_id, kind="forecast").set(forecast_cpu_percentage)
+        MEMORY_USAGE.labels(elastigroup=elastigroup_id, kind="forecast").set(forecast_memory_percentage)
+        used_cpu_percentage = max(used_cpu_percentage, forecast_cpu_percentage)
+        used_memory_percentage = max(used_memory_percentage, forecast_memory_percentage)
+    return used_cpu_percentage, used_memory_percentage
+
+
+def group_scaling_decision(group_configuration: dict, snapshot: ClusterSnapshot, spotinst_connection: SpotinstScale,
+                           usage_history: Optional[UtilizationHistory] = None,
+                           scaling_state: Optional[ScalingState] = None) -> Optional[str]:
+    """
+        Decide if a single node group needs to scale up or down based on its share of the cluster snapshot (its CPU,
+        memory & extended resources usage & if there are any pods waiting for resources it could provide) and then
+        scale its spotinst elastigroup if needed
+
+        Arguments:
+            :param group_configuration: the node group configuration dict as returned by get_node_groups
+            :param snapshot: the ClusterSnapshot of the cluster this decision is made against
+            :param spotinst_connection: the SpotinstScale object used to scale the node group elastigroup
+            :param usage_history: optional UtilizationHistory the node group usage is recorded in, if passed the
+            decision is made on the usage smoothed by the node group "usage_smoothing" method (or on the usage forecast
+            by its "usage_forecast" method if that is higher)
+            :param scaling_state: optional ScalingState the node group scale actions are recorded in, if passed the
+            nodes still joining from its last scale up are counted as capacity & the node group
+            "scale_up_stabilization_seconds" & "scale_down_stabilization_seconds" are honoured
+
+        Returns:
+            :return action_taken: "scaled_up", "scaled_down" or None if no rescaling was needed
+    """
+    elastigroup_id = group_configuration["elastigroup_id"]
+    node_selector_label = group_configuration["node_selector_label"]
+    connected_nodes = snapshot.get_connected_nodes_count(node_selector_label=node_selector_label)
+    CONNECTED_NODES.labels(elastigroup=elastigroup_id).set(connected_nodes)
+    in_flight_nodes, scale_up_waits, scale_down_waits = group_scaling_state(group_configuration, connected_nodes,
+                                                                            scaling_state=scaling_state)
+
+    # check if there are any pods stuck for lack of resources the node group could provide and if there are scale it up
+    pending_pods_number = snapshot.get_number_of_stuck_pods(
+        node_selector_label=node_selector_label, minimum_pending_seconds=group_configuration["seconds_to_check"])
+    if pending_pods_number > 0 and group_configuration["scale_up_active"] is True and \
+            group_configuration["scale_on_pending_pods"] is True:
+        return pending_pods_scaling(group_configuration, snapshot, spotinst_connection, pending_pods_number,
+                                    connected_nodes, in_flight_nodes, scale_up_waits, scaling_state=scaling_state)
+
+    # otherwise check the cpu & memory (& extended resources) usage
+    used_cpu_percentage, used_memory_percentage = group_usage(group_configuration, snapshot,
+                                                              usage_history=usage_history)
+    usage = {"cpu": used_cpu_percentage, "memory": used_memory_percentage}
+    usage.update(extended_resources_usage(group_configuration, snapshot))
+    return usage_scaling(group_configuration, snapshot, spotinst_connection, usage, connected_nodes,
+                         in_flight_nodes, scale_up_waits, scale_down_waits, scaling_state=scaling_state)
+
+
+def collect_scaling_inputs(configuration: dict, kube_connection: KubeGetScaleData, spotinst_connections: dict,
+                           recorder: Optional[SnapshotRecorder] = None) -> ClusterSnapshot:
+    """
+        Collect the cluster snapshot & the desired capacity of each elastigroup (only fetched from spotinst if not
+        already tracked), these don't depend on each other so they are all collected concurrently up front
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object used to get the cluster state
+            :param spotinst_connections: a dict of elastigroup ID to the SpotinstScale object used to scale it
+            :param recorder: optional SnapshotRecorder (attached to the kube_connection) to record the inputs with
+
+        Returns:
+            :return the ClusterSnapshot of the cluster
+    """
+    print("collecting cluster snapshot & elastigroups size")
+    if recorder is not None:
+        recorder.start()
+    calls = {"snapshot": kube_connection.take_snapshot}
+    for elastigroup_id, spotinst_connection in spotinst_connections.items():
+        calls["desired_capacity:" + elastigroup_id] = spotinst_connection.get_desired_capacity
+    with timed_phase("collect"):
+        collected = run_concurrently(calls, max_workers=configuration["collection_max_workers"],
+                                     timeout_seconds=configuration["collection_timeout_seconds"])
+    PENDING_PODS.set(collected["snapshot"].get_number_of_pending_pods())
+    if recorder is not None:
+        for elastigroup_id in spotinst_connections:
+            recorder.record_desired_capacity(elastigroup_id, collected["desired_capacity:" + elastigroup_id])
+    return collected["snapshot"]
+
+
+def save_run_state(usage_history: Optional[UtilizationHistory] = None, scaling_state: Optional[ScalingState] = None,
+                   recorder: Optional[SnapshotRecorder] = None):
+    """
+        Save whatever a scaling decision run keeps to its store once all node groups are checked
+
+        Arguments:
+            :param usage_history: optional UtilizationHistory to save
+            :param scaling_state: optional ScalingState to save
+            :param recorder: optional SnapshotRecorder to save the recording of the run of
+    """
+    if usage_history is not None:
+        with timed_phase("save_usage_history"):
+            usage_history.save()
+    if scaling_state is not None:
+        with timed_phase("save_scaling_state"):
+            scaling_state.save()
+    if recorder is not None:
+        with timed_phase("save_recording"):
+            recorder.save()
+
+
+def scaling_decision(configuration: dict, kube_connection: KubeGetScaleData, spotinst_connections: dict,
+                     usage_history: Optional[UtilizationHistory] = None,
+                     recorder: Optional[SnapshotRecorder] = None,
+                     scaling_state: Optional[ScalingState] = None) -> dict:
+    """
+        Take a single snapshot of the cluster (nodes, pods, CPU & memory usage) then split it by node group & make an
+        independent scaling decision for each node group, a failure to scale one node group doesn't stop the others
+        from being scaled
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object used to get the cluster state
+            :param spotinst_connections: a dict of elastigroup ID to the SpotinstScale object used to scale it
+            :param usage_history: optional UtilizationHistory to record the usage of each node group in & make the
+            decisions on the smoothed usage, it's saved to its store once all node groups are checked
+            :param recorder: optional SnapshotRecorder (attached to the kube_connection) to record the inputs of the
+            run to a file once all node groups are checked
+            :param scaling_state: optional ScalingState to count the nodes still joining as capacity & honour the
+            stabilization windows with, it's saved to its store once all node groups are checked
+
+        Returns:
+            :return actions_taken: a dict of elastigroup ID to the action taken for it ("scaled_up", "scaled_down" or
+            None if no rescaling was needed)
+    """
+    snapshot = collect_scaling_inputs(configuration, kube_connection, spotinst_connections, recorder=recorder)
+    # a stuck pod any node group could place is only scaled up for by one of them rather then by each
+    snapshot.assign_unpinned_stuck_pods([group_configuration["node_selector_label"]
+                                         for group_configuration in get_node_groups(configuration)
+                                         if group_configuration["scale_up_active"] is True and
+                                         group_configuration["scale_on_pending_pods"] is True])
+
+    actions_taken = {}
+    failed_node_groups = []
+    for group_configuration in get_node_groups(configuration):
+        elastigroup_id = group_configuration["elastigroup_id"]
+        print("checking node group of elastigroup " + elastigroup_id)
+        try:
+            with timed_phase("group_decision"):
+                actions_taken[elastigroup_id] = group_scaling_decision(group_configuration, snapshot,
+                                                                       spotinst_connections[elastigroup_id],
+                                                                       usage_history=usage_history,
+                                                                       scaling_state=scaling_state)
+        except Exception as e:
+            print("failed scaling decision of elastigroup " + elastigroup_id, file=sys.stderr)
+            print(e, file=sys.stderr)
+            ERRORS.labels(stage="group_scaling_decision").inc()
+            failed_node_groups.append(elastigroup_id)
+    save_run_state(usage_history=usage_history, scaling_state=scaling_state, recorder=recorder)
+    if failed_node_groups:
+        raise Exception("failed scaling decision of elastigroups " + ", ".join(failed_node_groups))
+
+    return actions_taken
+
+
+def run_scaling_decision(configuration: dict, kube_connection: KubeGetScaleData, spotinst_connections: dict,
+                         usage_history: Optional[UtilizationHistory] = None,
+                         recorder: Optional[SnapshotRecorder] = None,
+                         scaling_state: Optional[ScalingState] = None) -> dict:
+    """
+        Run a single scaling decision (see scaling_decision) timing each of its phases, profiled if
+        "profile_output_path" is set, & print a single line summary of where the time went once it's done
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object used to get the cluster state
+            :param spotinst_connections: a dict of elastigroup ID to the SpotinstScale object used to scale it
+            :param usage_history: optional UtilizationHistory to record the usage of each node group in
+            :param recorder: optional SnapshotRecorder to record the inputs of the run with
+            :param scaling_state: optional ScalingState to count the nodes still joining as capacity with
+
+        Returns:
+            :return actions_taken: a dict of elastigroup ID to the action taken for it
+    """
+    reset_run_timings()
+    try:
+        with profiled_run(configuration["profile_output_path"]):
+            with timed_phase("scaling_decision"):
+                return scaling_decision(configuration, kube_connection, spotinst_connections,
+                                        usage_history=usage_history, recorder=recorder, scaling_state=scaling_state)
+    finally:
+        print("run timings: " + run_timings_summary())
+
+
+def start_watch_cache(configuration: dict, kube_connection: KubeGetScaleData,
+                      recording: bool = False) -> KubeWatchCache:
+    """
+        Start watching the cluster nodes & pods & wait for the initial LIST, the watch events keep the running totals
+        of a ClusterAggregator the snapshots are taken from (so the cache keeps only the object keys), unless the runs
+        are recorded in which case the recorder needs the whole objects so they are kept in the cache & the snapshots
+        are read from it
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object the aggregator or the watch cache is attached to
+            :param recording: True if the runs are recorded with a SnapshotRecorder
+
+        Returns:
+            :return the synced KubeWatchCache, to be stopped once done
+    """
+    if recording is True:
+        watch_cache = KubeWatchCache(kube_connection.v1)
+    else:
+        aggregator = ClusterAggregator((group_configuration["node_selector_label"]
+                                        for group_configuration in get_node_groups(configuration)),
+                                       extended_resources=kube_connection.extended_resources)
+        watch_cache = KubeWatchCache(kube_connection.v1, aggregator=aggregator)
+    watch_cache.start()
+    watch_cache.wait_for_sync()
+    if watch_cache.aggregator is not None:
+        kube_connection.attach_aggregator(watch_cache.aggregator)
+    else:
+        kube_connection.attach_watch_cache(watch_cache)
+    return watch_cache
+
+
+def daemon_logic_flow(configuration: dict, kube_connection: KubeGetScaleData, spotinst_connections: dict,
+                      usage_history: Optional[UtilizationHistory] = None, max_cycles: Optional[int] = None,
+                      recorder: Optional[SnapshotRecorder] = None, scaling_state: Optional[ScalingState] = None):
+    """
+        The long running process, start watching the cluster nodes & pods into an in memory cache (& running totals
+        of each node group kept up to date from each watch event) then rerun the scaling decision against those every
+        "daemon_interval_seconds", a failed cycle is logged & retried on the next interval rather then exiting
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object used to get the cluster state
+            :param spotinst_connections: a dict of elastigroup ID to the SpotinstScale object used to scale it
+            :param usage_history: optional UtilizationHistory kept across the cycles to make the decisions on the
+            smoothed usage
+            :param max_cycles: optional number of scaling decisions to run before returning, defaults to forever
+            :param recorder: optional SnapshotRecorder to record the inputs of each cycle with
+            :param scaling_state: optional ScalingState kept across the cycles to count the nodes still joining as
+            capacity & honour the stabilization windows with
+    """
+    print("starting to watch the cluster nodes & pods")
+    watch_cache = start_watch_cache(configuration, kube_connection, recording=recorder is not None)
+    print("cluster nodes & pods cache synced")
+
+    cycles = 0
+    while max_cycles is None or cycles < max_cycles:
+        try:
+            run_scaling_decision(configuration, kube_connection, spotinst_connections, usage_history=usage_history,
+                                 recorder=recorder, scaling_state=scaling_state)
+        except Exception as e:
+            print("failed scaling decision cycle - retrying next cycle", file=sys.stderr)
+            print(e, file=sys.stderr)
+            ERRORS.labels(stage="scaling_decision").inc()
+        cycles += 1
+        if max_cycles is None or cycles < max_cycles:
+            time.sleep(configuration["daemon_interval_seconds"])
+    watch_cache.stop()
+
+
+def create_store(configuration: dict, kube_connection: KubeGetScaleData, prefix: str, data_key: str):
+    """
+        Create the store configured by the "<prefix>_store", "<prefix>_file_path", "<prefix>_configmap_name" &
+        "<prefix>_configmap_namespace" configuration variables
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object whose kubernetes connection the ConfigMap store uses
+            :param prefix: the prefix of the configuration variables, for example "usage_history"
+            :param data_key: the key of the ConfigMap data the JSON is kept under when using the ConfigMap store
+
+        Returns:
+            :return a FileHistoryStore, a ConfigMapHistoryStore or None when only kept in memory
+
+        Raises:
+            :raise ValueError: if "<prefix>_store" isn't one of "memory", "file" or "configmap"
+    """
+    if configuration[prefix + "_store"] == "file":
+        return FileHistoryStore(configuration[prefix + "_file_path"])
+    elif configuration[prefix + "_store"] == "configmap":
+        return ConfigMapHistoryStore(kube_connection.v1, name=configuration[prefix + "_configmap_name"],
+                                     namespace=configuration[prefix + "_configmap_namespace"], data_key=data_key)
+    elif configuration[prefix + "_store"] == "memory":
+        return None
+    print(prefix + "_store must be one of 'memory', 'file' or 'configmap'", file=sys.stderr)
+    raise ValueError
+
+
+@timed
+def create_usage_history(configuration: dict, kube_connection: KubeGetScaleData) -> UtilizationHistory:
+    """
+        Create the usage history with the store configured by "usage_history_store" & load whatever was saved to it by
+        previous runs
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object whose kubernetes connection the ConfigMap store uses
+
+        Returns:
+            :return the loaded UtilizationHistory
+
+        Raises:
+            :raise ValueError: if "usage_history_store" isn't one of "memory", "file" or "configmap"
+    """
+    store = create_store(configuration, kube_connection, "usage_history", data_key="history.json")
+    usage_history = UtilizationHistory(store=store, max_samples=configuration["usage_history_size"],
+                                       window_seconds=configuration["usage_window_seconds"])
+    usage_history.load()
+    return usage_history
+
+
+@timed
+def create_scaling_state(configuration: dict, kube_connection: KubeGetScaleData) -> ScalingState:
+    """
+        Create the scaling state with the store configured by "scaling_state_store" & load whatever was saved to it by
+        previous runs
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param kube_connection: the KubeGetScaleData object whose kubernetes connection the ConfigMap store uses
+
+        Returns:
+            :return the loaded ScalingState
+
+        Raises:
+            :raise ValueError: if "scaling_state_store" isn't one of "memory", "file" or "configmap"
+    """
+    store = create_store(configuration, kube_connection, "scaling_state", data_key="scaling_state.json")
+    scaling_state = ScalingState(store=store, node_boot_timeout_seconds=configuration["node_boot_timeout_seconds"])
+    scaling_state.load()
+    return scaling_state
+
+
+def create_kube_connection(configuration: dict) -> KubeGetScaleData:
+    """
+        Create the kubernetes connection object configured by the configuration
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+
+        Returns:
+            :return the KubeGetScaleData object used to get the cluster state
+    """
+    return KubeGetScaleData(connection_method=configuration["kube_connection_method"],
+                            api_endpoint=configuration["kube_api_endpoint"],
+                            context_name=configuration["kubeconfig_context"],
+                            token=configuration["kube_token"],
+                            kubeconfig_path=configuration["kubeconfig_path"],
+                            page_size=configuration["list_page_size"],
+                            raw_json=configuration["raw_json_listing"],
+                            max_workers=configuration["collection_max_workers"],
+                            call_timeout_seconds=configuration["collection_timeout_seconds"],
+                            extended_resources=get_extended_resources(configuration))
+
+
+def create_spotinst_connections(configuration: dict) -> dict:
+    """
+        Create a spotinst connection object per node group elastigroup
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+
+        Returns:
+            :return a dict of elastigroup ID to the SpotinstScale object used to scale it
+    """
+    spotinst_connections = {}
+    for group_configuration in get_node_groups(configuration):
+        spotinst_connections[group_configuration["elastigroup_id"]] = SpotinstScale(
+            auth_token=configuration["spotinst_token"],
+            elastigroup=group_configuration["elastigroup_id"],
+            spotinst_account=group_configuration["spotinst_account"],
+            min_nodes=group_configuration["min_node_count"],
+            max_nodes=group_configuration["max_node_count"],
+            connect_timeout=configuration["spotinst_connect_timeout"],
+            read_timeout=configuration["spotinst_read_timeout"],
+            retries=configuration["spotinst_retries"],
+            backoff_factor=configuration["spotinst_backoff_factor"],
+            capacity_max_age_seconds=configuration["capacity_max_age_seconds"],
+            api_url=configuration["spotinst_api_url"])
+    return spotinst_connections
+
+
+def replay_snapshot(configuration: dict, recording_path: str) -> dict:
+    """
+        Rerun the scaling decision against a run recorded by SnapshotRecorder, offline & with no network at all (the
+        cluster is served from the recording & the elastigroups are only resized in memory), the decision is made as
+        of when the run was recorded but with the thresholds of the configuration passed so they can be tuned
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param recording_path: the path of the recording
+
+        Returns:
+            :return a dict with the "actions_taken" (a dict of elastigroup ID to the action taken for it), the
+            "resized_to" desired capacity of each elastigroup (None if it wasn't resized) & the "wall_seconds" the
+            decision took
+    """
+    recorded_cluster = RecordedCluster(load_recording(recording_path))
+    # no request is ever sent to the endpoint as everything is read from the recorded cluster
+    kube_connection = KubeGetScaleData(connection_method="api", api_endpoint="http://replay.invalid", token="replay",
+                                       max_workers=configuration["collection_max_workers"],
+                                       extended_resources=get_extended_resources(configuration))
+    kube_connection.attach_watch_cache(recorded_cluster)
+    kube_connection.custom_object_api = recorded_cluster
+    kube_connection.snapshot_time = recorded_cluster.recorded_at
+
+    spotinst_connections = {}
+    for group_configuration in get_node_groups(configuration):
+        spotinst_connections[group_configuration["elastigroup_id"]] = ReplaySpotinstScale(
+            recorded_desired_capacity=recorded_cluster.desired_capacity[group_configuration["elastigroup_id"]],
+            auth_token="replay",
+            elastigroup=group_configuration["elastigroup_id"],
+            spotinst_account=group_configuration["spotinst_account"],
+            min_nodes=group_configuration["min_node_count"],
+            max_nodes=group_configuration["max_node_count"])
+
+    start_time = time.perf_counter()
+    actions_taken = run_scaling_decision(configuration, kube_connection, spotinst_connections)
+    return {
+        "actions_taken": actions_taken,
+        "resized_to": {elastigroup_id: spotinst_connection.resized_to
+                       for elastigroup_id, spotinst_connection in spotinst_connections.items()},
+        "wall_seconds": time.perf_counter() - start_time
+    }
+
+
+def single_group_action(configuration: dict, actions_taken: dict) -> Union[Optional[str], dict]:
+    """
+        Get what main_logic_flow returns for the actions taken by a scaling decision, without "node_groups" there is
+        a single node group so that is the action taken for it (as before node groups were added), otherwise it's the
+        action taken for each of the node groups
+
+        Arguments:
+            :param configuration: the autoscaler configuration dict as returned by read_configurations
+            :param actions_taken: a dict of elastigroup ID to the action taken for it as returned by scaling_decision
+
+        Returns:
+            :return the action taken for the single node group ("scaled_up", "scaled_down" or None) or the
+            actions_taken dict when "node_groups" are configured
+    """
+    if configuration["node_groups"] is None:
+        return actions_taken[configuration["elastigroup_id"]]
+    return actions_taken
+
+
+def main_logic_flow() -> Union[Optional[str], dict]:
+    """
+        The main logic process, first read the configuration options, then either run the scaling decision a single
+        time & exit (when running as a cronjob) or keep running it on an interval (when running as a daemon)
+
+        Returns:
+            :return when running as a cronjob the action taken ("scaled_up", "scaled_down" or None if no rescaling was
+            needed), or a dict of elastigroup ID to the action taken for it when "node_groups" are configured, None
+            when running as a daemon
     """
     try:
         # read configuration
         print("Starting spotinst_kubernetes_cluster_autoscaler")
         configuration = read_configurations(os.getenv("CONFIG_DIR", "config"))
+        if configuration["metrics_port"] is not None or configuration["metrics_pushgateway"] is not None:
+            enable_metrics()
+
+        kube_connection = create_kube_connection(configuration)
+        spotinst_connections = create_spotinst_connections(configuration)
+        usage_history = create_usage_history(configuration, kube_connection)
+        scaling_state = create_scaling_state(configuration, kube_connection)
+        recorder = None
+        if configuration["snapshot_record_dir"] is not None:
+            recorder = SnapshotRecorder(configuration["snapshot_record_dir"])
+            kube_connection.attach_recorder(recorder)
 
-        # create kube connection object
-        kube_connection = KubeGetScaleData(connection_method=configuration["kube_connection_method"],
-                                           api_endpoint=configuration["kube_api_endpoint"],
-                                           context_name=configuration["kubeconfig_context"],
-                                           token=configuration["kube_token"],
-                                           kubeconfig_path=configuration["kubeconfig_path"])
-
-        # create spotinst connection object
-        spotinst_connection = SpotinstScale(auth_token=configuration["spotinst_token"],
-                                            elastigroup=configuration["elastigroup_id"],
-                                            spotinst_account=configuration["spotinst_account"],
-                                            min_nodes=configuration["min_node_count"],
-                                            max_nodes=configuration["max_node_count"])
-
-        # check if there are any stuck pods and if there are scale the cluster up
-        print("checking if there are any stuck pods")
-        if kube_connection.pending_pods_exist(seconds_to_wait_between_checks=configuration["seconds_to_check"]) is \
-                True and configuration["scale_up_active"] is True and configuration["scale_on_pending_pods"] is True:
-            pending_pods_number = kube_connection.get_number_of_pending_pods()
-            if kube_connection.check_pods_stuck_do_to_insufficient_resource(
-                    node_selector_label=configuration["node_selector_label"]) is True:
-                print("there are " + str(pending_pods_number) + " pending pods, scaling up number of kubernetes nodes")
-                server_count = spotinst_connection.scale_up(configuration["scale_up_count"])
-                print("scaled up to " + str(server_count) + "servers")
-            action_taken = "scaled_up"
-        # otherwise check the cpu & memory usage
+        if configuration["run_mode"] == "daemon":
+            if configuration["metrics_port"] is not None:
+                print("serving metrics on port " + str(configuration["metrics_port"]))
+                start_metrics_server(configuration["metrics_port"])
+            daemon_logic_flow(configuration, kube_connection, spotinst_connections, usage_history=usage_history,
+                              recorder=recorder, scaling_state=scaling_state)
+            action_taken = None
         else:
-            used_cpu_percentage, used_memory_percentage = kube_connection.get_cpu_and_mem_usage(
-                node_selector_label=configuration["node_selector_label"])
-            print("current cluster CPU usage is " + str(used_cpu_percentage) + "%")
-            print("current cluster memory usage is " + str(used_memory_percentage) + "%")
-            # on high cpu/memory usage scale up, it's enough to have just one of them be high to scale up
-            if configuration["scale_up_active"] is True and (used_cpu_percentage >= configuration["max_cpu_usage"] or
-                                                             used_memory_percentage >=
-                                                             configuration["max_memory_usage"]):
-                print("scaling up due to high memory/cpu usage")
-                server_count = spotinst_connection.scale_up(configuration["scale_up_count"])
-                print("scaled up to " + str(server_count) + "servers")
-                action_taken = "scaled_up"
-            # on low cpu/memory usage scale down, both are needed to be low to scale down
-            elif used_cpu_percentage < configuration["min_cpu_usage"] and \
-                    used_memory_percentage < configuration["min_memory_usage"] and configuration["scale_down_active"] \
-                    is True:
-                print("scaling down due to low memory/cpu usage")
-                server_count = spotinst_connection.scale_down(configuration["scale_down_count"])
-                print("scaled down to " + str(server_count) + "servers")
-                action_taken = "scaled_down"
-            # otherwise were done here
-            else:
-                print("no rescaling needed, exiting")
-                action_taken = None
+            # a cronjob exits before it could ever be scraped so its metrics are pushed instead, even if it failed
+            try:
+                actions_taken = run_scaling_decision(configuration, kube_connection, spotinst_connections,
+                                                     usage_history=usage_history, recorder=recorder,
+                                                     scaling_state=scaling_state)
+            except Exception:
+                ERRORS.labels(stage="scaling_decision").inc()
+                raise
+            finally:
+                if configuration["metrics_pushgateway"] is not None:
+                    push_metrics(configuration["metrics_pushgateway"], job=configuration["metrics_job_name"])
+            print("exiting")
+            action_taken = single_group_action(configuration, actions_taken)
 
         return action_taken
 
@@ -0,0 +1,229 @@
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable
+import sys
+import threading
+import time
+
+
+class NoOpMetric:
+    """
+       Stands in for every prometheus metric until the metrics are enabled, so the code measuring things doesn't need
+       to check if the metrics are available
+    """
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount: float):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+class LazyMetric:
+    """
+       A prometheus metric which is only created once enable_metrics is called, importing prometheus_client takes a
+       noticeable part of a cronjob start up so it's only imported when the metrics are actually exposed, until then
+       the metric is a NoOpMetric
+    """
+
+    def __init__(self, metric_type: str, name: str, documentation: str, labelnames: tuple = ()):
+        """
+           Arguments:
+               :param metric_type: the prometheus_client metric class name, "Counter", "Gauge" or "Histogram"
+               :param name: the metric name
+               :param documentation: the metric help text
+               :param labelnames: the metric label names
+        """
+        self.metric_type = metric_type
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.metric = NoOpMetric()
+
+    def labels(self, *args, **kwargs):
+        return self.metric.labels(*args, **kwargs)
+
+    def observe(self, amount: float):
+        self.metric.observe(amount)
+
+    def set(self, value: float):
+        self.metric.set(value)
+
+    def inc(self, amount: float = 1):
+        self.metric.inc(amount)
+
+    def time(self):
+        return self.metric.time()
+
+
+# a dedicated registry so pushing to a pushgateway only pushes the autoscaler own metrics, None until enable_metrics
+REGISTRY = None
+API_CALL_DURATION = LazyMetric("Histogram", "spotinst_autoscaler_api_call_duration_seconds",
+                               "how long each kubernetes, metrics-server & spotinst API call took", ("api",))
+PHASE_DURATION = LazyMetric("Histogram", "spotinst_autoscaler_phase_duration_seconds",
+                            "how long each phase of the scaling decision took", ("phase",))
+LISTED_OBJECTS = LazyMetric("Gauge", "spotinst_autoscaler_listed_objects",
+                            "the number of nodes & pods read by the last cluster snapshot", ("kind",))
+PENDING_PODS = LazyMetric("Gauge", "spotinst_autoscaler_pending_pods", "the number of pods pending in the cluster")
+CPU_USAGE = LazyMetric("Gauge", "spotinst_autoscaler_cpu_usage_percent",
+                       "the CPU usage percentage of the node group, current, smoothed & forecast",
+                       ("elastigroup", "kind"))
+MEMORY_USAGE = LazyMetric("Gauge", "spotinst_autoscaler_memory_usage_percent",
+                          "the memory usage percentage of the node group, current, smoothed & forecast",
+                          ("elastigroup", "kind"))
+EXTENDED_RESOURCE_USAGE = LazyMetric("Gauge", "spotinst_autoscaler_extended_resource_usage_percent",
+                                     "the requested out of the allocatable percentage of each extended resource of "
+                                     "the node group", ("elastigroup", "resource"))
+CONNECTED_NODES = LazyMetric("Gauge", "spotinst_autoscaler_connected_nodes",
+                             "the number of nodes of the node group connected to the cluster", ("elastigroup",))
+IN_FLIGHT_NODES = LazyMetric("Gauge", "spotinst_autoscaler_in_flight_nodes",
+                             "the number of nodes scaled up for that haven't joined the cluster yet", ("elastigroup",))
+DESIRED_CAPACITY = LazyMetric("Gauge", "spotinst_autoscaler_desired_capacity",
+                              "the desired capacity (target) of the elastigroup", ("elastigroup",))
+DECISIONS = LazyMetric("Counter", "spotinst_autoscaler_decisions",
+                       "the number of times each branch of the scaling decision fired", ("elastigroup", "branch"))
+SCALE_ACTIONS = LazyMetric("Counter", "spotinst_autoscaler_scale_actions", "the number of scale ups & scale downs done",
+                           ("elastigroup", "action"))
+ERRORS = LazyMetric("Counter", "spotinst_autoscaler_errors", "the number of failures, by where they happened",
+                    ("stage",))
+LAZY_METRICS = (API_CALL_DURATION, PHASE_DURATION, LISTED_OBJECTS, PENDING_PODS, CPU_USAGE, MEMORY_USAGE,
+                EXTENDED_RESOURCE_USAGE, CONNECTED_NODES, IN_FLIGHT_NODES, DESIRED_CAPACITY, DECISIONS, SCALE_ACTIONS,
+                ERRORS)
+enable_metrics_lock = threading.Lock()
+
+
+def enable_metrics():
+    """
+        Import prometheus_client & create all of the metrics in a dedicated registry, anything measured before that
+        isn't recorded, calling it again does nothing
+
+        Returns:
+            :return the metrics registry
+
+        Raises:
+            :raise ImportError: if prometheus_client isn't installed
+    """
+    global REGISTRY
+    with enable_metrics_lock:
+        if REGISTRY is not None:
+            return REGISTRY
+        try:
+            import prometheus_client
+        except ImportError:
+            print("exposing metrics needs prometheus_client to be installed", file=sys.stderr)
+            raise
+        registry = prometheus_client.CollectorRegistry()
+        for lazy_metric in LAZY_METRICS:
+            lazy_metric.metric = getattr(prometheus_client, lazy_metric.metric_type)(
+                lazy_metric.name, lazy_metric.documentation, lazy_metric.labelnames, registry=registry)
+        REGISTRY = registry
+        return REGISTRY
+
+
+def start_metrics_server(port: int):
+    """
+        Serve the metrics on http://0.0.0.0:port/metrics for prometheus to scrape, from a background thread
+
+        Arguments:
+            :param port: the port to listen on
+
+        Raises:
+            :raise ImportError: if prometheus_client isn't installed
+    """
+    registry = enable_metrics()
+    from prometheus_client import start_http_server
+    start_http_server(port, registry=registry)
+
+
+def push_metrics(pushgateway: str, job: str):
+    """
+        Push the metrics to a prometheus pushgateway, a failure is logged rather then failing the run as the metrics
+        are only there to observe it
+
+        Arguments:
+            :param pushgateway: the pushgateway address, for example "pushgateway:9091"
+            :param job: the job label the metrics are grouped under in the pushgateway
+
+        Raises:
+            :raise ImportError: if prometheus_client isn't installed
+    """
+    registry = enable_metrics()
+    from prometheus_client import push_to_gateway
+    try:
+        push_to_gateway(pushgateway, job=job, registry=registry)
+    except Exception as e:
+        print("failed pushing the metrics to " + pushgateway, file=sys.stderr)
+        print(e, file=sys.stderr)
+
+
+# the total seconds & number of calls of each timed phase since the last reset_run_timings, summarized once per run
+run_timings = {}
+run_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed_phase(phase: str):
+    """
+        Time a block of code, the time is both observed by the phase duration histogram & added to the run timings
+
+        Arguments:
+            :param phase: the name of the phase, the same name used twice in a run adds up
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        PHASE_DURATION.labels(phase=phase).observe(elapsed)
+        with run_timings_lock:
+            phase_timing = run_timings.setdefault(phase, [0, 0.0])
+            phase_timing[0] += 1
+            phase_timing[1] += elapsed
+
+
+def timed(function: Callable) -> Callable:
+    """
+        Decorate a function (or method) to time every call to it as a phase named after it, for example
+        "SpotinstScale.scale_up"
+
+        Arguments:
+            :param function: the function to time
+
+        Returns:
+            :return the timed function
+    """
+    @wraps(function)
+    def timed_function(*args, **kwargs):
+        with timed_phase(function.__qualname__):
+            return function(*args, **kwargs)
+    return timed_function
+
+
+def reset_run_timings():
+    """
+        Forget the run timings, called at the start of each run
+    """
+    with run_timings_lock:
+        run_timings.clear()
+
+
+def run_timings_summary() -> str:
+    """
+        Returns:
+            :return a single line summary of the run timings, the slowest phases first, for example
+            "scaling_decision 1.204s, collect 1.113s, KubeGetScaleData._list_pods_by_node 1.102s, group_decision 0.004s
+            (x2)"
+    """
+    with run_timings_lock:
+        timings = sorted(run_timings.items(), key=lambda phase_timing: phase_timing[1][1], reverse=True)
+    return ", ".join(phase + " " + "{:.3f}".format(total_seconds) + "s" +
+                     (" (x" + str(calls) + ")" if calls > 1 else "") for phase, (calls, total_seconds) in timings)
@@ -0,0 +1,97 @@
+from contextlib import nullcontext
+from typing import Callable, Optional
+import cProfile
+import sys
+import threading
+
+# the profiler of the run currently being profiled, None when not profiling
+active_profiler = None
+
+
+class RunProfiler:
+    """
+       Profile a run with cProfile & dump the stats to a file once it's done, as cProfile only profiles the thread it
+       was enabled on calls run on worker threads (see run_concurrently) are profiled separately with profile_in_thread
+       & all of them are merged into a single stats file
+    """
+
+    def __init__(self, output_path: str):
+        """
+           Arguments:
+               :param output_path: the path of the file the stats are dumped to, it can be read with
+               "python -m pstats output_path"
+        """
+        self.output_path = output_path
+        self.profiles = []
+        self.profiles_lock = threading.Lock()
+
+    def add_profile(self, profile: cProfile.Profile):
+        """
+            Arguments:
+                :param profile: a finished profile of a worker thread to merge into the stats
+        """
+        with self.profiles_lock:
+            self.profiles.append(profile)
+
+    def __enter__(self):
+        global active_profiler
+        self.profiles = []
+        self.main_profile = cProfile.Profile()
+        active_profiler = self
+        self.main_profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global active_profiler
+        self.main_profile.disable()
+        active_profiler = None
+        try:
+            # pstats is only needed once a profile is written so it's not imported on every start up
+            import pstats
+            stats = pstats.Stats(self.main_profile)
+            for profile in self.profiles:
+                stats.add(profile)
+            stats.dump_stats(self.output_path)
+            print("profile of the run written to " + self.output_path)
+        except Exception as e:
+            print("failed writing the profile of the run to " + self.output_path, file=sys.stderr)
+            print(e, file=sys.stderr)
+        return False
+
+
+def profile_in_thread(call: Callable) -> Callable:
+    """
+        Wrap a call about to be run on a worker thread so it's profiled too if a run is being profiled
+
+        Arguments:
+            :param call: the function to call (with no arguments)
+
+        Returns:
+            :return the call as is when not profiling, otherwise the call wrapped with its own thread profile
+    """
+    profiler = active_profiler
+    if profiler is None:
+        return call
+
+    def profiled_call():
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return call()
+        finally:
+            profile.disable()
+            profiler.add_profile(profile)
+    return profiled_call
+
+
+def profiled_run(output_path: Optional[str]):
+    """
+        Arguments:
+            :param output_path: the path to write the profile of the run to, None to not profile it
+
+        Returns:
+            :return a context manager to wrap the run with, a RunProfiler if output_path is set
+    """
+    if output_path is None:
+        return nullcontext()
+    return RunProfiler(output_path)
@@ -0,0 +1,132 @@
+from typing import Optional
+import json
+import sys
+import time
+
+
+class ScalingState:
+    """
+       The last scale up & scale down of each node group & the nodes its last scale up asked for that haven't joined
+       the cluster yet (in flight), persisted between runs with the same stores as the usage history so a run doesn't
+       scale a node group up again for demand the nodes still booting from a previous run will already cover
+    """
+
+    def __init__(self, store=None, node_boot_timeout_seconds: float = 600):
+        """
+           Arguments:
+               :param store: optional FileHistoryStore or ConfigMapHistoryStore to persist the state between runs, if
+               None the state is only kept in memory (so only in daemon mode between cycles)
+               :param node_boot_timeout_seconds: nodes which haven't joined the cluster this many seconds after the
+               scale up that asked for them are assumed to never join & are no longer counted as in flight
+        """
+        self.store = store
+        self.node_boot_timeout_seconds = node_boot_timeout_seconds
+        self.groups = {}
+
+    def load(self):
+        """
+            Load the saved state from the store, a missing or corrupt state is logged & started over rather then
+            failing the run
+        """
+        if self.store is None:
+            return
+        try:
+            state_json = self.store.read()
+            if state_json is None:
+                return
+            self.groups = json.loads(state_json)
+        except Exception as e:
+            print("failed loading the scaling state - starting a new one", file=sys.stderr)
+            print(e, file=sys.stderr)
+
+    def save(self):
+        """
+            Save the state to the store, a failure is logged rather then failing the run
+        """
+        if self.store is None:
+            return
+        try:
+            self.store.write(json.dumps(self.groups))
+        except Exception as e:
+            print("failed saving the scaling state", file=sys.stderr)
+            print(e, file=sys.stderr)
+
+    def record_scale_up(self, group_name: str, wanted_nodes: int, timestamp: Optional[float] = None):
+        """
+            Arguments:
+                :param group_name: the node group scaled up (its elastigroup ID)
+                :param wanted_nodes: the number of nodes the node group was scaled up to
+                :param timestamp: the unix time of the scale up, defaults to now
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        group_state = self.groups.setdefault(group_name, {})
+        group_state["last_scale_up_at"] = timestamp
+        group_state["in_flight_target"] = wanted_nodes
+        group_state["in_flight_since"] = timestamp
+
+    def record_scale_down(self, group_name: str, wanted_nodes: int, timestamp: Optional[float] = None):
+        """
+            Arguments:
+                :param group_name: the node group scaled down (its elastigroup ID)
+                :param wanted_nodes: the number of nodes the node group was scaled down to, any nodes still in flight
+                above it are no longer expected to join
+                :param timestamp: the unix time of the scale down, defaults to now
+        """
+        group_state = self.groups.setdefault(group_name, {})
+        group_state["last_scale_down_at"] = time.time() if timestamp is None else timestamp
+        if "in_flight_target" in group_state:
+            group_state["in_flight_target"] = min(group_state["in_flight_target"], wanted_nodes)
+
+    def in_flight_nodes(self, group_name: str, connected_nodes: int, now: Optional[float] = None) -> int:
+        """
+            Get the number of nodes the last scale up of a node group asked for that haven't joined the cluster yet,
+            once they all joined (or node_boot_timeout_seconds passed) the scale up is forgotten
+
+            Arguments:
+                :param group_name: the node group to get the in flight nodes of (its elastigroup ID)
+                :param connected_nodes: the number of nodes of the node group connected to the cluster
+                :param now: the unix time to check at, defaults to now
+
+            Returns:
+                :return the number of nodes still in flight, 0 if there are none
+        """
+        now = time.time() if now is None else now
+        group_state = self.groups.get(group_name, {})
+        if "in_flight_target" not in group_state:
+            return 0
+        in_flight = group_state["in_flight_target"] - connected_nodes
+        if in_flight <= 0 or now - group_state["in_flight_since"] > self.node_boot_timeout_seconds:
+            del group_state["in_flight_target"]
+            del group_state["in_flight_since"]
+            return 0
+        return in_flight
+
+    def in_stabilization_window(self, group_name: str, action: str, window_seconds: float,
+                                now: Optional[float] = None) -> bool:
+        """
+            Check if a node group was scaled too recently to scale it again, a scale up only waits for the previous
+            scale up while a scale down waits for the previous scale of either direction so a node group is never
+            scaled down right after it was scaled up
+
+            Arguments:
+                :param group_name: the node group to check (its elastigroup ID)
+                :param action: the action about to be taken, "scale_up" or "scale_down"
+                :param window_seconds: the number of seconds after a scale the action has to wait for
+                :param now: the unix time to check at, defaults to now
+
+            Returns:
+                :return True if the action has to wait, False otherwise
+
+            Raises:
+                :raise ValueError: if passing an action that isn't "scale_up" or "scale_down"
+        """
+        now = time.time() if now is None else now
+        group_state = self.groups.get(group_name, {})
+        if action == "scale_up":
+            last_scales = [group_state.get("last_scale_up_at")]
+        elif action == "scale_down":
+            last_scales = [group_state.get("last_scale_up_at"), group_state.get("last_scale_down_at")]
+        else:
+            print("the action must be one of 'scale_up' or 'scale_down'", file=sys.stderr)
+            raise ValueError
+        return any(last_scale is not None and now - last_scale < window_seconds for last_scale in last_scales)
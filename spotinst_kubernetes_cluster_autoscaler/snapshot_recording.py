@@ -0,0 +1,280 @@
+from datetime import datetime, timezone
+from kubernetes import client
+from typing import Iterator, Optional
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_get_scaling_data import RawKubeObject
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import label_selector_matches
+from spotinst_kubernetes_cluster_autoscaler.spotinst_scale import SpotinstScale
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+
+def prune_container(container: dict) -> dict:
+    """
+        Keep only the name & requests of a container, so recordings never hold images, commands or environment values
+
+        Arguments:
+            :param container: the container kubernetes API JSON
+
+        Returns:
+            :return the pruned container JSON
+    """
+    return {"name": container.get("name"),
+            "resources": {"requests": (container.get("resources") or {}).get("requests")}}
+
+
+def prune_node(node: dict) -> dict:
+    """
+        Keep only the fields of a node the autoscaler reads
+
+        Arguments:
+            :param node: the node kubernetes API JSON
+
+        Returns:
+            :return the pruned node JSON
+    """
+    metadata = node.get("metadata") or {}
+    return {"metadata": {"name": metadata.get("name"), "labels": metadata.get("labels")},
+            "status": {"allocatable": (node.get("status") or {}).get("allocatable")}}
+
+
+def prune_pod(pod: dict) -> dict:
+    """
+        Keep only the fields of a pod the autoscaler reads (its requests, placement, owners & scheduling conditions)
+
+        Arguments:
+            :param pod: the pod kubernetes API JSON
+
+        Returns:
+            :return the pruned pod JSON
+    """
+    metadata = pod.get("metadata") or {}
+    spec = pod.get("spec") or {}
+    status = pod.get("status") or {}
+    annotations = metadata.get("annotations") or {}
+    pruned_spec = {
+        "nodeName": spec.get("nodeName"),
+        "nodeSelector": spec.get("nodeSelector"),
+        "containers": [prune_container(container) for container in spec.get("containers") or []],
+        "initContainers": [prune_container(container) for container in spec.get("initContainers") or []]
+    }
+    if spec.get("affinity") is not None:
+        pruned_spec["affinity"] = {"nodeAffinity": spec["affinity"].get("nodeAffinity")}
+    return {
+        "metadata": {
+            "name": metadata.get("name"),
+            "namespace": metadata.get("namespace"),
+            "creationTimestamp": metadata.get("creationTimestamp"),
+            "annotations": {key: value for key, value in annotations.items() if key == "kubernetes.io/config.mirror"},
+            "ownerReferences": [{"kind": owner_reference.get("kind")}
+                                for owner_reference in metadata.get("ownerReferences") or []]
+        },
+        "spec": pruned_spec,
+        "status": {
+            "phase": status.get("phase"),
+            "conditions": [{key: condition.get(key) for key in ("type", "status", "reason", "message",
+                                                                "lastTransitionTime")}
+                           for condition in status.get("conditions") or []]
+        }
+    }
+
+
+class SnapshotRecorder:
+    """
+       Record the raw inputs of each scaling decision (the nodes, the running & pending pods, the node metrics & the
+       desired capacity of each elastigroup) into a gzipped JSON file per run, pruned down to the fields the autoscaler
+       reads, so the exact decision can later be replayed offline with replay_snapshot
+    """
+
+    def __init__(self, record_dir: str):
+        """
+           Arguments:
+               :param record_dir: the folder a "snapshot-<UTC time>.json.gz" file is written to for each run
+        """
+        self.record_dir = record_dir
+        self.lock = threading.Lock()
+        # used only to turn kubernetes client models back into their API JSON
+        self.api_client = client.ApiClient()
+        self.start()
+
+    def start(self):
+        """
+            Forget whatever was recorded so far & start recording a new run
+        """
+        with self.lock:
+            self.recorded_at = datetime.now(timezone.utc)
+            self.nodes = []
+            self.pods = {}
+            self.node_metrics = None
+            self.desired_capacity = {}
+
+    def to_json(self, item) -> dict:
+        """
+            Arguments:
+                :param item: a RawKubeObject or a kubernetes client model
+
+            Returns:
+                :return the kubernetes API JSON of the item
+        """
+        if isinstance(item, RawKubeObject):
+            return item.raw
+        return self.api_client.sanitize_for_serialization(item)
+
+    def record_nodes(self, nodes: Iterator) -> Iterator:
+        """
+            Record the nodes of the run as they are iterated over
+
+            Arguments:
+                :param nodes: an iterator over all of the cluster node objects
+
+            Returns:
+                :return an iterator over the same node objects
+        """
+        recorded_nodes = []
+        for node in nodes:
+            recorded_nodes.append(prune_node(self.to_json(node)))
+            yield node
+        with self.lock:
+            self.nodes = recorded_nodes
+
+    def record_pods(self, phase: str, pods: Iterator) -> Iterator:
+        """
+            Record the pods of the run in a given phase as they are iterated over
+
+            Arguments:
+                :param phase: the pod phase the pods were listed by (for example "Running" or "Pending")
+                :param pods: an iterator over all of the cluster pod objects in that phase
+
+            Returns:
+                :return an iterator over the same pod objects
+        """
+        recorded_pods = []
+        for pod in pods:
+            recorded_pods.append(prune_pod(self.to_json(pod)))
+            yield pod
+        with self.lock:
+            self.pods[phase] = recorded_pods
+
+    def record_node_metrics(self, node_metrics: dict):
+        """
+            Arguments:
+                :param node_metrics: the metrics-server node metrics list as returned by the custom objects API
+        """
+        with self.lock:
+            self.node_metrics = {"items": [{"metadata": {"name": (metric_node.get("metadata") or {}).get("name")},
+                                            "usage": metric_node.get("usage")}
+                                           for metric_node in node_metrics.get("items", [])]}
+
+    def record_desired_capacity(self, elastigroup_id: str, desired_capacity: int):
+        """
+            Arguments:
+                :param elastigroup_id: the elastigroup the desired capacity is of
+                :param desired_capacity: the desired capacity of the elastigroup at the start of the run
+        """
+        with self.lock:
+            self.desired_capacity[elastigroup_id] = desired_capacity
+
+    def save(self) -> Optional[str]:
+        """
+            Write the recording of the run, a failure is logged rather then failing the run as the recording is only
+            there for later analysis
+
+            Returns:
+                :return the path the recording was written to, None if it failed
+        """
+        with self.lock:
+            recording = {
+                "recorded_at": self.recorded_at.isoformat(),
+                "nodes": self.nodes,
+                "pods": self.pods,
+                "node_metrics": self.node_metrics,
+                "desired_capacity": self.desired_capacity
+            }
+        path = os.path.join(self.record_dir, "snapshot-" + self.recorded_at.strftime("%Y%m%dT%H%M%S%fZ") + ".json.gz")
+        try:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with gzip.open(path + ".tmp", "wt") as recording_file:
+                json.dump(recording, recording_file, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+            print("recorded the run snapshot to " + path)
+            return path
+        except Exception as e:
+            print("failed recording the run snapshot to " + path, file=sys.stderr)
+            print(e, file=sys.stderr)
+            return None
+
+
+class RecordedCluster:
+    """
+       Serves a recording made by SnapshotRecorder in place of the cluster, it lists nodes & pods the same way a
+       KubeWatchCache does & node metrics the same way the custom objects API does so KubeGetScaleData runs against it
+       with no network at all
+    """
+
+    def __init__(self, recording: dict):
+        """
+           Arguments:
+               :param recording: the recording dict as loaded by load_recording
+        """
+        self.recorded_at = datetime.fromisoformat(recording["recorded_at"])
+        self.nodes = [RawKubeObject(node) for node in recording["nodes"]]
+        self.pods = [RawKubeObject(pod) for phase_pods in recording["pods"].values() for pod in phase_pods]
+        self.node_metrics = recording["node_metrics"] or {"items": []}
+        self.desired_capacity = recording["desired_capacity"]
+
+    def list_nodes(self, label_selector: Optional[str] = None) -> list:
+        return [node for node in self.nodes if label_selector_matches(node.metadata.labels, label_selector)]
+
+    def list_pods(self, phase: Optional[str] = None, node_name: Optional[str] = None) -> list:
+        return [pod for pod in self.pods if (phase is None or pod.status.phase == phase) and
+                (node_name is None or pod.spec.node_name == node_name)]
+
+    def list_cluster_custom_object(self, group: str, version: str, plural: str,
+                                   label_selector: Optional[str] = None, **kwargs) -> dict:
+        if not label_selector:
+            return self.node_metrics
+        node_names = {node.metadata.name for node in self.list_nodes(label_selector=label_selector)}
+        return {"items": [metric_node for metric_node in self.node_metrics["items"]
+                          if (metric_node.get("metadata") or {}).get("name") in node_names]}
+
+
+def load_recording(path: str) -> dict:
+    """
+        Arguments:
+            :param path: the path of a recording written by SnapshotRecorder
+
+        Returns:
+            :return the recording dict
+    """
+    with gzip.open(path, "rt") as recording_file:
+        return json.load(recording_file)
+
+
+class ReplaySpotinstScale(SpotinstScale):
+    """
+       A SpotinstScale which never calls the spotinst API, the elastigroup starts at its recorded desired capacity &
+       resizing it only updates the tracked desired capacity, so replayed decisions keep the same max/min capping
+    """
+
+    def __init__(self, recorded_desired_capacity: int, **kwargs):
+        """
+           Arguments:
+               :param recorded_desired_capacity: the desired capacity of the elastigroup when it was recorded
+               :param kwargs: the SpotinstScale arguments
+        """
+        super().__init__(**kwargs)
+        self.recorded_desired_capacity = recorded_desired_capacity
+        self.resized_to = None
+
+    def get_spotinst_desired_capacity(self) -> int:
+        return self.recorded_desired_capacity
+
+    def set_spotinst_elastigroup_size(self, wanted_nodes_number: int) -> bool:
+        with self.capacity_lock:
+            self.desired_capacity = wanted_nodes_number
+            self.desired_capacity_updated_at = time.monotonic()
+            self.resized_to = wanted_nodes_number
+        return True
@@ -1,5 +1,10 @@
+from requests.adapters import HTTPAdapter
+from spotinst_kubernetes_cluster_autoscaler.metrics import API_CALL_DURATION, DESIRED_CAPACITY, ERRORS, timed
+from urllib3.util.retry import Retry
 import requests
 import sys
+import threading
+import time
 
 
 class SpotinstScale:
@@ -8,7 +13,9 @@ class SpotinstScale:
        cluster & sending scale up/down requests to said group
     """
 
-    def __init__(self, auth_token: str, elastigroup: str, spotinst_account: str, min_nodes: int, max_nodes: int):
+    def __init__(self, auth_token: str, elastigroup: str, spotinst_account: str, min_nodes: int, max_nodes: int,
+                 connect_timeout: float = 5, read_timeout: float = 30, retries: int = 3, backoff_factor: float = 0.5,
+                 capacity_max_age_seconds: float = 300, api_url: str = "https://api.spotinst.io"):
         """
            Init the class with the basic data needed to use the spotinst API that is always common between the different
            calls needed
@@ -19,6 +26,14 @@ class SpotinstScale:
                :param spotinst_account: the spotinst account ID which the elastigroup is located at
                :param min_nodes: the minimum number of nodes wanted in the cluster elastigroup
                :param max_nodes: the maximum number of nodes wanted in the cluster elastigroup
+               :param connect_timeout: the number of seconds to wait for a connection to the spotinst API
+               :param read_timeout: the number of seconds to wait for the spotinst API to respond
+               :param retries: the number of times to retry a spotinst API request on connection errors & on 429/5xx
+               responses
+               :param backoff_factor: the base of the exponential backoff (with jitter) between retries, in seconds
+               :param capacity_max_age_seconds: the number of seconds the tracked desired capacity of the elastigroup
+               is trusted before it's fetched from spotinst again
+               :param api_url: the base URL of the spotinst API
         """
         self.elastigroup = elastigroup
         self.headers = {
@@ -29,26 +44,73 @@ class SpotinstScale:
         self.min_nodes = min_nodes
         self.max_nodes = max_nodes
         self.spotinst_account = spotinst_account
-        self.url = "https://api.spotinst.io/aws/ec2/group/" + self.elastigroup + "/instanceHealthiness?accountId=" + \
-                   self.spotinst_account
-
-    def get_spotinst_instances(self) -> int:
+        self.api_url = api_url
+        self.url = self.api_url + "/aws/ec2/group/" + self.elastigroup + "/instanceHealthiness?accountId=" + \
+            self.spotinst_account
+        self.timeout = (connect_timeout, read_timeout)
+
+        # a single persistent session so all requests reuse the same keep-alive connection to the spotinst API, both
+        # the GET & the PUT are idempotent so are safe to retry
+        retry = Retry(total=retries, backoff_factor=backoff_factor, backoff_jitter=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET", "PUT"],
+                      raise_on_status=False)
+        self.session = requests.Session()
+        self.session.mount(self.api_url, HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=4))
+        self.session.headers.update(self.headers)
+
+        # the desired capacity of the elastigroup is tracked here (seeded from spotinst & updated after each successful
+        # resize) so scaling doesn't need to fetch it first, the lock makes sure two concurrent scaling actions of this
+        # process can't both add to the same base, it does nothing across processes so two autoscalers (or two
+        # overlapping cronjob runs) scaling the same elastigroup can still overwrite each other, the cronjob relies on
+        # its concurrencyPolicy being Forbid for that
+        self.capacity_max_age_seconds = capacity_max_age_seconds
+        self.capacity_lock = threading.RLock()
+        self.desired_capacity = None
+        self.desired_capacity_updated_at = None
+
+    @timed
+    def get_spotinst_desired_capacity(self) -> int:
         """
-            Get the current number of spotinst nodes
+            Get the desired capacity (target) of the elastigroup from spotinst
 
             Returns:
-                :return current number of nodes in the elastigroup
-        """
-        url = "https://api.spotinst.io/aws/ec2/group/" + self.elastigroup + "/instanceHealthiness" + "?accountId=" + \
-              self.spotinst_account
+                :return the number of nodes the elastigroup is set to have
 
-        headers = self.headers
-
-        spotinst_response = requests.request("GET", url, headers=headers)
+            Raises:
+                :raise Exception: if the spotinst API failed to return the elastigroup (after retrying)
+        """
+        url = self.api_url + "/aws/ec2/group/" + self.elastigroup + "?accountId=" + self.spotinst_account
+
+        with API_CALL_DURATION.labels(api="spotinst_get_group").time():
+            spotinst_response = self.session.request("GET", url, timeout=self.timeout)
+        if not 200 <= spotinst_response.status_code < 300:
+            ERRORS.labels(stage="spotinst_api").inc()
+            print(spotinst_response, file=sys.stderr)
+            print("spotinst API failed to return the elastigroup", file=sys.stderr)
+            raise Exception
         response_json = spotinst_response.json()
 
-        return int(response_json["response"]["count"])
+        return int(response_json["response"]["items"][0]["capacity"]["target"])
 
+    @timed
+    def get_desired_capacity(self) -> int:
+        """
+            Get the tracked desired capacity of the elastigroup, it's only fetched from spotinst if it was never
+            fetched or if it's older then capacity_max_age_seconds, a desired capacity set by this autoscaler is trusted
+            until then even while the nodes it added are still joining the cluster
+
+            Returns:
+                :return the number of nodes the elastigroup is set to have
+        """
+        with self.capacity_lock:
+            if self.desired_capacity is None or \
+                    time.monotonic() - self.desired_capacity_updated_at > self.capacity_max_age_seconds:
+                self.desired_capacity = self.get_spotinst_desired_capacity()
+                self.desired_capacity_updated_at = time.monotonic()
+                DESIRED_CAPACITY.labels(elastigroup=self.elastigroup).set(self.desired_capacity)
+            return self.desired_capacity
+
+    @timed
     def set_spotinst_elastigroup_size(self, wanted_nodes_number: int) -> int:
         """
             Set the spotinst elastigroup size
@@ -62,23 +124,28 @@ class SpotinstScale:
             Raises:
                 :raise Exception: if the spotinst API failed to scale up/down as desired
         """
-        url = "https://api.spotinst.io/aws/ec2/group/" + self.elastigroup + "?accountId=" + self.spotinst_account
+        url = self.api_url + "/aws/ec2/group/" + self.elastigroup + "?accountId=" + self.spotinst_account
 
         payload = "{\"group\": { \"capacity\": { \"target\": " + str(wanted_nodes_number) + ", \"minimum\": " \
                   + str(self.min_nodes) + ", \"maximum\":" + str(self.max_nodes) + "}}}"
-        headers = self.headers
-
-        response = requests.request("PUT", url, data=payload, headers=headers)
+        with API_CALL_DURATION.labels(api="spotinst_update_group").time():
+            response = self.session.request("PUT", url, data=payload, timeout=self.timeout)
         if 200 <= response.status_code < 300:
+            with self.capacity_lock:
+                self.desired_capacity = wanted_nodes_number
+                self.desired_capacity_updated_at = time.monotonic()
+            DESIRED_CAPACITY.labels(elastigroup=self.elastigroup).set(wanted_nodes_number)
             return True
         else:
+            ERRORS.labels(stage="spotinst_api").inc()
             print(response, file=sys.stderr)
             print("spotinst API didn't accept the size increase", file=sys.stderr)
             raise Exception
 
+    @timed
     def scale_up(self, scale_count: int = 1) -> int:
         """
-            Scale up the current number of nodes by scale_count
+            Scale up the current number of nodes by scale_count, capped at max_nodes
 
             Arguments:
                 :param scale_count: the number of nodes you want to add to the cluster
@@ -86,20 +153,33 @@ class SpotinstScale:
             Returns:
                 :return wanted_number_of_nodes: the new number of nodes in the elastigroup
         """
-        wanted_number_of_nodes = self.get_spotinst_instances() + scale_count
-        if self.set_spotinst_elastigroup_size(wanted_number_of_nodes) is True:
-            return wanted_number_of_nodes
-
+        with self.capacity_lock:
+            desired_capacity = self.get_desired_capacity()
+            wanted_number_of_nodes = min(desired_capacity + scale_count, self.max_nodes)
+            if wanted_number_of_nodes <= desired_capacity:
+                print("elastigroup " + self.elastigroup + " is already at its maximum of " + str(self.max_nodes) +
+                      " nodes, not scaling up")
+                return desired_capacity
+            if self.set_spotinst_elastigroup_size(wanted_number_of_nodes) is True:
+                return wanted_number_of_nodes
+
+    @timed
     def scale_down(self, scale_count: int = 1) -> int:
         """
-            Scale down the current number of nodes by scale_count
+            Scale down the current number of nodes by scale_count, floored at min_nodes
 
             Arguments:
-                :param scale_count: the number of nodes you want to add to the cluster
+                :param scale_count: the number of nodes you want to remove from the cluster
 
             Returns:
                 :return wanted_number_of_nodes: the new number of nodes in the elastigroup
         """
-        wanted_number_of_nodes = self.get_spotinst_instances() - scale_count
-        if self.set_spotinst_elastigroup_size(wanted_number_of_nodes) is True:
-            return wanted_number_of_nodes
+        with self.capacity_lock:
+            desired_capacity = self.get_desired_capacity()
+            wanted_number_of_nodes = max(desired_capacity - scale_count, self.min_nodes)
+            if wanted_number_of_nodes >= desired_capacity:
+                print("elastigroup " + self.elastigroup + " is already at its minimum of " + str(self.min_nodes) +
+                      " nodes, not scaling down")
+                return desired_capacity
+            if self.set_spotinst_elastigroup_size(wanted_number_of_nodes) is True:
+                return wanted_number_of_nodes
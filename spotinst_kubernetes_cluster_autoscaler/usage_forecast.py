@@ -0,0 +1,93 @@
+from typing import Optional, Tuple
+import sys
+
+
+def linear_trend_forecast(times: list, values: list, horizon_seconds: float) -> float:
+    """
+        Forecast a value horizon_seconds after the last sample by fitting a least squares line through the samples
+
+        Arguments:
+            :param times: the unix time of each sample, oldest first
+            :param values: the value of each sample, in the same order as times
+            :param horizon_seconds: how many seconds after the last sample to forecast
+
+        Returns:
+            :return the forecast value, the last value if there aren't enough samples to fit a line through
+    """
+    mean_time = sum(times) / len(times)
+    mean_value = sum(values) / len(values)
+    time_variance = sum((sample_time - mean_time) ** 2 for sample_time in times)
+    if time_variance == 0:
+        return values[-1]
+    slope = sum((sample_time - mean_time) * (value - mean_value)
+                for sample_time, value in zip(times, values)) / time_variance
+    return mean_value + slope * (times[-1] + horizon_seconds - mean_time)
+
+
+def holt_forecast(times: list, values: list, horizon_seconds: float, alpha: float = 0.5, beta: float = 0.3) -> float:
+    """
+        Forecast a value horizon_seconds after the last sample with Holt's double exponential smoothing (a smoothed
+        level & a smoothed per second trend), adapted to samples that aren't evenly spaced in time
+
+        Arguments:
+            :param times: the unix time of each sample, oldest first
+            :param values: the value of each sample, in the same order as times
+            :param horizon_seconds: how many seconds after the last sample to forecast
+            :param alpha: the smoothing of the level, between 0 & 1 with higher values reacting faster
+            :param beta: the smoothing of the trend, between 0 & 1 with higher values reacting faster
+
+        Returns:
+            :return the forecast value, the last value if there aren't enough samples to have a trend
+    """
+    if len(values) < 2 or times[-1] == times[0]:
+        return values[-1]
+    level = values[0]
+    trend = 0
+    for index in range(1, len(values)):
+        elapsed = times[index] - times[index - 1]
+        if elapsed <= 0:
+            continue
+        if index == 1:
+            trend = (values[1] - values[0]) / elapsed
+        previous_level = level
+        level = alpha * values[index] + (1 - alpha) * (level + trend * elapsed)
+        trend = beta * (level - previous_level) / elapsed + (1 - beta) * trend
+    return level + trend * horizon_seconds
+
+
+def forecast_usage(samples: list, method: str, horizon_seconds: float, alpha: float = 0.5,
+                   beta: float = 0.3) -> Optional[Tuple[int, int]]:
+    """
+        Forecast the CPU & memory usage percentage of a node group horizon_seconds after its last usage sample
+
+        Arguments:
+            :param samples: a list of (timestamp, used_cpu_percentage, used_memory_percentage) tuples, oldest first, as
+            returned by UtilizationHistory.window_samples
+            :param method: "linear" for a least squares linear trend or "holt" for Holt's double exponential smoothing
+            :param horizon_seconds: how many seconds ahead to forecast, usually the time it takes a new node to join
+            :param alpha: the smoothing of the level when using "holt"
+            :param beta: the smoothing of the trend when using "holt"
+
+        Returns:
+            :return used_cpu_percentage: the forecast CPU usage percentage (never below 0), None if there are no samples
+            :return used_memory_percentage: the forecast memory usage percentage (never below 0), None if there are no
+            samples
+
+        Raises:
+            :raise ValueError: if passing a method that isn't on the list of choices
+    """
+    if not samples:
+        return None
+    times = [sample[0] for sample in samples]
+    forecasts = []
+    for dimension in (1, 2):
+        values = [sample[dimension] for sample in samples]
+        if method == "linear":
+            forecast = linear_trend_forecast(times, values, horizon_seconds)
+        elif method == "holt":
+            forecast = holt_forecast(times, values, horizon_seconds, alpha=alpha, beta=beta)
+        else:
+            print("usage forecast method must be one of 'linear', 'holt' or None", file=sys.stderr)
+            raise ValueError
+        forecasts.append(max(int(forecast), 0))
+    return forecasts[0], forecasts[1]
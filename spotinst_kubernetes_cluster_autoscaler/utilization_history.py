@@ -0,0 +1,241 @@
+from collections import deque
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from typing import Optional, Tuple
+import json
+import os
+import sys
+import time
+
+
+def ewma(values: list, alpha: float) -> float:
+    """
+        Calculate the exponentially weighted moving average of a series of values, each value weights alpha & all the
+        ones before it weight (1 - alpha) together
+
+        Arguments:
+            :param values: the values to average, oldest first
+            :param alpha: the weight of each new value, between 0 & 1 with higher values reacting faster
+
+        Returns:
+            :return the exponentially weighted moving average
+    """
+    average = values[0]
+    for value in values[1:]:
+        average = alpha * value + (1 - alpha) * average
+    return average
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+        Calculate a percentile of a series of values, interpolating linearly between the closest ranks
+
+        Arguments:
+            :param values: the values to calculate the percentile of
+            :param percent: the percentile wanted, between 0 & 100
+
+        Returns:
+            :return the percentile of the values
+    """
+    sorted_values = sorted(values)
+    rank = (len(sorted_values) - 1) * percent / 100
+    lower_index = int(rank)
+    upper_index = min(lower_index + 1, len(sorted_values) - 1)
+    return sorted_values[lower_index] + (sorted_values[upper_index] - sorted_values[lower_index]) * (rank - lower_index)
+
+
+class FileHistoryStore:
+    """
+       Persist the utilization history to a local JSON file, this only survives between cronjob runs if the file is on a
+       volume which outlives the pod
+    """
+
+    def __init__(self, path: str):
+        """
+           Arguments:
+               :param path: the path of the JSON file to read & write the history from/to
+        """
+        self.path = path
+
+    def read(self) -> Optional[str]:
+        """
+            Returns:
+                :return the saved history JSON, None if it was never saved
+        """
+        if not os.path.isfile(self.path):
+            return None
+        with open(self.path) as history_file:
+            return history_file.read()
+
+    def write(self, history_json: str):
+        """
+            Arguments:
+                :param history_json: the history JSON to save, it's written to a temp file first & then moved into
+                place so a run killed mid write never leaves a corrupt history behind
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as history_file:
+            history_file.write(history_json)
+        os.replace(temp_path, self.path)
+
+
+class ConfigMapHistoryStore:
+    """
+       Persist the utilization history to a kubernetes ConfigMap, which survives between cronjob runs with no volumes
+       needed (but needs the autoscaler to be allowed to get, create & update ConfigMaps in its namespace)
+    """
+
+    def __init__(self, v1, name: str, namespace: str, data_key: str = "history.json"):
+        """
+           Arguments:
+               :param v1: the kubernetes CoreV1Api object used to read & write the ConfigMap
+               :param name: the name of the ConfigMap
+               :param namespace: the namespace of the ConfigMap
+               :param data_key: the key of the ConfigMap data the JSON is kept under
+        """
+        self.v1 = v1
+        self.name = name
+        self.namespace = namespace
+        self.data_key = data_key
+
+    def read(self) -> Optional[str]:
+        """
+            Returns:
+                :return the saved history JSON, None if it was never saved
+        """
+        try:
+            config_map = self.v1.read_namespaced_config_map(self.name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        return (config_map.data or {}).get(self.data_key)
+
+    def write(self, history_json: str):
+        """
+            Arguments:
+                :param history_json: the history JSON to save, the ConfigMap is created if it doesn't exist yet
+        """
+        config_map = client.V1ConfigMap(metadata=client.V1ObjectMeta(name=self.name, namespace=self.namespace),
+                                        data={self.data_key: history_json})
+        try:
+            self.v1.replace_namespaced_config_map(self.name, self.namespace, config_map)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            self.v1.create_namespaced_config_map(self.namespace, config_map)
+
+
+class UtilizationHistory:
+    """
+       A rolling history of the CPU & memory usage percentage of each node group, kept as a fixed size ring buffer of
+       samples per node group so scaling decisions can be made on smoothed usage rather then a single instant
+    """
+
+    def __init__(self, store=None, max_samples: int = 60, window_seconds: float = 600):
+        """
+           Arguments:
+               :param store: optional FileHistoryStore or ConfigMapHistoryStore to persist the history between runs,
+               if None the history is only kept in memory (so only in daemon mode between cycles)
+               :param max_samples: the maximum number of samples kept per node group, the oldest are dropped first
+               :param window_seconds: only samples from the last window_seconds are used to smooth the usage
+        """
+        self.store = store
+        self.max_samples = max_samples
+        self.window_seconds = window_seconds
+        self.samples = {}
+
+    def load(self):
+        """
+            Load the saved history from the store, a missing or corrupt history is logged & started over rather then
+            failing the run
+        """
+        if self.store is None:
+            return
+        try:
+            history_json = self.store.read()
+            if history_json is None:
+                return
+            for group_name, group_samples in json.loads(history_json).items():
+                self.samples[group_name] = deque([tuple(sample) for sample in group_samples], maxlen=self.max_samples)
+        except Exception as e:
+            print("failed loading the usage history - starting a new one", file=sys.stderr)
+            print(e, file=sys.stderr)
+
+    def save(self):
+        """
+            Save the history to the store, a failure is logged rather then failing the run as the history is only an
+            optimization
+        """
+        if self.store is None:
+            return
+        try:
+            self.store.write(json.dumps({group_name: list(group_samples)
+                                         for group_name, group_samples in self.samples.items()}))
+        except Exception as e:
+            print("failed saving the usage history", file=sys.stderr)
+            print(e, file=sys.stderr)
+
+    def add_sample(self, group_name: str, used_cpu_percentage: float, used_memory_percentage: float,
+                   timestamp: Optional[float] = None):
+        """
+            Add a usage sample of a node group to the history
+
+            Arguments:
+                :param group_name: the node group the sample is of (its elastigroup ID)
+                :param used_cpu_percentage: the CPU usage percentage of the node group
+                :param used_memory_percentage: the memory usage percentage of the node group
+                :param timestamp: the unix time of the sample, defaults to now
+        """
+        group_samples = self.samples.setdefault(group_name, deque(maxlen=self.max_samples))
+        group_samples.append((time.time() if timestamp is None else timestamp, used_cpu_percentage,
+                              used_memory_percentage))
+
+    def window_samples(self, group_name: str, now: Optional[float] = None) -> list:
+        """
+            Get the samples of a node group from the last window_seconds
+
+            Arguments:
+                :param group_name: the node group to get the samples of (its elastigroup ID)
+                :param now: the unix time the window ends at, defaults to now
+
+            Returns:
+                :return a list of (timestamp, used_cpu_percentage, used_memory_percentage) tuples, oldest first
+        """
+        now = time.time() if now is None else now
+        return [sample for sample in self.samples.get(group_name, []) if now - sample[0] <= self.window_seconds]
+
+    def smoothed_usage(self, group_name: str, method: Optional[str] = "ewma", ewma_alpha: float = 0.3,
+                       usage_percentile: float = 50, now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """
+            Get the smoothed CPU & memory usage percentage of a node group over the last window_seconds
+
+            Arguments:
+                :param group_name: the node group to get the usage of (its elastigroup ID)
+                :param method: "ewma" for the exponentially weighted moving average, "percentile" for a percentile of
+                the window or None for the latest sample
+                :param ewma_alpha: the weight of each new sample when using "ewma"
+                :param usage_percentile: the percentile of the window to use when using "percentile"
+                :param now: the unix time the window ends at, defaults to now
+
+            Returns:
+                :return used_cpu_percentage: the smoothed CPU usage percentage, None if there are no samples
+                :return used_memory_percentage: the smoothed memory usage percentage, None if there are no samples
+
+            Raises:
+                :raise ValueError: if passing a method that isn't on the list of choices
+        """
+        samples = self.window_samples(group_name, now=now)
+        if not samples:
+            return None
+        cpu_values = [sample[1] for sample in samples]
+        memory_values = [sample[2] for sample in samples]
+        if method == "ewma":
+            return int(ewma(cpu_values, ewma_alpha)), int(ewma(memory_values, ewma_alpha))
+        elif method == "percentile":
+            return int(percentile(cpu_values, usage_percentile)), int(percentile(memory_values, usage_percentile))
+        elif method is None:
+            return cpu_values[-1], memory_values[-1]
+        else:
+            print("usage smoothing method must be one of 'ewma', 'percentile' or None", file=sys.stderr)
+            raise ValueError
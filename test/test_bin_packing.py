@@ -0,0 +1,36 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.bin_packing import *
+
+
+class BaseTests(TestCase):
+
+    def test_pod_fits(self):
+        self.assertTrue(pod_fits((1, 100), (1, 100)))
+        self.assertFalse(pod_fits((1, 101), (2, 100)))
+
+    def test_nodes_needed_for_pods_no_pods(self):
+        self.assertEqual(nodes_needed_for_pods([], (1, 100)), 0)
+
+    def test_nodes_needed_for_pods_packs_small_pods_together(self):
+        self.assertEqual(nodes_needed_for_pods([(0.25, 10)] * 8, (1, 100)), 2)
+
+    def test_nodes_needed_for_pods_first_fit_decreasing(self):
+        # placed in arrival order these would need 3 nodes, largest first they fit on 2
+        pods_requests = [(0.3, 0), (0.3, 0), (0.7, 0), (0.7, 0)]
+        self.assertEqual(nodes_needed_for_pods(pods_requests, (1, 100)), 2)
+
+    def test_nodes_needed_for_pods_dominant_resource(self):
+        # memory bound pods can't share a node even though they need little CPU
+        self.assertEqual(nodes_needed_for_pods([(0.1, 60), (0.1, 60), (0.1, 60)], (1, 100)), 3)
+
+    def test_first_fit_decreasing_unplaceable_pods(self):
+        nodes_free_resources, unplaceable_pods = first_fit_decreasing([(2, 10), (0.5, 10)], (1, 100))
+        self.assertEqual(nodes_free_resources, [[0.5, 90]])
+        self.assertEqual(unplaceable_pods, [(2, 10)])
+
+    def test_place_onto_nodes(self):
+        nodes_free_resources, placements = place_onto_nodes([(0.2, 10), (0.5, 10)], [(0.4, 100), (0.6, 100)])
+        self.assertEqual(placements, [0, 1])
+        self.assertAlmostEqual(nodes_free_resources[0][0], 0.2)
+        self.assertAlmostEqual(nodes_free_resources[1][0], 0.1)
+        self.assertIsNone(place_onto_nodes([(0.7, 10)], [(0.4, 100), (0.6, 100)]))
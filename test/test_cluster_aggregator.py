@@ -0,0 +1,107 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.cluster_aggregator import *
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import KubeWatchCache
+from test.test_kubernetes_watch_cache import make_node, make_pod
+import random
+
+
+def full_recompute(nodes: list, pods: list) -> ClusterSnapshot:
+    pods_by_node = {}
+    for pod in pods:
+        if pod.status.phase == "Running":
+            pods_by_node.setdefault(pod.spec.node_name, NodePods()).append(pod_requested_resources(pod),
+                                                                           pod_is_movable(pod))
+    return ClusterSnapshot(nodes=[node_record(node) for node in nodes], pods_by_node=pods_by_node, usage_by_node={},
+                           pending_pods=[pending_pod_record(pod) for pod in pods if pod.status.phase == "Pending"])
+
+
+class BaseTests(TestCase):
+
+    def test_ClusterAggregator_replace(self):
+        aggregator = ClusterAggregator(["group=a"])
+        aggregator.replace("nodes", [make_node("node1", {"group": "a"}), make_node("node2", {"group": "b"})])
+        aggregator.replace("pods", [make_pod("pod1", "Running", node_name="node1", cpu="500m"),
+                                    make_pod("pod2", "Running", node_name="node2", cpu="100m"),
+                                    make_pod("pod3", "Pending")])
+        snapshot = aggregator.take_snapshot({})
+        self.assertEqual(snapshot.get_cpu_and_mem_usage("group=a"), (50, 2))
+        self.assertEqual(snapshot.get_cpu_and_mem_usage(), (30, 2))
+        self.assertEqual(snapshot.get_connected_nodes_count("group=a"), 1)
+        self.assertEqual(snapshot.get_number_of_pending_pods(), 1)
+        self.assertEqual(len(snapshot.pods_by_node.get("node1")), 1)
+        self.assertIsNone(snapshot.pods_by_node.get("node3"))
+
+    def test_ClusterAggregator_events_move_requests(self):
+        aggregator = ClusterAggregator(["group=a"])
+        aggregator.replace("nodes", [make_node("node1", {"group": "a"})])
+        aggregator.replace("pods", [make_pod("pod1", "Pending")])
+        aggregator.apply_event("pods", "MODIFIED", make_pod("pod1", "Running", node_name="node1", cpu="500m"))
+        self.assertEqual(aggregator.take_snapshot({}).get_cpu_and_mem_usage("group=a"), (50, 2))
+        # relabeling the node takes its pods requests out of the node group with it
+        aggregator.apply_event("nodes", "MODIFIED", make_node("node1", {"group": "b"}))
+        self.assertEqual(aggregator.take_snapshot({}).get_connected_nodes_count("group=a"), 0)
+        aggregator.apply_event("nodes", "MODIFIED", make_node("node1", {"group": "a"}))
+        aggregator.apply_event("pods", "DELETED", make_pod("pod1", "Running", node_name="node1", cpu="500m"))
+        snapshot = aggregator.take_snapshot({})
+        self.assertEqual(snapshot.get_cpu_and_mem_usage("group=a"), (0, 0))
+        self.assertEqual(snapshot.requests_by_node, {})
+        self.assertEqual(snapshot.get_number_of_pending_pods(), 0)
+
+    def test_ClusterAggregator_extended_resources(self):
+        gpu_node = make_node("node1", {"group": "gpu"})
+        gpu_node.status.allocatable["nvidia.com/gpu"] = "4"
+        gpu_pod = make_pod("pod1", "Running", node_name="node1")
+        gpu_pod.spec.containers[0].resources.requests["nvidia.com/gpu"] = "3"
+        aggregator = ClusterAggregator(["group=gpu"], extended_resources=("nvidia.com/gpu",))
+        aggregator.replace("nodes", [gpu_node, make_node("node2", {"group": "cpu"})])
+        aggregator.replace("pods", [gpu_pod])
+        snapshot = aggregator.take_snapshot({})
+        self.assertEqual(snapshot.get_extended_resources_usage("group=gpu"), {"nvidia.com/gpu": 75})
+        self.assertEqual(snapshot.pods_by_node.get("node1").total_requests()[2:], [3.0])
+        aggregator.apply_event("pods", "DELETED", gpu_pod)
+        self.assertEqual(aggregator.take_snapshot({}).get_extended_resources_usage("group=gpu"), {"nvidia.com/gpu": 0})
+
+    def test_ClusterAggregator_matches_full_recompute(self):
+        randomizer = random.Random(42)
+        selectors = ["group=a", "group=b"]
+        aggregator = ClusterAggregator(selectors)
+        watch_cache = KubeWatchCache(v1=None, aggregator=aggregator)
+        watch_cache.replace("nodes", [])
+        watch_cache.replace("pods", [])
+        # the watch cache only keeps the keys so the current objects are tracked here to recompute from
+        current_objects = {"nodes": {}, "pods": {}}
+        for _ in range(2000):
+            if randomizer.random() < 0.1:
+                kind = "nodes"
+                event_type = "DELETED" if randomizer.random() < 0.2 else "MODIFIED"
+                item = make_node("node" + str(randomizer.randrange(20)), {"group": randomizer.choice("abc")},
+                                 cpu=str(randomizer.randrange(1, 64)), memory=str(randomizer.randrange(1, 256)) + "Gi")
+            else:
+                kind = "pods"
+                event_type = randomizer.choice(["ADDED", "MODIFIED", "DELETED"])
+                item = make_pod("pod" + str(randomizer.randrange(500)), randomizer.choice(["Pending", "Running"]),
+                                node_name="node" + str(randomizer.randrange(25)),
+                                cpu=str(randomizer.randrange(1, 4000)) + "m",
+                                memory=str(randomizer.randrange(1, 4000)) + "Mi")
+            watch_cache.apply_event(kind, event_type, item)
+            if event_type == "DELETED":
+                current_objects[kind].pop(object_key(item), None)
+            else:
+                current_objects[kind][object_key(item)] = item
+
+        self.assertEqual(set(watch_cache.pods), set(current_objects["pods"]))
+        self.assertTrue(all(pod is None for pod in watch_cache.pods.values()))
+        snapshot = aggregator.take_snapshot({})
+        expected_snapshot = full_recompute(list(current_objects["nodes"].values()),
+                                           list(current_objects["pods"].values()))
+        for selector in [None] + selectors:
+            self.assertEqual(snapshot.get_connected_nodes_count(selector),
+                             expected_snapshot.get_connected_nodes_count(selector))
+            self.assertEqual(snapshot.get_cpu_and_mem_usage(selector),
+                             expected_snapshot.get_cpu_and_mem_usage(selector))
+            self.assertEqual(snapshot.get_safe_scale_down_count(selector),
+                             expected_snapshot.get_safe_scale_down_count(selector))
+        self.assertEqual(snapshot.get_number_of_pending_pods(), expected_snapshot.get_number_of_pending_pods())
+        for node_name, node_requests in expected_snapshot.requests_by_node.items():
+            self.assertAlmostEqual(snapshot.requests_by_node[node_name][0], node_requests[0])
+            self.assertAlmostEqual(snapshot.requests_by_node[node_name][1], node_requests[1])
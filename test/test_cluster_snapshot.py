@@ -0,0 +1,171 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.cluster_snapshot import *
+from datetime import timedelta
+
+
+def make_snapshot() -> ClusterSnapshot:
+    taken_at = datetime(2021, 5, 26, 9, 0, 0, tzinfo=timezone.utc)
+    return ClusterSnapshot(
+        nodes=[
+            NodeRecord("node1", {"group": "a"}, 1.0, 1000.0),
+            NodeRecord("node2", {"group": "a"}, 1.0, 1000.0),
+            NodeRecord("node3", {"group": "b"}, 4.0, 4000.0)
+        ],
+        pods_by_node={
+            "node1": NodePods([((0.5, 100.0), True)]),
+            "node2": NodePods([((0.5, 100.0), True)]),
+            "node3": NodePods([((0.1, 100.0), False), ((0.3, 3500.0), True)])
+        },
+        usage_by_node={"node1": [0.9, 200.0], "node2": [0.9, 200.0], "node3": [0.4, 400.0]},
+        pending_pods=[
+            PendingPodRecord((taken_at - timedelta(seconds=60)).timestamp(), True, node_affinity={"group": "b"},
+                             requests=(3.0, 1000.0)),
+            PendingPodRecord((taken_at - timedelta(seconds=1)).timestamp(), False)
+        ],
+        taken_at=taken_at)
+
+
+class BaseTests(TestCase):
+
+    def test_ClusterSnapshot_get_connected_nodes_count(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.get_connected_nodes_count(), 3)
+        self.assertEqual(snapshot.get_connected_nodes_count("group=a"), 2)
+        self.assertEqual(snapshot.get_connected_nodes_count("group=c"), 0)
+
+    def test_ClusterSnapshot_get_cpu_and_mem_usage_split_by_group(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.get_cpu_and_mem_usage("group=a"), (90, 20))
+        self.assertEqual(snapshot.get_cpu_and_mem_usage("group=b"), (10, 90))
+        self.assertEqual(snapshot.get_cpu_and_mem_usage(), (36, 63))
+
+    def test_ClusterSnapshot_pending_pods(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.get_number_of_pending_pods(), 2)
+        self.assertTrue(snapshot.pending_pods_exist(minimum_pending_seconds=30))
+        self.assertFalse(snapshot.pending_pods_exist(minimum_pending_seconds=120))
+
+    def test_ClusterSnapshot_check_pods_stuck_do_to_insufficient_resource_by_group(self):
+        snapshot = make_snapshot()
+        self.assertTrue(snapshot.check_pods_stuck_do_to_insufficient_resource())
+        self.assertTrue(snapshot.check_pods_stuck_do_to_insufficient_resource("group=b"))
+        self.assertFalse(snapshot.check_pods_stuck_do_to_insufficient_resource("group=a"))
+        self.assertFalse(snapshot.check_pods_stuck_do_to_insufficient_resource("group=c"))
+
+    def test_ClusterSnapshot_get_number_of_stuck_pods(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=b"), 1)
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=b", minimum_pending_seconds=120), 0)
+        # the pod is pending long enough but it's pinned to the other node group
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=a", minimum_pending_seconds=30), 0)
+
+    def test_ClusterSnapshot_assign_unpinned_stuck_pods(self):
+        snapshot = make_snapshot()
+        snapshot.pending_pods += [PendingPodRecord(None, True, node_affinity={}, requests=(0.5, 100.0)),
+                                  PendingPodRecord(None, True, node_affinity={}, requests=(2.0, 100.0))]
+        # before the assignment any node group could place them
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=a"), 2)
+        snapshot.assign_unpinned_stuck_pods(["group=a", "group=b"])
+        # the small pod fits the first node group while the large one only fits the nodes of group b
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=a"), 1)
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=b"), 2)
+        self.assertEqual(snapshot.get_number_of_stuck_pods(), 3)
+        snapshot.assign_unpinned_stuck_pods(["group=b"])
+        self.assertEqual(snapshot.get_number_of_stuck_pods("group=a"), 0)
+
+    def test_ClusterSnapshot_get_node_shape(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.get_node_shape("group=b"), (4.0, 4000.0))
+        self.assertEqual(snapshot.get_node_shape(), (1.0, 1000.0))
+        self.assertIsNone(snapshot.get_node_shape("group=c"))
+
+    def test_ClusterSnapshot_get_nodes_needed_for_stuck_pods(self):
+        snapshot = make_snapshot()
+        snapshot.pending_pods += [PendingPodRecord(None, True, node_affinity={"group": "b"},
+                                                   requests=(2.0, 1000.0))] * 3
+        self.assertEqual(snapshot.get_nodes_needed_for_stuck_pods("group=b"), 3)
+        self.assertEqual(snapshot.get_nodes_needed_for_stuck_pods("group=a"), 0)
+        self.assertIsNone(snapshot.get_nodes_needed_for_stuck_pods("group=c"))
+
+    def test_ClusterSnapshot_requests_by_node(self):
+        snapshot = make_snapshot()
+        self.assertEqual(snapshot.requests_by_node["node1"], [0.5, 100.0])
+        self.assertAlmostEqual(snapshot.requests_by_node["node3"][0], 0.4)
+        self.assertEqual(snapshot.requests_by_node["node3"][1], 3600.0)
+
+    def test_ClusterSnapshot_get_safe_scale_down_count(self):
+        snapshot = ClusterSnapshot(
+            nodes=[NodeRecord("node" + str(index), {}, 1.0, 1000.0) for index in range(4)],
+            pods_by_node={
+                "node0": NodePods([((0.6, 100.0), True)]),
+                "node1": NodePods([((0.5, 100.0), True)]),
+                "node2": NodePods([((0.2, 100.0), True), ((0.1, 50.0), False)]),
+                "node3": NodePods([((0.1, 50.0), False)])
+            },
+            usage_by_node={}, pending_pods=[])
+        # node3 only runs a DaemonSet pod, node2 then fits on node1 or node0 but node1 fits on neither
+        self.assertEqual(snapshot.get_safe_scale_down_count(), 2)
+        self.assertEqual(snapshot.get_safe_scale_down_count(min_nodes=3), 1)
+        self.assertEqual(snapshot.get_safe_scale_down_count(max_cpu_usage=60), 1)
+        self.assertEqual(snapshot.get_safe_scale_down_count(node_selector_label="group=a"), 0)
+
+    def test_ClusterSnapshot_get_safe_scale_down_count_pods_dont_fit(self):
+        snapshot = ClusterSnapshot(
+            nodes=[NodeRecord("node" + str(index), {}, 1.0, 1000.0) for index in range(2)],
+            pods_by_node={"node0": NodePods([((0.4, 100.0), True)]),
+                          "node1": NodePods([((0.7, 100.0), True)])},
+            usage_by_node={}, pending_pods=[])
+        # the total requests fit on a single node by sum but the pods of the least utilized node don't fit the other
+        self.assertEqual(snapshot.get_safe_scale_down_count(), 0)
+
+    def test_ClusterSnapshot_get_safe_scale_down_count_carries_moved_pods(self):
+        snapshot = ClusterSnapshot(
+            nodes=[NodeRecord(name, {}, 1.0, 1000.0) for name in ("w", "x", "y", "z")],
+            pods_by_node={"w": NodePods([((0.3, 100.0), True)]),
+                          "x": NodePods([((0.3, 100.0), True), ((0.2, 100.0), True)]),
+                          "y": NodePods([((0.59, 100.0), True)]),
+                          "z": NodePods([((0.59, 100.0), True)])},
+            usage_by_node={}, pending_pods=[])
+        # the pod of w is moved onto x, so removing x as well has to fit 3 pods (not just its own 2) onto y & z
+        self.assertEqual(snapshot.get_safe_scale_down_count(), 1)
+
+    def test_ClusterSnapshot_get_extended_resources_usage(self):
+        snapshot = ClusterSnapshot(
+            nodes=[NodeRecord("node1", {"group": "gpu"}, 8.0, 1000.0, extended_allocatable=(4.0, 100.0)),
+                   NodeRecord("node2", {"group": "cpu"}, 8.0, 1000.0, extended_allocatable=(0, 100.0))],
+            pods_by_node={"node1": NodePods([((1.0, 100.0, 3.0, 10.0), True)]),
+                          "node2": NodePods([((1.0, 100.0, 0, 60.0), True)])},
+            usage_by_node={}, pending_pods=[], extended_resources=("nvidia.com/gpu", "ephemeral-storage"))
+        self.assertEqual(snapshot.get_extended_resources_usage("group=gpu"),
+                         {"nvidia.com/gpu": 75, "ephemeral-storage": 10})
+        # none of the cpu node group nodes have a GPU so it's left out rather then divided by 0
+        self.assertEqual(snapshot.get_extended_resources_usage("group=cpu"), {"ephemeral-storage": 60})
+        self.assertEqual(snapshot.get_extended_resources_usage(), {"nvidia.com/gpu": 75, "ephemeral-storage": 35})
+        self.assertEqual(snapshot.get_cpu_and_mem_usage("group=gpu"), (12, 10))
+
+    def test_ClusterSnapshot_get_safe_scale_down_count_extended_resources(self):
+        snapshot = ClusterSnapshot(
+            nodes=[NodeRecord("node" + str(index), {}, 1.0, 1000.0, extended_allocatable=(1.0,)) for index in range(3)],
+            pods_by_node={"node0": NodePods([((0.1, 100.0, 1.0), True)]),
+                          "node1": NodePods([((0.1, 100.0, 0), True)]),
+                          "node2": NodePods([((0.1, 100.0, 0), True)])},
+            usage_by_node={}, pending_pods=[], extended_resources=("nvidia.com/gpu",))
+        self.assertEqual(snapshot.get_safe_scale_down_count(), 2)
+        # a single GPU is requested so removing 2 of the 3 GPU nodes would leave it at 100%
+        self.assertEqual(snapshot.get_safe_scale_down_count(max_extended_usage={"nvidia.com/gpu": 80}), 1)
+
+    def test_NodePods(self):
+        node_pods = NodePods([((0.1, 50.0), False), ((0.2, 100.0), True)])
+        node_pods.append((0.3, 150.0), True)
+        self.assertEqual(len(node_pods), 3)
+        self.assertAlmostEqual(node_pods.total_requests()[0], 0.6)
+        self.assertEqual(node_pods.total_requests()[1], 300.0)
+        self.assertEqual(node_pods.movable_requests(), [(0.2, 100.0), (0.3, 150.0)])
+        node_pods.append((0.1, 50.0, 1.0), True)
+        self.assertEqual(node_pods.total_requests()[1:], [350.0, 1.0])
+
+    def test_compact_records_equality(self):
+        self.assertEqual(NodeRecord("node1", {}, 1.0, 1000.0), NodeRecord("node1", {}, 1.0, 1000.0))
+        self.assertNotEqual(NodeRecord("node1", {}, 1.0, 1000.0), NodeRecord("node2", {}, 1.0, 1000.0))
+        self.assertEqual(repr(PendingPodRecord(None, False)),
+                         "PendingPodRecord(pending_since=None, stuck=False, node_affinity=None, requests=(0, 0))")
@@ -0,0 +1,28 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.concurrent_collection import *
+import threading
+import time
+
+
+class BaseTests(TestCase):
+
+    def test_run_concurrently_returns_all_results(self):
+        reply = run_concurrently({"first": lambda: 1, "second": lambda: "two"})
+        self.assertEqual(reply, {"first": 1, "second": "two"})
+
+    def test_run_concurrently_runs_calls_at_the_same_time(self):
+        barrier = threading.Barrier(3, timeout=5)
+        reply = run_concurrently({"first": barrier.wait, "second": barrier.wait, "third": barrier.wait},
+                                 max_workers=3)
+        self.assertEqual(sorted(reply.values()), [0, 1, 2])
+
+    def test_run_concurrently_raise_failed_call_exception(self):
+        def failing_call():
+            raise ValueError("spotinst is down")
+
+        with self.assertRaises(ValueError):
+            run_concurrently({"ok": lambda: 1, "failing": failing_call})
+
+    def test_run_concurrently_raise_TimeoutError(self):
+        with self.assertRaises(TimeoutError):
+            run_concurrently({"ok": lambda: 1, "slow": lambda: time.sleep(1)}, timeout_seconds=0.1)
@@ -17,6 +17,7 @@ class BaseTests(TestCase):
                 'min_memory_usage': 50,
                 'max_cpu_usage': 80,
                 'min_cpu_usage': 50,
+                'extended_resources': None,
                 'seconds_to_check': 30,
                 'spotinst_token': "test_token",
                 'elastigroup_id': "sig-123",
@@ -28,7 +29,47 @@ class BaseTests(TestCase):
                 "scale_up_active": True,
                 "scale_down_active": True,
                 "scale_on_pending_pods": True,
-                "node_selector_label": None
+                "node_selector_label": None,
+                "spotinst_connect_timeout": 5,
+                "spotinst_read_timeout": 30,
+                "spotinst_retries": 3,
+                "spotinst_backoff_factor": 0.5,
+                "spotinst_api_url": "https://api.spotinst.io",
+                "capacity_max_age_seconds": 300,
+                "list_page_size": 500,
+                "raw_json_listing": False,
+                "collection_max_workers": 4,
+                "collection_timeout_seconds": 60,
+                "run_mode": "cronjob",
+                "daemon_interval_seconds": 60,
+                "metrics_port": None,
+                "metrics_pushgateway": None,
+                "metrics_job_name": "spotinst-kubernetes-cluster-autoscaler",
+                "profile_output_path": None,
+                "snapshot_record_dir": None,
+                "node_groups": None,
+                "scale_up_bin_packing": False,
+                "scale_down_simulation": False,
+                "usage_smoothing": None,
+                "usage_ewma_alpha": 0.3,
+                "usage_percentile": 50,
+                "usage_forecast": None,
+                "usage_forecast_horizon_seconds": 240,
+                "usage_forecast_alpha": 0.5,
+                "usage_forecast_beta": 0.3,
+                "usage_window_seconds": 600,
+                "usage_history_size": 60,
+                "usage_history_store": "memory",
+                "usage_history_file_path": "usage_history.json",
+                "usage_history_configmap_name": "spotinst-kubernetes-cluster-autoscaler-usage-history",
+                "usage_history_configmap_namespace": "default",
+                "scale_up_stabilization_seconds": 0,
+                "scale_down_stabilization_seconds": 0,
+                "node_boot_timeout_seconds": 600,
+                "scaling_state_store": "memory",
+                "scaling_state_file_path": "scaling_state.json",
+                "scaling_state_configmap_name": "spotinst-kubernetes-cluster-autoscaler-scaling-state",
+                "scaling_state_configmap_namespace": "default"
             }
             self.assertTrue(set(expected_reply.items()).issubset(reply.items()))
 
@@ -102,3 +143,63 @@ class BaseTests(TestCase):
     def test_decide_kube_connection_method_in_cluster_last_priority(self):
         reply = decide_kube_connection_method(kube_api_endpoint=None, kubeconfig_path="non_existing_config_path")
         self.assertEqual(reply, "in_cluster")
+
+    def test_get_node_groups_defaults_to_top_level_configuration(self):
+        with mock.patch('os.environ', {"ELASTIGROUP_ID": "sig-123", "SPOTINST_TOKEN": "test_token",
+                                       "SPOTINST_ACCOUNT": "act-12345678", "NODE_SELECTOR_LABEL": "group=a"}):
+            reply = get_node_groups(read_configurations())
+        self.assertEqual(len(reply), 1)
+        self.assertEqual(reply[0]["elastigroup_id"], "sig-123")
+        self.assertEqual(reply[0]["spotinst_account"], "act-12345678")
+        self.assertEqual(reply[0]["node_selector_label"], "group=a")
+        self.assertEqual(reply[0]["max_cpu_usage"], 80)
+
+    def test_get_node_groups_multiple_node_groups(self):
+        with mock.patch('os.environ', {"SPOTINST_TOKEN": "test_token", "SPOTINST_ACCOUNT": "act-12345678",
+                                       "MAX_CPU_USAGE": "70",
+                                       "NODE_GROUPS": '[{"elastigroup_id": "sig-1", "node_selector_label": "group=a"},'
+                                                      ' {"elastigroup_id": "sig-2", "node_selector_label": "group=b",'
+                                                      ' "max_cpu_usage": 90, "max_node_count": 10}]'}):
+            reply = get_node_groups(read_configurations())
+        self.assertEqual([node_group["elastigroup_id"] for node_group in reply], ["sig-1", "sig-2"])
+        self.assertEqual([node_group["max_cpu_usage"] for node_group in reply], [70, 90])
+        self.assertEqual([node_group["max_node_count"] for node_group in reply], [100, 10])
+        self.assertEqual(reply[1]["spotinst_account"], "act-12345678")
+
+    def test_get_node_groups_raise_error_duplicate_elastigroup(self):
+        with mock.patch('os.environ', {"SPOTINST_TOKEN": "test_token", "SPOTINST_ACCOUNT": "act-12345678",
+                                       "NODE_GROUPS": '[{"elastigroup_id": "sig-1"}, {"elastigroup_id": "sig-1"}]'}):
+            configuration = read_configurations()
+        with self.assertRaises(ValueError):
+            get_node_groups(configuration)
+
+    def test_get_node_groups_raise_error_elastigroup_not_declared(self):
+        with mock.patch('os.environ', {"SPOTINST_TOKEN": "test_token", "SPOTINST_ACCOUNT": "act-12345678",
+                                       "NODE_GROUPS": '[{"node_selector_label": "group=a"}]'}):
+            configuration = read_configurations()
+        with self.assertRaises(ValueError):
+            get_node_groups(configuration)
+
+    def test_config_type_priority_only_lists_present_file_types(self):
+        self.assertEqual(config_type_priority("test/test_config"), ["cli_args", "env_vars", "yaml"])
+        self.assertEqual(config_type_priority("test/test_config/config.yaml"), ["cli_args", "env_vars", "yaml"])
+        self.assertEqual(config_type_priority("test/no_such_folder"), ["cli_args", "env_vars"])
+
+    def test_get_extended_resources_of_all_node_groups(self):
+        with mock.patch('os.environ', {"SPOTINST_TOKEN": "test_token", "SPOTINST_ACCOUNT": "act-12345678",
+                                       "EXTENDED_RESOURCES": '{"ephemeral-storage": {"max_usage": 85}}',
+                                       "NODE_GROUPS": '[{"elastigroup_id": "sig-1"}, {"elastigroup_id": "sig-2", '
+                                                      '"extended_resources": {"nvidia.com/gpu": {"max_usage": 80, '
+                                                      '"min_usage": 20}}}]'}):
+            configuration = read_configurations()
+        self.assertEqual(get_extended_resources(configuration), ("ephemeral-storage", "nvidia.com/gpu"))
+        self.assertEqual(get_node_groups(configuration)[0]["extended_resources"],
+                         {"ephemeral-storage": {"max_usage": 85}})
+
+    def test_get_node_groups_raise_error_bad_extended_resources(self):
+        with mock.patch('os.environ', {"ELASTIGROUP_ID": "sig-123", "SPOTINST_TOKEN": "test_token",
+                                       "SPOTINST_ACCOUNT": "act-12345678",
+                                       "EXTENDED_RESOURCES": '{"nvidia.com/gpu": {"max": 80}}'}):
+            configuration = read_configurations()
+        with self.assertRaises(ValueError):
+            get_node_groups(configuration)
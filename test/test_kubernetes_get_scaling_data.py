@@ -1,8 +1,12 @@
 from unittest import TestCase
 from spotinst_kubernetes_cluster_autoscaler.kubernetes_get_scaling_data import *
+from spotinst_kubernetes_cluster_autoscaler.metrics import enable_metrics
 import kubernetes
 from pathlib import Path
+from unittest import mock
+from datetime import datetime, timedelta, timezone
 import os
+import json
 import httpretty
 
 kube_test_token = os.getenv("TEST_TOKEN", "test")
@@ -60,6 +64,34 @@ class BaseTests(TestCase):
         httpretty.disable()
         httpretty.reset()
 
+    def test_KubeGetScaleData_pending_pods_exist_false_recently_pending(self):
+        recently = (datetime.now(timezone.utc) - timedelta(seconds=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
+                               body='{"items": [{"metadata": {"creationTimestamp": "2021-05-26T08:40:00Z"}, '
+                                    '"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                                    '"status": "False", "lastTransitionTime": "' + recently + '", '
+                                    '"reason": "Unschedulable"}]}}]}', status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        self.assertFalse(kube_config.pending_pods_exist(minimum_pending_seconds=30))
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_KubeGetScaleData_pending_pods_exist_true_pending_long_enough(self):
+        recently = (datetime.now(timezone.utc) - timedelta(seconds=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
+                               body='{"items": [{"metadata": {"creationTimestamp": "' + recently + '"}, '
+                                    '"status": {"phase": "Pending"}}, '
+                                    '{"metadata": {"creationTimestamp": "2021-05-26T08:40:00Z"}, '
+                                    '"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                                    '"status": "False", "lastTransitionTime": "2021-05-26T08:47:02Z", '
+                                    '"reason": "Unschedulable"}]}}]}', status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        self.assertTrue(kube_config.pending_pods_exist(minimum_pending_seconds=30))
+        httpretty.disable()
+        httpretty.reset()
+
     def test_KubeGetScaleData_get_connected_nodes_count(self):
         httpretty.enable()
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes?labelSelector=key2=value2",
@@ -129,13 +161,187 @@ class BaseTests(TestCase):
                                body='{"items": [{"usage": {"cpu": "100m","memory": "100Mi"}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "1000m","memory": "2000Mi"}}}]}}]}',
+                               body='{"items": [{"name": "test", "spec": {"nodeName": "ip-1-2-3-4.ec2.internal", '
+                                    '"containers": [{"name": "test", "resources": '
+                                    '{"requests": {"cpu": "1000m","memory": "2000Mi"}}}]}},'
+                                    '{"name": "test2", "spec": {"nodeName": "ip-1-2-3-5.ec2.internal", '
+                                    '"containers": [{"name": "test2", "resources": '
+                                    '{"requests": {"cpu": "1000m","memory": "2000Mi"}}}]}},'
+                                    '{"name": "test3", "spec": {"nodeName": "ip-9-9-9-9.ec2.internal", '
+                                    '"containers": [{"name": "test3", "resources": '
+                                    '{"requests": {"cpu": "9000m","memory": "9000Mi"}}}]}}]}',
                                status=200)
         kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
         test_cpu_usage, test_memory_usage = kube_config.get_cpu_and_mem_usage(node_selector_label="instance_type=test")
         self.assertEqual(test_cpu_usage, 66)
         self.assertEqual(test_memory_usage, 26)
+        pods_requests = [request for request in httpretty.latest_requests() if request.path.startswith("/api/v1/pods")]
+        self.assertEqual(len(pods_requests), 1)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_KubeGetScaleData_get_cpu_and_mem_usage_node_selector_scopes_metrics(self):
+        def metrics_callback(request, uri, response_headers):
+            self.assertEqual(request.querystring["labelSelector"], ["instance_type=test"])
+            # a metrics-server ignoring the selector still only has the node group nodes counted
+            return [200, response_headers, '{"items": [{"metadata": {"name": "ip-1-2-3-4.ec2.internal"}, '
+                                           '"usage": {"cpu": "800m","memory": "1000Mi"}}, '
+                                           '{"metadata": {"name": "ip-9-9-9-9.ec2.internal"}, '
+                                           '"usage": {"cpu": "9000m","memory": "9000Mi"}}]}']
+
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "ip-1-2-3-4.ec2.internal"},'
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body=metrics_callback)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body='{"items": []}', status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        test_cpu_usage, test_memory_usage = kube_config.get_cpu_and_mem_usage(node_selector_label="instance_type=test")
+        self.assertEqual(test_cpu_usage, 80)
+        self.assertEqual(test_memory_usage, 20)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_KubeGetScaleData_get_cpu_and_mem_usage_request_timeout(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "ip-1-2-3-4.ec2.internal"},'
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "ip-1-2-3-4.ec2.internal"}, '
+                                    '"usage": {"cpu": "800m","memory": "1000Mi"}}]}', status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body='{"items": []}', status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api,
+                                       call_timeout_seconds=7)
+        with mock.patch.object(kube_config.kube_client, "call_api", wraps=kube_config.kube_client.call_api) as call_api:
+            kube_config.get_cpu_and_mem_usage()
+        # the nodes, the pods & the metrics-server requests are each bounded by the collection deadline
+        self.assertEqual(call_api.call_count, 3)
+        for call in call_api.call_args_list:
+            self.assertEqual(call.kwargs["_request_timeout"], 7)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_KubeGetScaleData_get_cpu_and_mem_usage_paginated(self):
+        def pods_callback(request, uri, response_headers):
+            self.assertEqual(request.querystring["limit"], ["1"])
+            if "continue" not in request.querystring:
+                return [200, response_headers, '{"metadata": {"continue": "page2"}, "items": [{"spec": {"containers": '
+                                               '[{"name": "test", "resources": {"requests": {"cpu": "200m",'
+                                               '"memory": "1000Mi"}}}]}}]}']
+            self.assertEqual(request.querystring["continue"], ["page2"])
+            return [200, response_headers, '{"metadata": {}, "items": [{"spec": {"containers": [{"name": "test2", '
+                                           '"resources": {"requests": {"cpu": "300m","memory": "1500Mi"}}}]}}]}']
+
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "100m","memory": "100Mi"}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=pods_callback)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api,
+                                       page_size=1)
+        registry = enable_metrics()
+        page_requests_before = registry.get_sample_value("spotinst_autoscaler_api_call_duration_seconds_count",
+                                                         {"api": "kubernetes_list_running_pods"}) or 0
+        test_cpu_usage, test_memory_usage = kube_config.get_cpu_and_mem_usage()
+        self.assertEqual(test_cpu_usage, 50)
+        self.assertEqual(test_memory_usage, 50)
+        pods_requests = [request for request in httpretty.latest_requests() if request.path.startswith("/api/v1/pods")]
+        self.assertEqual(len(pods_requests), 2)
+        # each page request is timed on its own
+        self.assertEqual(registry.get_sample_value("spotinst_autoscaler_api_call_duration_seconds_count",
+                                                   {"api": "kubernetes_list_running_pods"}), page_requests_before + 2)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_raw_attribute_keys(self):
+        self.assertEqual(raw_attribute_keys()["node_name"], "nodeName")
+        self.assertEqual(raw_attribute_keys()["_continue"], "continue")
+        self.assertEqual(raw_attribute_keys()["required_during_scheduling_ignored_during_execution"],
+                         "requiredDuringSchedulingIgnoredDuringExecution")
+
+    def test_RawKubeObject_unknown_attributes(self):
+        raw_list = RawKubeObject({"metadata": {"continue": "token"}, "items": []})
+        self.assertEqual(raw_list.metadata._continue, "token")
+        for attribute_name in ("_private", "__deepcopy__", "not_a_kube_field"):
+            with self.assertRaises(AttributeError):
+                getattr(raw_list, attribute_name)
+        self.assertFalse(hasattr(raw_list, "__len__"))
+
+    def test_RawKubeObject(self):
+        raw_pod = RawKubeObject({"metadata": {"name": "test", "labels": {"app_name": "test"},
+                                              "creationTimestamp": "2021-05-26T08:47:02Z"},
+                                 "spec": {"nodeName": "node1", "containers": [{"resources": {"requests": {
+                                     "cpu": "100m"}}}]}})
+        self.assertEqual(raw_pod.spec.node_name, "node1")
+        self.assertEqual(raw_pod.metadata.labels, {"app_name": "test"})
+        self.assertEqual(raw_pod.spec.containers[0].resources.requests, {"cpu": "100m"})
+        self.assertEqual(raw_pod.metadata.creation_timestamp, datetime(2021, 5, 26, 8, 47, 2, tzinfo=timezone.utc))
+        self.assertIsNone(raw_pod.status)
+        self.assertIsNone(raw_pod.spec.affinity)
+
+    def test_KubeGetScaleData_get_cpu_and_mem_usage_node_selector_raw_json(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "ip-1-2-3-4.ec2.internal"},'
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}},'
+                                    '{"metadata": {"name": "ip-1-2-3-5.ec2.internal"},'
+                                    '"status": {"allocatable": {"cpu": "2000m","memory": "10000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "100m","memory": "100Mi"}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
+                               body='{"items": [{"name": "test", "spec": {"nodeName": "ip-1-2-3-4.ec2.internal", '
+                                    '"containers": [{"name": "test", "resources": '
+                                    '{"requests": {"cpu": "2000m","memory": "4000Mi"}}}]}},'
+                                    '{"name": "test3", "spec": {"nodeName": "ip-9-9-9-9.ec2.internal", '
+                                    '"containers": [{"name": "test3", "resources": '
+                                    '{"requests": {"cpu": "9000m","memory": "9000Mi"}}}]}}]}',
+                               status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api,
+                                       raw_json=True)
+        test_cpu_usage, test_memory_usage = kube_config.get_cpu_and_mem_usage(node_selector_label="instance_type=test")
+        self.assertEqual(test_cpu_usage, 66)
+        self.assertEqual(test_memory_usage, 26)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_KubeGetScaleData_pending_pods_exist_raw_json(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
+                               body='{"items": [{"metadata": {"creationTimestamp": "2021-05-26T08:40:00Z"}, '
+                                    '"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                                    '"status": "False", "lastTransitionTime": "2021-05-26T08:47:02Z", '
+                                    '"reason": "Unschedulable"}]}}]}', status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api,
+                                       raw_json=True)
+        self.assertTrue(kube_config.pending_pods_exist(minimum_pending_seconds=30))
+        self.assertEqual(kube_config.get_number_of_pending_pods(), 1)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_check_pods_stuck_do_to_insufficient_resource_node_group_node_selector_affinity_raw_json(self):
+        with open("test/test_responses/eks_node_affinity_response.json", "r") as myfile:
+            data = myfile.read().replace('\n', '')
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=data, status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api +
+                               "/api/v1/nodes?labelSelector=kubernetes.io/e2e-az-name=e2e-az1",
+                               body='{"items": [{"metadata": {"labels": {"kubernetes.io/e2e-az-name": '
+                                    '"e2e-az1", "key2": "value2"}}}]}',
+                               status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api,
+                                       raw_json=True)
+        insufficient_resource_pods = kube_config.check_pods_stuck_do_to_insufficient_resource(
+            node_selector_label="kubernetes.io/e2e-az-name=e2e-az1")
+        self.assertTrue(insufficient_resource_pods)
         httpretty.disable()
         httpretty.reset()
 
@@ -342,6 +548,41 @@ class BaseTests(TestCase):
         httpretty.disable()
         httpretty.reset()
 
+    def test_check_pods_stuck_do_to_insufficient_resource_node_group_labels_listed_once(self):
+        with open("test/test_responses/eks_node_affinity_response.json", "r") as myfile:
+            pod_list = json.loads(myfile.read())
+        pod_list["items"] = pod_list["items"] * 3
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=json.dumps(pod_list), status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api +
+                               "/api/v1/nodes?labelSelector=kubernetes.io/e2e-az-name=wrong-az",
+                               body='{"items": [{"metadata": {"labels": {"kubernetes.io/e2e-az-name": "wrong-az",'
+                                    ' "key2": "value2"}}}]}',
+                               status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        insufficient_resource_pods = kube_config.check_pods_stuck_do_to_insufficient_resource(
+            node_selector_label="kubernetes.io/e2e-az-name=wrong-az")
+        self.assertFalse(insufficient_resource_pods)
+        nodes_requests = [request for request in httpretty.latest_requests()
+                          if request.path.startswith("/api/v1/nodes")]
+        self.assertEqual(len(nodes_requests), 1)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_check_pods_stuck_do_to_insufficient_resource_known_node_group_labels(self):
+        with open("test/test_responses/eks_node_affinity_response.json", "r") as myfile:
+            data = myfile.read().replace('\n', '')
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=data, status=200)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        insufficient_resource_pods = kube_config.check_pods_stuck_do_to_insufficient_resource(
+            node_selector_label="kubernetes.io/e2e-az-name=e2e-az1",
+            node_group_labels={"kubernetes.io/e2e-az-name": "e2e-az1"})
+        self.assertTrue(insufficient_resource_pods)
+        self.assertFalse(any(request.path.startswith("/api/v1/nodes") for request in httpretty.latest_requests()))
+        httpretty.disable()
+        httpretty.reset()
+
     def test_check_pods_stuck_do_to_insufficient_resource_pending_pods_due_to_other_reasons(self):
         httpretty.enable()
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
@@ -394,3 +635,78 @@ class BaseTests(TestCase):
         self.assertDictEqual(response, {'kubernetes.io/e2e-az-name': 'e2e-az1'})
         httpretty.disable()
         httpretty.reset()
+
+    def test_KubeGetScaleData_take_snapshot(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1", "labels": {"group": "a"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}')
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, '
+                                    '"usage": {"cpu": "500m","memory": "1000Mi"}}]}')
+
+        def pods_callback(request, uri, response_headers):
+            if "status.phase=Pending" in request.querystring.get("fieldSelector", [""])[0]:
+                return [200, response_headers, '{"items": [{"spec": {"containers": [], "affinity": {}, '
+                                               '"nodeSelector": {"group": "a"}}, '
+                                               '"status": {"phase": "Pending", "conditions": [{"type": '
+                                               '"PodScheduled", "status": "False", "reason": "Unschedulable", '
+                                               '"message": "0/1 nodes are available: 1 Insufficient cpu."}]}}]}']
+            return [200, response_headers, '{"items": [{"spec": {"nodeName": "node1", "containers": [{"name": '
+                                           '"test", "resources": {"requests": {"cpu": "100m", "memory": "100Mi"}}}]}}'
+                                           ']}']
+
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=pods_callback)
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        snapshot = kube_config.take_snapshot()
+        httpretty.disable()
+        httpretty.reset()
+        self.assertEqual(snapshot.nodes, [NodeRecord("node1", {"group": "a"}, 1.0, 5000 * 1024 * 1024)])
+        self.assertEqual(snapshot.requests_by_node, {"node1": [0.1, 100 * 1024 * 1024]})
+        self.assertEqual(snapshot.usage_by_node, {"node1": [0.5, 1000 * 1024 * 1024]})
+        self.assertEqual(snapshot.get_number_of_pending_pods(), 1)
+        self.assertTrue(snapshot.check_pods_stuck_do_to_insufficient_resource("group=a"))
+        self.assertFalse(snapshot.check_pods_stuck_do_to_insufficient_resource("group=b"))
+
+    def test_pod_requested_resources(self):
+        pod = kubernetes.client.V1Pod(spec=kubernetes.client.V1PodSpec(
+            containers=[kubernetes.client.V1Container(name="test1", resources=kubernetes.client.V1ResourceRequirements(
+                requests={"cpu": "100m", "memory": "100Mi"})),
+                kubernetes.client.V1Container(name="test2", resources=kubernetes.client.V1ResourceRequirements(
+                    requests={"cpu": "200m"}))],
+            init_containers=[kubernetes.client.V1Container(
+                name="init", resources=kubernetes.client.V1ResourceRequirements(
+                    requests={"cpu": "50m", "memory": "1Gi"}))]))
+        requested_cpu, requested_memory = pod_requested_resources(pod)
+        self.assertAlmostEqual(requested_cpu, 0.3)
+        self.assertEqual(requested_memory, 1024 ** 3)
+        self.assertEqual(pod_requested_resources(kubernetes.client.V1Pod()), (0, 0))
+
+    def test_pod_requested_resources_extended_resources(self):
+        pod = kubernetes.client.V1Pod(spec=kubernetes.client.V1PodSpec(
+            containers=[kubernetes.client.V1Container(name="test1", resources=kubernetes.client.V1ResourceRequirements(
+                requests={"cpu": "100m", "nvidia.com/gpu": "1", "ephemeral-storage": "1Gi"})),
+                kubernetes.client.V1Container(name="test2", resources=kubernetes.client.V1ResourceRequirements(
+                    requests={"nvidia.com/gpu": "2"}))],
+            init_containers=[kubernetes.client.V1Container(
+                name="init", resources=kubernetes.client.V1ResourceRequirements(
+                    requests={"ephemeral-storage": "2Gi"}))]))
+        self.assertEqual(pod_requested_resources(pod, ("nvidia.com/gpu", "ephemeral-storage", "hugepages-2Mi")),
+                         (0.1, 0, 3, 2 * 1024 ** 3, 0))
+        self.assertEqual(pod_requested_resources(kubernetes.client.V1Pod(), ("nvidia.com/gpu",)), (0, 0, 0))
+        node = kubernetes.client.V1Node(metadata=kubernetes.client.V1ObjectMeta(name="node1"),
+                                        status=kubernetes.client.V1NodeStatus(allocatable={
+                                            "cpu": "8", "memory": "32Gi", "nvidia.com/gpu": "4"}))
+        self.assertEqual(node_record(node, ("nvidia.com/gpu", "ephemeral-storage")).extended_allocatable, (4, 0))
+
+    def test_pod_is_movable(self):
+        daemonset_pod = kubernetes.client.V1Pod(metadata=kubernetes.client.V1ObjectMeta(owner_references=[
+            kubernetes.client.V1OwnerReference(api_version="apps/v1", kind="DaemonSet", name="test", uid="1")]))
+        mirror_pod = kubernetes.client.V1Pod(metadata=kubernetes.client.V1ObjectMeta(
+            annotations={"kubernetes.io/config.mirror": "abc"}))
+        replicaset_pod = kubernetes.client.V1Pod(metadata=kubernetes.client.V1ObjectMeta(owner_references=[
+            kubernetes.client.V1OwnerReference(api_version="apps/v1", kind="ReplicaSet", name="test", uid="1")]))
+        self.assertFalse(pod_is_movable(daemonset_pod))
+        self.assertFalse(pod_is_movable(mirror_pod))
+        self.assertTrue(pod_is_movable(replicaset_pod))
+        self.assertTrue(pod_is_movable(kubernetes.client.V1Pod()))
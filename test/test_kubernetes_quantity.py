@@ -0,0 +1,47 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_quantity import *
+
+
+class BaseTests(TestCase):
+
+    def test_parse_quantity_no_suffix(self):
+        self.assertEqual(parse_quantity("2"), 2)
+        self.assertEqual(parse_quantity("0.5"), 0.5)
+        self.assertEqual(parse_quantity(".5"), 0.5)
+        self.assertEqual(parse_quantity("+1"), 1)
+        self.assertEqual(parse_quantity("-1"), -1)
+
+    def test_parse_quantity_decimal_si(self):
+        self.assertEqual(parse_quantity("10500m"), 10.5)
+        self.assertEqual(parse_quantity("250000000n"), 0.25)
+        self.assertEqual(parse_quantity("500u"), 0.0005)
+        self.assertEqual(parse_quantity("1k"), 1000)
+        self.assertEqual(parse_quantity("2M"), 2000000)
+        self.assertEqual(parse_quantity("1.5G"), 1500000000)
+        self.assertEqual(parse_quantity("1T"), 10 ** 12)
+        self.assertEqual(parse_quantity("1P"), 10 ** 15)
+        self.assertEqual(parse_quantity("1E"), 10 ** 18)
+
+    def test_parse_quantity_binary_si(self):
+        self.assertEqual(parse_quantity("1Ki"), 1024)
+        self.assertEqual(parse_quantity("256Mi"), 256 * 1024 ** 2)
+        self.assertEqual(parse_quantity("1.5Gi"), 1.5 * 1024 ** 3)
+        self.assertEqual(parse_quantity("1Ti"), 1024 ** 4)
+        self.assertEqual(parse_quantity("1Pi"), 1024 ** 5)
+        self.assertEqual(parse_quantity("1Ei"), 1024 ** 6)
+
+    def test_parse_quantity_decimal_exponent(self):
+        self.assertEqual(parse_quantity("1e3"), 1000)
+        self.assertEqual(parse_quantity("1E3"), 1000)
+        self.assertEqual(parse_quantity("12e-2"), 0.12)
+
+    def test_parse_quantity_raise_TypeError_on_invalid_quantity(self):
+        for invalid_quantity in ["", "Mi", "1KiB", "1e", "1.2.3", "10500Ubernonexistingunit"]:
+            with self.assertRaises(TypeError):
+                parse_quantity(invalid_quantity)
+
+    def test_parse_quantity_memoized(self):
+        parse_quantity.cache_clear()
+        parse_quantity("100m")
+        parse_quantity("100m")
+        self.assertEqual(parse_quantity.cache_info().hits, 1)
@@ -0,0 +1,107 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_watch_cache import *
+from spotinst_kubernetes_cluster_autoscaler.kubernetes_get_scaling_data import KubeGetScaleData
+from kubernetes import client
+import os
+
+kube_test_token = os.getenv("TEST_TOKEN", "test")
+kube_test_api = os.getenv("TEST_API_ENDPOINT", "https://test:443")
+
+
+def make_node(name: str, labels: dict = None, cpu: str = "1000m", memory: str = "5000Mi") -> client.V1Node:
+    return client.V1Node(metadata=client.V1ObjectMeta(name=name, labels=labels),
+                         status=client.V1NodeStatus(allocatable={"cpu": cpu, "memory": memory}))
+
+
+def make_pod(name: str, phase: str, node_name: str = None, cpu: str = "100m",
+             memory: str = "100Mi") -> client.V1Pod:
+    container = client.V1Container(name=name, resources=client.V1ResourceRequirements(
+        requests={"cpu": cpu, "memory": memory}))
+    return client.V1Pod(metadata=client.V1ObjectMeta(name=name, namespace="default"),
+                        spec=client.V1PodSpec(containers=[container], node_name=node_name),
+                        status=client.V1PodStatus(phase=phase))
+
+
+class BaseTests(TestCase):
+
+    def test_label_selector_matches_no_selector(self):
+        self.assertTrue(label_selector_matches({"key1": "value1"}, None))
+        self.assertTrue(label_selector_matches(None, ""))
+
+    def test_label_selector_matches_equality(self):
+        self.assertTrue(label_selector_matches({"key1": "value1", "key2": "value2"}, "key1=value1"))
+        self.assertTrue(label_selector_matches({"key1": "value1", "key2": "value2"}, "key1==value1,key2=value2"))
+        self.assertFalse(label_selector_matches({"key1": "value1"}, "key1=value2"))
+        self.assertFalse(label_selector_matches(None, "key1=value1"))
+
+    def test_label_selector_matches_inequality_and_existence(self):
+        self.assertTrue(label_selector_matches({"key1": "value1"}, "key1!=value2"))
+        self.assertFalse(label_selector_matches({"key1": "value1"}, "key1!=value1"))
+        self.assertTrue(label_selector_matches({"key1": "value1"}, "key1,!key2"))
+        self.assertFalse(label_selector_matches({"key1": "value1"}, "!key1"))
+        self.assertFalse(label_selector_matches({"key1": "value1"}, "key2"))
+
+    def test_object_key(self):
+        self.assertEqual(object_key(make_node("node1")), "node1")
+        self.assertEqual(object_key(make_pod("pod1", "Running")), "default/pod1")
+
+    def test_KubeWatchCache_replace_marks_synced(self):
+        watch_cache = KubeWatchCache(v1=None)
+        self.assertFalse(watch_cache.wait_for_sync(timeout=0))
+        watch_cache.replace("nodes", [make_node("node1")])
+        self.assertFalse(watch_cache.wait_for_sync(timeout=0))
+        watch_cache.replace("pods", [])
+        self.assertTrue(watch_cache.wait_for_sync(timeout=0))
+        self.assertEqual(len(watch_cache.list_nodes()), 1)
+
+    def test_KubeWatchCache_apply_event(self):
+        watch_cache = KubeWatchCache(v1=None)
+        watch_cache.replace("pods", [make_pod("pod1", "Pending")])
+        watch_cache.apply_event("pods", "MODIFIED", make_pod("pod1", "Running", node_name="node1"))
+        watch_cache.apply_event("pods", "ADDED", make_pod("pod2", "Pending"))
+        self.assertEqual([pod.metadata.name for pod in watch_cache.list_pods(phase="Running")], ["pod1"])
+        self.assertEqual([pod.metadata.name for pod in watch_cache.list_pods(phase="Pending")], ["pod2"])
+        watch_cache.apply_event("pods", "DELETED", make_pod("pod2", "Pending"))
+        watch_cache.apply_event("pods", "BOOKMARK", make_pod("pod3", "Pending"))
+        self.assertEqual(watch_cache.list_pods(phase="Pending"), [])
+
+    def test_KubeWatchCache_with_aggregator_keeps_only_keys(self):
+        class RecordingAggregator:
+            def __init__(self):
+                self.events = []
+
+            def replace(self, kind, items):
+                self.events.append((kind, "REPLACE", [object_key(item) for item in items]))
+
+            def apply_event(self, kind, event_type, item):
+                self.events.append((kind, event_type, object_key(item)))
+
+        aggregator = RecordingAggregator()
+        watch_cache = KubeWatchCache(v1=None, aggregator=aggregator)
+        watch_cache.replace("pods", [make_pod("pod1", "Pending")])
+        watch_cache.apply_event("pods", "ADDED", make_pod("pod2", "Running", node_name="node1"))
+        self.assertEqual(watch_cache.pods, {"default/pod1": None, "default/pod2": None})
+        self.assertEqual(aggregator.events, [("pods", "REPLACE", ["default/pod1"]), ("pods", "ADDED", "default/pod2")])
+        with self.assertRaises(ValueError):
+            watch_cache.list_pods()
+
+    def test_KubeWatchCache_list_filters(self):
+        watch_cache = KubeWatchCache(v1=None)
+        watch_cache.replace("nodes", [make_node("node1", {"group": "a"}), make_node("node2", {"group": "b"})])
+        watch_cache.replace("pods", [make_pod("pod1", "Running", node_name="node1"),
+                                     make_pod("pod2", "Running", node_name="node2")])
+        self.assertEqual([node.metadata.name for node in watch_cache.list_nodes(label_selector="group=b")],
+                         ["node2"])
+        self.assertEqual([pod.metadata.name for pod in watch_cache.list_pods(phase="Running", node_name="node1")],
+                         ["pod1"])
+
+    def test_KubeGetScaleData_reads_from_attached_watch_cache(self):
+        watch_cache = KubeWatchCache(v1=None)
+        watch_cache.replace("nodes", [make_node("node1", {"group": "a"}), make_node("node2", {"group": "b"})])
+        watch_cache.replace("pods", [make_pod("pod1", "Running", node_name="node1", cpu="500m", memory="1000Mi"),
+                                     make_pod("pod2", "Running", node_name="node2")])
+        kube_config = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        kube_config.attach_watch_cache(watch_cache)
+        self.assertEqual(kube_config.get_connected_nodes_count(), 2)
+        self.assertEqual(kube_config.get_number_of_pending_pods(), 0)
+        self.assertEqual(kube_config.check_node_group_labels("group=b"), {"group": "b"})
@@ -1,6 +1,12 @@
 from unittest import TestCase, mock
 from spotinst_kubernetes_cluster_autoscaler.main_logic_flow import *
+from kubernetes import client
+import contextlib
+import functools
 import httpretty
+import io
+import pstats
+import tempfile
 
 
 kube_test_token = os.getenv("TEST_TOKEN", "test")
@@ -10,28 +16,37 @@ TEST_ELASTIGROUP = "sig-123"
 TEST_CONFIG_DIR = "test/test_config"
 
 
+def register_pods_uri(pending_body: str, running_body: str):
+    # httpretty ignores the query string when matching so the Pending & Running pods lists are told apart by the
+    # request fieldSelector rather then by registering the same path twice
+    def pods_callback(request, uri, response_headers):
+        if "status.phase=Pending" in request.querystring.get("fieldSelector", [""])[0]:
+            return [200, response_headers, pending_body]
+        return [200, response_headers, running_body]
+
+    httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods", body=pods_callback)
+
+
 class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_up_stuck_pods(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": [{"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
-                                    '"status": "False", "lastProbeTime": null, '
-                                    '"lastTransitionTime": "2021-05-26T08:47:02Z", '
-                                    '"reason": "Unschedulable", '
-                                    '"message": "0/13 nodes are available: 13 Insufficient memory."}]}}]}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "500m","memory": "1000Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": [{"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                         '"status": "False", "lastProbeTime": null, '
+                         '"lastTransitionTime": "2021-05-26T08:47:02Z", '
+                         '"reason": "Unschedulable", '
+                         '"message": "0/13 nodes are available: 13 Insufficient memory."}]}}]}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
                                body='{"response": {"count": 6}}', status=200)
         with mock.patch('os.environ', {
@@ -47,20 +62,18 @@ class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_up_high_cpu(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": []}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "900m","memory": "1000Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
                                body='{"response": {"count": 6}}', status=200)
         with mock.patch('os.environ', {
@@ -76,20 +89,18 @@ class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_up_high_memory(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": []}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "100m","memory": "4900Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
                                body='{"response": {"count": 6}}', status=200)
         with mock.patch('os.environ', {
@@ -103,22 +114,52 @@ class BaseTests(TestCase):
         httpretty.disable()
         httpretty.reset()
 
+    def test_main_logic_flow_scale_up_high_extended_resource(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, "status": {"allocatable": '
+                                    '{"cpu": "8000m","memory": "32Gi","nvidia.com/gpu": "2"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, '
+                                    '"usage": {"cpu": "100m","memory": "100Mi"}}]}',
+                               status=200)
+        # CPU & memory are far below the thresholds (& even their scale down thresholds) but both GPUs are taken
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"nodeName": "node1", "containers": [{"name": "test", '
+                         '"resources": {"requests": {"cpu": "100m","memory": "100Mi","nvidia.com/gpu": "2"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "EXTENDED_RESOURCES": '{"nvidia.com/gpu": {"max_usage": 80, "min_usage": 20}}'
+        }):
+            action_taken = main_logic_flow()
+        self.assertEqual(action_taken, "scaled_up")
+        self.assertEqual(httpretty.last_request().method, "PUT")
+        httpretty.disable()
+        httpretty.reset()
+
     def test_main_logic_flow_scale_down_low_usage(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": []}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "100m","memory": "400Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
                                body='{"response": {"count": 6}}', status=200)
         with mock.patch('os.environ', {
@@ -132,22 +173,47 @@ class BaseTests(TestCase):
         httpretty.disable()
         httpretty.reset()
 
+    def test_main_logic_flow_scale_down_not_safe(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "100m","memory": "400Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "SCALE_DOWN_SIMULATION": "true"
+        }):
+            action_taken = main_logic_flow()
+        self.assertIsNone(action_taken)
+        self.assertEqual(httpretty.last_request().method, "GET")
+        httpretty.disable()
+        httpretty.reset()
+
     def test_main_logic_flow_no_rescaling_needed(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": []}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "500m","memory": "2500Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
                                body='{"response": {"count": 6}}', status=200)
         with mock.patch('os.environ', {
@@ -167,22 +233,19 @@ class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_up_active_false_no_scale_up(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": [{"name": "test12", "spec": {"containers": [{"name": "test12", '
-                                    '"resources": {"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "100m","memory": "4900Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": [{"name": "test12", "spec": {"containers": [{"name": "test12", '
+                         '"resources": {"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         with mock.patch('os.environ', {
             "CONFIG_DIR": TEST_CONFIG_DIR,
             "SPOTINST_TOKEN": TEST_TOKEN,
@@ -197,20 +260,18 @@ class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_down_active_false_no_scale_down(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": []}', status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "100m","memory": "400Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness", body='{"response": {"count": 5}}')
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         with mock.patch('os.environ', {
             "CONFIG_DIR": TEST_CONFIG_DIR,
             "SPOTINST_TOKEN": TEST_TOKEN,
@@ -225,20 +286,19 @@ class BaseTests(TestCase):
 
     def test_main_logic_flow_scale_up_stuck_pods_and_scale_on_pending_pods_is_false(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Pending",
-                               body='{"items": [{"name": "test12", "spec": {"containers": [{"name": "test12", '
-                                    '"resources": {"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
                                body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
                                status=200)
         httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
                                body='{"items": [{"usage": {"cpu": "500m","memory": "2500Mi"}}]}',
                                status=200)
-        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/pods?fieldSelector=status.phase=Running",
-                               body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
-                                    '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
-                               status=200)
+        register_pods_uri(
+            pending_body='{"items": [{"name": "test12", "spec": {"containers": [{"name": "test12", '
+                         '"resources": {"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
         with mock.patch('os.environ', {
             "CONFIG_DIR": TEST_CONFIG_DIR,
             "SPOTINST_TOKEN": TEST_TOKEN,
@@ -250,3 +310,495 @@ class BaseTests(TestCase):
         self.assertIsNone(action_taken)
         httpretty.disable()
         httpretty.reset()
+
+    def test_daemon_logic_flow_reads_from_watch_cache(self):
+        def fake_start(watch_cache):
+            watch_cache.replace("nodes", [client.V1Node(
+                metadata=client.V1ObjectMeta(name="node1"),
+                status=client.V1NodeStatus(allocatable={"cpu": "1000m", "memory": "5000Mi"}))])
+            watch_cache.replace("pods", [])
+
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "900m","memory": "1000Mi"}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            configuration = read_configurations(TEST_CONFIG_DIR)
+        kube_connection = KubeGetScaleData(connection_method="api", token=kube_test_token, api_endpoint=kube_test_api)
+        spotinst_connections = {TEST_ELASTIGROUP: SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP,
+                                                                spotinst_account="act-12345678", min_nodes=2,
+                                                                max_nodes=100)}
+        with mock.patch.object(KubeWatchCache, "start", fake_start):
+            daemon_logic_flow(configuration, kube_connection, spotinst_connections, max_cycles=1)
+        # the snapshots are taken from the aggregator so the watch cache itself only keeps the object keys
+        self.assertIsNone(kube_connection.watch_cache)
+        self.assertIsNotNone(kube_connection.aggregator)
+        self.assertEqual(httpretty.last_request().method, "PUT")
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_daemon_run_mode(self):
+        def fake_start(watch_cache):
+            watch_cache.replace("nodes", [client.V1Node(
+                metadata=client.V1ObjectMeta(name="node1"),
+                status=client.V1NodeStatus(allocatable={"cpu": "1000m", "memory": "5000Mi"}))])
+            watch_cache.replace("pods", [])
+
+        single_cycle_daemon_logic_flow = functools.partial(daemon_logic_flow, max_cycles=1)
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "900m","memory": "1000Mi"}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "RUN_MODE": "daemon"
+        }), mock.patch.object(KubeWatchCache, "start", fake_start), \
+                mock.patch("spotinst_kubernetes_cluster_autoscaler.main_logic_flow.daemon_logic_flow",
+                           single_cycle_daemon_logic_flow):
+            action_taken = main_logic_flow()
+        # the daemon is started the same way main_logic_flow starts it, only stopped after its first cycle
+        self.assertIsNone(action_taken)
+        self.assertEqual(httpretty.last_request().method, "PUT")
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_multiple_node_groups_single_snapshot(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1", "labels": {"group": "a"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}, '
+                                    '{"metadata": {"name": "node2", "labels": {"group": "b"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, '
+                                    '"usage": {"cpu": "900m","memory": "1000Mi"}}, '
+                                    '{"metadata": {"name": "node2"}, "usage": {"cpu": "500m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(pending_body='{"items": []}', running_body='{"items": []}')
+        for elastigroup_id in ("sig-1", "sig-2"):
+            httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{"response": {"items": [{"capacity": {"target": 1}}]}}')
+            httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "NODE_GROUPS": '[{"elastigroup_id": "sig-1", "node_selector_label": "group=a"}, '
+                           '{"elastigroup_id": "sig-2", "node_selector_label": "group=b"}]'
+        }):
+            action_taken = main_logic_flow()
+        self.assertEqual(action_taken, {"sig-1": "scaled_up", "sig-2": None})
+        nodes_requests = [request for request in httpretty.latest_requests()
+                          if request.path.startswith("/api/v1/nodes")]
+        self.assertEqual(len(nodes_requests), 1)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_stuck_pods_of_other_node_group(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1", "labels": {"group": "a"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}, '
+                                    '{"metadata": {"name": "node2", "labels": {"group": "b"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, '
+                                    '"usage": {"cpu": "500m","memory": "2500Mi"}}, '
+                                    '{"metadata": {"name": "node2"}, "usage": {"cpu": "500m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": [{"spec": {"nodeSelector": {"group": "b"}, "affinity": {}, "containers": '
+                         '[{"name": "test", "resources": {"requests": {"cpu": "100m","memory": "100Mi"}}}]}, '
+                         '"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                         '"status": "False", "lastTransitionTime": "2021-05-26T08:47:02Z", '
+                         '"reason": "Unschedulable", '
+                         '"message": "0/2 nodes are available: 2 Insufficient memory."}]}}]}',
+            running_body='{"items": []}')
+        for elastigroup_id in ("sig-1", "sig-2"):
+            httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{"response": {"items": [{"capacity": {"target": 1}}]}}')
+            httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "NODE_GROUPS": '[{"elastigroup_id": "sig-1", "node_selector_label": "group=a"}, '
+                           '{"elastigroup_id": "sig-2", "node_selector_label": "group=b"}]'
+        }):
+            action_taken = main_logic_flow()
+        # the pod can only be placed on group b so group a is decided on its usage alone
+        self.assertEqual(action_taken, {"sig-1": None, "sig-2": "scaled_up"})
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_unpinned_stuck_pod_scales_a_single_node_group(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1", "labels": {"group": "a"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}, '
+                                    '{"metadata": {"name": "node2", "labels": {"group": "b"}}, '
+                                    '"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"metadata": {"name": "node1"}, '
+                                    '"usage": {"cpu": "500m","memory": "2500Mi"}}, '
+                                    '{"metadata": {"name": "node2"}, "usage": {"cpu": "500m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": [{"spec": {"containers": [{"name": "test", "resources": {"requests": '
+                         '{"cpu": "100m","memory": "100Mi"}}}]}, '
+                         '"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                         '"status": "False", "lastTransitionTime": "2021-05-26T08:47:02Z", '
+                         '"reason": "Unschedulable", '
+                         '"message": "0/2 nodes are available: 2 Insufficient memory."}]}}]}',
+            running_body='{"items": []}')
+        for elastigroup_id in ("sig-1", "sig-2"):
+            httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{"response": {"items": [{"capacity": {"target": 1}}]}}')
+            httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + elastigroup_id,
+                                   body='{}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "NODE_GROUPS": '[{"elastigroup_id": "sig-1", "node_selector_label": "group=a"}, '
+                           '{"elastigroup_id": "sig-2", "node_selector_label": "group=b"}]'
+        }):
+            action_taken = main_logic_flow()
+        # the pod could be placed on either node group but only the first one is scaled up for it
+        self.assertEqual(action_taken, {"sig-1": "scaled_up", "sig-2": None})
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_scale_up_stuck_pods_bin_packing(self):
+        stuck_pod = '{"spec": {"containers": [{"name": "test", "resources": {"requests": {"cpu": "600m", ' \
+                    '"memory": "100Mi"}}}]}, "status": {"phase": "Pending", "conditions": [{"type": ' \
+                    '"PodScheduled", "status": "False", "reason": "Unschedulable", ' \
+                    '"message": "0/1 nodes are available: 1 Insufficient cpu."}]}}'
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "500m","memory": "1000Mi"}}]}',
+                               status=200)
+        register_pods_uri(pending_body='{"items": [' + ", ".join([stuck_pod] * 3) + ']}',
+                          running_body='{"items": []}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{}', status=200)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api,
+            "SCALE_UP_BIN_PACKING": "true"
+        }):
+            action_taken = main_logic_flow()
+        self.assertEqual(action_taken, "scaled_up")
+        self.assertIn('"target": 8,', httpretty.last_request().body.decode())
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_counts_in_flight_nodes_between_runs(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "500m","memory": "1000Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": [{"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                         '"status": "False", "lastProbeTime": null, '
+                         '"lastTransitionTime": "2021-05-26T08:47:02Z", '
+                         '"reason": "Unschedulable", '
+                         '"message": "0/13 nodes are available: 13 Insufficient memory."}]}}]}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 1}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 2}}', status=200)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('os.environ', {
+                "CONFIG_DIR": TEST_CONFIG_DIR,
+                "SPOTINST_TOKEN": TEST_TOKEN,
+                "KUBE_TOKEN": kube_test_token,
+                "KUBE_API_ENDPOINT": kube_test_api,
+                "SCALING_STATE_STORE": "file",
+                "SCALING_STATE_FILE_PATH": os.path.join(temp_dir, "scaling_state.json")
+            }):
+                first_action_taken = main_logic_flow()
+                # the pod is still pending on the next run as the node added for it hasn't joined yet
+                second_action_taken = main_logic_flow()
+        self.assertEqual(first_action_taken, "scaled_up")
+        self.assertIsNone(second_action_taken)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_group_scaling_decision_at_max_nodes_records_no_scale_up(self):
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            group_configuration = get_node_groups(read_configurations(TEST_CONFIG_DIR))[0]
+        snapshot = ClusterSnapshot(nodes=[NodeRecord("node1", {}, 1.0, 1000.0)], pods_by_node={}, usage_by_node={},
+                                   pending_pods=[PendingPodRecord(None, True, requests=(0.5, 100.0))])
+        spotinst_connection = ReplaySpotinstScale(recorded_desired_capacity=5, auth_token="replay",
+                                                  elastigroup=TEST_ELASTIGROUP, spotinst_account="act-12345678",
+                                                  min_nodes=2, max_nodes=5)
+        scaling_state = ScalingState()
+        action_taken = group_scaling_decision(group_configuration, snapshot, spotinst_connection,
+                                              scaling_state=scaling_state)
+        # nothing could be added so there are no nodes to wait for & the next run is free to scale up
+        self.assertIsNone(action_taken)
+        self.assertIsNone(spotinst_connection.resized_to)
+        self.assertEqual(scaling_state.in_flight_nodes(TEST_ELASTIGROUP, 1), 0)
+        self.assertFalse(scaling_state.in_stabilization_window(TEST_ELASTIGROUP, "scale_up", 300))
+
+    def test_main_logic_flow_smoothed_usage_ignores_spike(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "900m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(pending_body='{"items": []}', running_body='{"items": []}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history_path = os.path.join(temp_dir, "history.json")
+            usage_history = UtilizationHistory(store=FileHistoryStore(history_path))
+            for seconds_ago in (120, 60):
+                usage_history.add_sample(TEST_ELASTIGROUP, 60, 50, timestamp=time.time() - seconds_ago)
+            usage_history.save()
+            with mock.patch('os.environ', {
+                "CONFIG_DIR": TEST_CONFIG_DIR,
+                "SPOTINST_TOKEN": TEST_TOKEN,
+                "KUBE_TOKEN": kube_test_token,
+                "KUBE_API_ENDPOINT": kube_test_api,
+                "USAGE_SMOOTHING": "ewma",
+                "USAGE_HISTORY_STORE": "file",
+                "USAGE_HISTORY_FILE_PATH": history_path
+            }):
+                action_taken = main_logic_flow()
+            saved_usage_history = UtilizationHistory(store=FileHistoryStore(history_path))
+            saved_usage_history.load()
+        # the 90% CPU spike is smoothed to 69% which is below max_cpu_usage so no scale up
+        self.assertIsNone(action_taken)
+        self.assertEqual(len(saved_usage_history.samples[TEST_ELASTIGROUP]), 3)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_group_usage_only_smoothed_when_configured(self):
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            group_configuration = get_node_groups(read_configurations(TEST_CONFIG_DIR))[0]
+        snapshot = ClusterSnapshot(nodes=[NodeRecord("node1", {}, 1.0, 1000.0)], pods_by_node={},
+                                   usage_by_node={"node1": [0.9, 500.0]}, pending_pods=[])
+        usage_history = UtilizationHistory()
+        usage_history.add_sample(TEST_ELASTIGROUP, 60, 50, timestamp=time.time() - 60)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            used_usage = group_usage(group_configuration, snapshot, usage_history=usage_history)
+        # with no usage_smoothing the history is still kept but the current usage is decided on & reported as is
+        self.assertEqual(used_usage, (90, 50))
+        self.assertNotIn("smoothed", output.getvalue())
+        self.assertEqual(len(usage_history.samples[TEST_ELASTIGROUP]), 2)
+        group_configuration["usage_smoothing"] = "ewma"
+        with contextlib.redirect_stdout(output):
+            group_usage(group_configuration, snapshot, usage_history=usage_history)
+        self.assertIn("smoothed CPU usage is", output.getvalue())
+
+    def test_main_logic_flow_forecast_scales_up_ahead_of_threshold(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "700m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(pending_body='{"items": []}', running_body='{"items": []}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{}', status=200)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history_path = os.path.join(temp_dir, "history.json")
+            usage_history = UtilizationHistory(store=FileHistoryStore(history_path))
+            for seconds_ago, cpu in ((120, 50), (60, 60)):
+                usage_history.add_sample(TEST_ELASTIGROUP, cpu, 50, timestamp=time.time() - seconds_ago)
+            usage_history.save()
+            with mock.patch('os.environ', {
+                "CONFIG_DIR": TEST_CONFIG_DIR,
+                "SPOTINST_TOKEN": TEST_TOKEN,
+                "KUBE_TOKEN": kube_test_token,
+                "KUBE_API_ENDPOINT": kube_test_api,
+                "USAGE_FORECAST": "linear",
+                "USAGE_HISTORY_STORE": "file",
+                "USAGE_HISTORY_FILE_PATH": history_path
+            }):
+                action_taken = main_logic_flow()
+        # CPU is only at 70% but rising 10% a minute so it's forecast to be above max_cpu_usage within 240 seconds
+        self.assertEqual(action_taken, "scaled_up")
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_pushes_metrics(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "900m","memory": "1000Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        httpretty.register_uri(httpretty.PUT,
+                               "http://pushgateway:9091/metrics/job/spotinst-kubernetes-cluster-autoscaler",
+                               body="", status=200)
+        registry = enable_metrics()
+        scale_ups_before = registry.get_sample_value("spotinst_autoscaler_scale_actions_total",
+                                                     {"elastigroup": TEST_ELASTIGROUP, "action": "scaled_up"}) or 0
+        with mock.patch('os.environ', {
+            "METRICS_PUSHGATEWAY": "pushgateway:9091",
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            action_taken = main_logic_flow()
+        self.assertEqual(action_taken, "scaled_up")
+        self.assertEqual(registry.get_sample_value("spotinst_autoscaler_scale_actions_total",
+                                                   {"elastigroup": TEST_ELASTIGROUP, "action": "scaled_up"}),
+                         scale_ups_before + 1)
+        self.assertEqual(registry.get_sample_value("spotinst_autoscaler_cpu_usage_percent",
+                                                   {"elastigroup": TEST_ELASTIGROUP, "kind": "current"}), 90)
+        pushed_metrics = httpretty.last_request().body.decode()
+        self.assertIn("spotinst_autoscaler_api_call_duration_seconds_count{api=\"kubernetes_list_nodes\"}",
+                      pushed_metrics)
+        self.assertIn("spotinst_autoscaler_desired_capacity{elastigroup=\"" + TEST_ELASTIGROUP + "\"} 6.0",
+                      pushed_metrics)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_profiled_run_writes_profile(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "500m","memory": "2500Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": []}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        temp_dir = tempfile.TemporaryDirectory()
+        profile_output_path = os.path.join(temp_dir.name, "profile.pstats")
+        with mock.patch('os.environ', {
+            "PROFILE_OUTPUT_PATH": profile_output_path,
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            action_taken = main_logic_flow()
+        self.assertIsNone(action_taken)
+        self.assertIn("KubeGetScaleData.take_snapshot", run_timings)
+        self.assertIn("take_snapshot", [function_name for _, _, function_name in
+                                        pstats.Stats(profile_output_path).stats.keys()])
+        temp_dir.cleanup()
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_main_logic_flow_recorded_run_replays_offline(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/api/v1/nodes",
+                               body='{"items": [{"status": {"allocatable": {"cpu": "1000m","memory": "5000Mi"}}}]}',
+                               status=200)
+        httpretty.register_uri(httpretty.GET, kube_test_api + "/apis/metrics.k8s.io/v1beta1/nodes",
+                               body='{"items": [{"usage": {"cpu": "500m","memory": "1000Mi"}}]}',
+                               status=200)
+        register_pods_uri(
+            pending_body='{"items": [{"status": {"phase": "Pending","conditions": [{"type": "PodScheduled",'
+                         '"status": "False", "lastProbeTime": null, '
+                         '"lastTransitionTime": "2021-05-26T08:47:02Z", '
+                         '"reason": "Unschedulable", '
+                         '"message": "0/13 nodes are available: 13 Insufficient memory."}]}}]}',
+            running_body='{"items": [{"name": "test", "spec": {"containers": [{"name": "test", "resources": '
+                         '{"requests": {"cpu": "100m","memory": "100Mi"}}}]}}]}')
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 5}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"count": 6}}', status=200)
+        temp_dir = tempfile.TemporaryDirectory()
+        with mock.patch('os.environ', {
+            "SNAPSHOT_RECORD_DIR": temp_dir.name,
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN,
+            "KUBE_TOKEN": kube_test_token,
+            "KUBE_API_ENDPOINT": kube_test_api
+        }):
+            action_taken = main_logic_flow()
+        self.assertEqual(action_taken, "scaled_up")
+        httpretty.disable()
+        httpretty.reset()
+
+        recordings = os.listdir(temp_dir.name)
+        self.assertEqual(len(recordings), 1)
+        # the replay must not touch the network at all
+        httpretty.enable(allow_net_connect=False)
+        with mock.patch('os.environ', {
+            "CONFIG_DIR": TEST_CONFIG_DIR,
+            "SPOTINST_TOKEN": TEST_TOKEN
+        }):
+            replayed = replay_snapshot(read_configurations(TEST_CONFIG_DIR),
+                                       os.path.join(temp_dir.name, recordings[0]))
+        httpretty.disable()
+        httpretty.reset()
+        temp_dir.cleanup()
+        self.assertEqual(replayed["actions_taken"], {TEST_ELASTIGROUP: "scaled_up"})
+        self.assertEqual(replayed["resized_to"], {TEST_ELASTIGROUP: 6})
@@ -0,0 +1,86 @@
+from unittest import TestCase, mock
+from spotinst_kubernetes_cluster_autoscaler.metrics import *
+import httpretty
+import subprocess
+
+
+class BaseTests(TestCase):
+
+    def test_no_op_metric_accepts_all_calls(self):
+        metric = NoOpMetric()
+        self.assertIs(metric.labels(api="test"), metric)
+        metric.observe(1.5)
+        metric.set(3)
+        metric.inc()
+        with metric.time():
+            pass
+
+    def test_lazy_metric_is_a_no_op_until_enabled(self):
+        metric = LazyMetric("Counter", "spotinst_autoscaler_test_lazy", "a test metric", ("stage",))
+        metric.labels(stage="test_stage").inc()
+        self.assertIsInstance(metric.metric, NoOpMetric)
+
+    def test_api_call_duration_observed(self):
+        registry = enable_metrics()
+        self.assertIs(enable_metrics(), registry)
+        count_before = registry.get_sample_value("spotinst_autoscaler_api_call_duration_seconds_count",
+                                                 {"api": "test_api"}) or 0
+        with API_CALL_DURATION.labels(api="test_api").time():
+            pass
+        self.assertEqual(registry.get_sample_value("spotinst_autoscaler_api_call_duration_seconds_count",
+                                                   {"api": "test_api"}), count_before + 1)
+
+    def test_push_metrics(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.PUT, "http://pushgateway:9091/metrics/job/test_job", body="", status=200)
+        enable_metrics()
+        ERRORS.labels(stage="test_stage").inc()
+        push_metrics("pushgateway:9091", job="test_job")
+        self.assertIn("spotinst_autoscaler_errors_total{stage=\"test_stage\"}",
+                      httpretty.last_request().body.decode())
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_push_metrics_failure_does_not_raise(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.PUT, "http://pushgateway:9091/metrics/job/test_job", body="", status=500)
+        push_metrics("pushgateway:9091", job="test_job")
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_exposing_metrics_without_prometheus_client_raises_import_error(self):
+        with mock.patch("spotinst_kubernetes_cluster_autoscaler.metrics.REGISTRY", None), \
+                mock.patch.dict("sys.modules", {"prometheus_client": None}):
+            with self.assertRaises(ImportError):
+                start_metrics_server(9090)
+            with self.assertRaises(ImportError):
+                push_metrics("pushgateway:9091", job="test_job")
+
+    def test_timed_phase_adds_up_in_run_timings(self):
+        reset_run_timings()
+        with timed_phase("test_phase"):
+            pass
+        with timed_phase("test_phase"):
+            pass
+        self.assertEqual(run_timings["test_phase"][0], 2)
+        self.assertRegex(run_timings_summary(), r"^test_phase \d+\.\d{3}s \(x2\)$")
+        reset_run_timings()
+        self.assertEqual(run_timings_summary(), "")
+
+    def test_timed_names_phase_after_function(self):
+        class TestClass:
+            @timed
+            def test_method(self, value):
+                return value
+
+        reset_run_timings()
+        self.assertEqual(TestClass().test_method(5), 5)
+        self.assertEqual(list(run_timings.keys()), ["BaseTests.test_timed_names_phase_after_function.<locals>."
+                                                    "TestClass.test_method"])
+
+    def test_importing_main_logic_flow_does_not_import_prometheus_client(self):
+        imported = subprocess.run([sys.executable, "-c", "import sys\n"
+                                   "import spotinst_kubernetes_cluster_autoscaler.main_logic_flow\n"
+                                   "print('prometheus_client' in sys.modules)"],
+                                  capture_output=True, text=True, check=True).stdout
+        self.assertEqual(imported.strip(), "False")
@@ -0,0 +1,30 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.concurrent_collection import run_concurrently
+from spotinst_kubernetes_cluster_autoscaler.profiling import *
+import os
+import pstats
+import tempfile
+
+
+def worker_thread_call():
+    return sum(range(1000))
+
+
+class BaseTests(TestCase):
+
+    def test_profile_in_thread_returns_call_as_is_when_not_profiling(self):
+        self.assertIs(profile_in_thread(worker_thread_call), worker_thread_call)
+
+    def test_profiled_run_merges_worker_thread_profiles(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "profile.pstats")
+            with profiled_run(output_path):
+                results = run_concurrently({"worker_thread_call": worker_thread_call})
+            self.assertEqual(results["worker_thread_call"], 499500)
+            profiled_functions = [function_name for _, _, function_name in pstats.Stats(output_path).stats.keys()]
+            self.assertIn("worker_thread_call", profiled_functions)
+            self.assertIn("run_concurrently", profiled_functions)
+
+    def test_profiled_run_not_profiling_without_output_path(self):
+        with profiled_run(None):
+            self.assertIs(profile_in_thread(worker_thread_call), worker_thread_call)
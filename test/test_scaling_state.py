@@ -0,0 +1,64 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.scaling_state import *
+from spotinst_kubernetes_cluster_autoscaler.utilization_history import FileHistoryStore
+import os
+import tempfile
+
+
+class BaseTests(TestCase):
+
+    def test_in_flight_nodes_until_they_join(self):
+        scaling_state = ScalingState()
+        scaling_state.record_scale_up("sig-123", 6, timestamp=1000)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 4, now=1060), 2)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 6, now=1120), 0)
+        # once all joined the scale up is forgotten so nodes lost later aren't mistaken for nodes still joining
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 4, now=1180), 0)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-456", 4, now=1180), 0)
+
+    def test_in_flight_nodes_expire_after_node_boot_timeout(self):
+        scaling_state = ScalingState(node_boot_timeout_seconds=600)
+        scaling_state.record_scale_up("sig-123", 6, timestamp=1000)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 4, now=1500), 2)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 4, now=1700), 0)
+
+    def test_scale_down_cancels_in_flight_nodes_above_it(self):
+        scaling_state = ScalingState()
+        scaling_state.record_scale_up("sig-123", 6, timestamp=1000)
+        scaling_state.record_scale_down("sig-123", 5, timestamp=1060)
+        self.assertEqual(scaling_state.in_flight_nodes("sig-123", 4, now=1120), 1)
+
+    def test_in_stabilization_window(self):
+        scaling_state = ScalingState()
+        self.assertFalse(scaling_state.in_stabilization_window("sig-123", "scale_up", 300, now=1000))
+        scaling_state.record_scale_up("sig-123", 6, timestamp=1000)
+        self.assertTrue(scaling_state.in_stabilization_window("sig-123", "scale_up", 300, now=1200))
+        self.assertFalse(scaling_state.in_stabilization_window("sig-123", "scale_up", 0, now=1200))
+        # a scale down waits for the last scale up too
+        self.assertTrue(scaling_state.in_stabilization_window("sig-123", "scale_down", 300, now=1200))
+        self.assertFalse(scaling_state.in_stabilization_window("sig-123", "scale_down", 300, now=1400))
+        scaling_state.record_scale_down("sig-123", 5, timestamp=1400)
+        self.assertTrue(scaling_state.in_stabilization_window("sig-123", "scale_down", 300, now=1500))
+        self.assertFalse(scaling_state.in_stabilization_window("sig-123", "scale_up", 300, now=1500))
+        with self.assertRaises(ValueError):
+            scaling_state.in_stabilization_window("sig-123", "scale_sideways", 300)
+
+    def test_save_and_load_file_store(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = FileHistoryStore(os.path.join(temp_dir, "scaling_state.json"))
+            scaling_state = ScalingState(store=store)
+            scaling_state.record_scale_up("sig-123", 6, timestamp=1000)
+            scaling_state.save()
+            loaded_scaling_state = ScalingState(store=store)
+            loaded_scaling_state.load()
+        self.assertEqual(loaded_scaling_state.in_flight_nodes("sig-123", 4, now=1060), 2)
+        self.assertTrue(loaded_scaling_state.in_stabilization_window("sig-123", "scale_up", 300, now=1060))
+
+    def test_load_corrupt_state_starts_over(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_path = os.path.join(temp_dir, "scaling_state.json")
+            with open(state_path, "w") as state_file:
+                state_file.write("not json")
+            scaling_state = ScalingState(store=FileHistoryStore(state_path))
+            scaling_state.load()
+        self.assertEqual(scaling_state.groups, {})
@@ -0,0 +1,93 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.snapshot_recording import *
+from kubernetes import client
+import httpretty
+import tempfile
+
+TEST_POD = {
+    "metadata": {"name": "test", "namespace": "default", "creationTimestamp": "2021-05-26T08:00:00Z",
+                 "annotations": {"kubernetes.io/config.mirror": "abc", "secret-annotation": "value"},
+                 "ownerReferences": [{"apiVersion": "apps/v1", "kind": "DaemonSet", "name": "test", "uid": "1"}],
+                 "managedFields": [{"manager": "kubelet"}]},
+    "spec": {"nodeName": "node-1", "containers": [{"name": "test", "image": "test:1", "env": [
+        {"name": "PASSWORD", "value": "secret"}], "resources": {"requests": {"cpu": "100m", "memory": "100Mi"}}}]},
+    "status": {"phase": "Running", "podIP": "10.0.0.1", "conditions": [
+        {"type": "PodScheduled", "status": "True", "lastTransitionTime": "2021-05-26T08:00:00Z"}]}
+}
+TEST_NODE = {"metadata": {"name": "node-1", "labels": {"node-group": "general"}, "uid": "1"},
+             "status": {"allocatable": {"cpu": "1000m", "memory": "5000Mi"}, "nodeInfo": {"kernelVersion": "5"}}}
+
+
+class BaseTests(TestCase):
+
+    def test_prune_pod_keeps_only_what_is_read(self):
+        pruned_pod = prune_pod(TEST_POD)
+        self.assertEqual(pruned_pod["spec"]["containers"], [{"name": "test", "resources": {
+            "requests": {"cpu": "100m", "memory": "100Mi"}}}])
+        self.assertEqual(pruned_pod["metadata"]["annotations"], {"kubernetes.io/config.mirror": "abc"})
+        self.assertEqual(pruned_pod["metadata"]["ownerReferences"], [{"kind": "DaemonSet"}])
+        self.assertNotIn("managedFields", pruned_pod["metadata"])
+        self.assertNotIn("podIP", pruned_pod["status"])
+        self.assertNotIn("secret", json.dumps(pruned_pod))
+
+    def test_prune_node_keeps_only_what_is_read(self):
+        self.assertEqual(prune_node(TEST_NODE), {"metadata": {"name": "node-1", "labels": {"node-group": "general"}},
+                                                 "status": {"allocatable": {"cpu": "1000m", "memory": "5000Mi"}}})
+
+    def test_snapshot_recorder_save_and_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recorder = SnapshotRecorder(temp_dir)
+            model_node = client.V1Node(metadata=client.V1ObjectMeta(name="node-1", labels={"node-group": "general"}),
+                                       status=client.V1NodeStatus(allocatable={"cpu": "1", "memory": "1Gi"}))
+            self.assertEqual(list(recorder.record_nodes(iter([model_node]))), [model_node])
+            self.assertEqual(len(list(recorder.record_pods("Running", iter([RawKubeObject(TEST_POD)])))), 1)
+            recorder.record_node_metrics({"items": [{"metadata": {"name": "node-1", "uid": "1"},
+                                                     "usage": {"cpu": "500m", "memory": "1000Mi"}}]})
+            recorder.record_desired_capacity("sig-123", 5)
+            recording = load_recording(recorder.save())
+        self.assertEqual(recording["nodes"], [{"metadata": {"name": "node-1", "labels": {"node-group": "general"}},
+                                               "status": {"allocatable": {"cpu": "1", "memory": "1Gi"}}}])
+        self.assertEqual(recording["pods"]["Running"], [prune_pod(TEST_POD)])
+        self.assertEqual(recording["node_metrics"], {"items": [{"metadata": {"name": "node-1"},
+                                                                "usage": {"cpu": "500m", "memory": "1000Mi"}}]})
+        self.assertEqual(recording["desired_capacity"], {"sig-123": 5})
+
+    def test_snapshot_recorder_start_forgets_previous_run(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recorder = SnapshotRecorder(temp_dir)
+            recorder.record_desired_capacity("sig-123", 5)
+            recorder.start()
+            self.assertEqual(recorder.desired_capacity, {})
+
+    def test_recorded_cluster_lists_like_a_watch_cache(self):
+        pending_pod = prune_pod(dict(TEST_POD, status={"phase": "Pending"}))
+        recorded_cluster = RecordedCluster({
+            "recorded_at": "2021-05-26T09:00:00+00:00",
+            "nodes": [prune_node(TEST_NODE)],
+            "pods": {"Running": [prune_pod(TEST_POD)], "Pending": [pending_pod]},
+            "node_metrics": None,
+            "desired_capacity": {"sig-123": 5}
+        })
+        self.assertEqual(len(recorded_cluster.list_nodes(label_selector="node-group=general")), 1)
+        self.assertEqual(len(recorded_cluster.list_nodes(label_selector="node-group=memory")), 0)
+        self.assertEqual(recorded_cluster.list_pods(phase="Running")[0].spec.node_name, "node-1")
+        self.assertEqual(len(recorded_cluster.list_pods(phase="Pending")), 1)
+        self.assertEqual(recorded_cluster.list_cluster_custom_object("metrics.k8s.io", "v1beta1", "nodes"),
+                         {"items": []})
+        recorded_cluster.node_metrics = {"items": [{"metadata": {"name": "node-1"}, "usage": {"cpu": "1"}},
+                                                   {"metadata": {"name": "node-2"}, "usage": {"cpu": "1"}}]}
+        self.assertEqual(recorded_cluster.list_cluster_custom_object("metrics.k8s.io", "v1beta1", "nodes",
+                                                                     label_selector="node-group=general"),
+                         {"items": [{"metadata": {"name": "node-1"}, "usage": {"cpu": "1"}}]})
+        self.assertEqual(recorded_cluster.recorded_at.year, 2021)
+
+    def test_replay_spotinst_scale_never_calls_the_api(self):
+        httpretty.enable(allow_net_connect=False)
+        spotinst_connection = ReplaySpotinstScale(recorded_desired_capacity=5, auth_token="replay",
+                                                  elastigroup="sig-123", spotinst_account="act-123", min_nodes=2,
+                                                  max_nodes=7)
+        self.assertEqual(spotinst_connection.scale_up(4), 7)
+        self.assertEqual(spotinst_connection.resized_to, 7)
+        self.assertEqual(spotinst_connection.scale_down(10), 2)
+        httpretty.disable()
+        httpretty.reset()
@@ -1,6 +1,7 @@
 from unittest import TestCase
 from spotinst_kubernetes_cluster_autoscaler.spotinst_scale import *
 import httpretty
+import time
 
 TEST_TOKEN = "my_auth_token_123"
 TEST_ELASTIGROUP = "sig-1234567"
@@ -22,17 +23,17 @@ class BaseTests(TestCase):
                          "/instanceHealthiness?accountId=" + TEST_ACCOUNT_ID)
         self.assertEqual(spotinst_connection.headers, expected_headers)
 
-    def test_SpotinstScale_get_spotinst_instances(self):
+    def test_SpotinstScale_get_spotinst_desired_capacity_custom_api_url(self):
         httpretty.enable()
-        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness" + "?accountId=" + TEST_ACCOUNT_ID,
-                               body='{"response": {"count": 5}}')
+        httpretty.register_uri(httpretty.GET, "http://spotinst-proxy:8080/aws/ec2/group/" + TEST_ELASTIGROUP,
+                               body='{"response": {"items": [{"capacity": {"target": 7}}]}}')
         spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
-                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID)
-        response = spotinst_connection.get_spotinst_instances()
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID,
+                                            api_url="http://spotinst-proxy:8080")
+        response = spotinst_connection.get_spotinst_desired_capacity()
         httpretty.disable()
         httpretty.reset()
-        self.assertEqual(response, 5)
+        self.assertEqual(response, 7)
 
     def test_SpotinstScale_set_spotinst_elastigroup_size(self):
         httpretty.enable()
@@ -63,8 +64,8 @@ class BaseTests(TestCase):
     def test_SpotinstScale_get_spotinst_scale_up(self):
         httpretty.enable()
         httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness" + "?accountId=" + TEST_ACCOUNT_ID,
-                               body='{"response": {"count": 4}}')
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 4}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
                                "?accountId=" + TEST_ACCOUNT_ID, body='{"response": {"count": 6}}', status=200)
         spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
@@ -77,8 +78,8 @@ class BaseTests(TestCase):
     def test_SpotinstScale_get_spotinst_scale_down(self):
         httpretty.enable()
         httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
-                               "/instanceHealthiness" + "?accountId=" + TEST_ACCOUNT_ID,
-                               body='{"response": {"count": 6}}')
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 6}}]}}')
         httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
                                "?accountId=" + TEST_ACCOUNT_ID, body='{"response": {"count": 6}}', status=200)
         spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
@@ -87,3 +88,138 @@ class BaseTests(TestCase):
         self.assertEqual(response, 4)
         httpretty.disable()
         httpretty.reset()
+
+    def test_SpotinstScale_get_spotinst_desired_capacity_retries_on_server_error(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               responses=[httpretty.Response(body='{"error": "unavailable"}', status=503),
+                                          httpretty.Response(body='{"response": {"items": [{"capacity": '
+                                                                  '{"target": 5}}]}}', status=200)])
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID, backoff_factor=0)
+        response = spotinst_connection.get_spotinst_desired_capacity()
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+        httpretty.disable()
+        httpretty.reset()
+        self.assertEqual(response, 5)
+
+    def test_SpotinstScale_get_spotinst_desired_capacity_raise_error_after_retries(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"error": "unavailable"}', status=503)
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID, retries=2,
+                                            backoff_factor=0)
+        with self.assertRaises(Exception):
+            spotinst_connection.get_spotinst_desired_capacity()
+        self.assertEqual(len(httpretty.latest_requests()), 3)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_SpotinstScale_uses_a_single_session(self):
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID, connect_timeout=1,
+                                            read_timeout=2)
+        self.assertIsInstance(spotinst_connection.session, requests.Session)
+        self.assertEqual(spotinst_connection.session.headers["authorization"], "Bearer " + TEST_TOKEN)
+        self.assertEqual(spotinst_connection.timeout, (1, 2))
+
+    def test_SpotinstScale_get_spotinst_desired_capacity(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"minimum": 2, "maximum": 100, '
+                                    '"target": 7}}]}}')
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID)
+        response = spotinst_connection.get_spotinst_desired_capacity()
+        httpretty.disable()
+        httpretty.reset()
+        self.assertEqual(response, 7)
+
+    def test_SpotinstScale_scale_up_tracks_desired_capacity(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 4}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID, body='{}', status=200)
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID)
+        self.assertEqual(spotinst_connection.scale_up(2), 6)
+        self.assertEqual(spotinst_connection.scale_up(1), 7)
+        self.assertEqual(spotinst_connection.scale_down(1), 6)
+        get_requests = [request for request in httpretty.latest_requests() if request.method == "GET"]
+        self.assertEqual(len(get_requests), 1)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_SpotinstScale_get_desired_capacity_trusts_own_resize_until_stale(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 4}}]}}')
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID)
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID, body='{}', status=200)
+        spotinst_connection.set_spotinst_elastigroup_size(9)
+        requests_count = len(httpretty.latest_requests())
+        # the nodes of the resize are still joining the cluster but the size it was set to is still trusted
+        self.assertEqual(spotinst_connection.get_desired_capacity(), 9)
+        self.assertEqual(len(httpretty.latest_requests()), requests_count)
+        spotinst_connection.desired_capacity_updated_at = time.monotonic() - 301
+        self.assertEqual(spotinst_connection.get_desired_capacity(), 4)
+        self.assertEqual(httpretty.last_request().method, "GET")
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_SpotinstScale_get_desired_capacity_refetch_when_stale(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 4}}]}}')
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=100, spotinst_account=TEST_ACCOUNT_ID,
+                                            capacity_max_age_seconds=60)
+        spotinst_connection.desired_capacity = 9
+        spotinst_connection.desired_capacity_updated_at = time.monotonic() - 61
+        self.assertEqual(spotinst_connection.get_desired_capacity(), 4)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_SpotinstScale_scale_up_capped_at_max_nodes(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 8}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID, body='{}', status=200)
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=10, spotinst_account=TEST_ACCOUNT_ID)
+        self.assertEqual(spotinst_connection.scale_up(5), 10)
+        self.assertIn('"target": 10,', httpretty.last_request().body.decode())
+        requests_count = len(httpretty.latest_requests())
+        self.assertEqual(spotinst_connection.scale_up(5), 10)
+        self.assertEqual(len(httpretty.latest_requests()), requests_count)
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_SpotinstScale_scale_down_floored_at_min_nodes(self):
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID,
+                               body='{"response": {"items": [{"capacity": {"target": 4}}]}}')
+        httpretty.register_uri(httpretty.PUT, "https://api.spotinst.io/aws/ec2/group/" + TEST_ELASTIGROUP +
+                               "?accountId=" + TEST_ACCOUNT_ID, body='{}', status=200)
+        spotinst_connection = SpotinstScale(auth_token=TEST_TOKEN, elastigroup=TEST_ELASTIGROUP, min_nodes=2,
+                                            max_nodes=10, spotinst_account=TEST_ACCOUNT_ID)
+        self.assertEqual(spotinst_connection.scale_down(5), 2)
+        self.assertIn('"target": 2,', httpretty.last_request().body.decode())
+        requests_count = len(httpretty.latest_requests())
+        self.assertEqual(spotinst_connection.scale_down(1), 2)
+        self.assertEqual(len(httpretty.latest_requests()), requests_count)
+        httpretty.disable()
+        httpretty.reset()
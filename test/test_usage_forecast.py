@@ -0,0 +1,24 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.usage_forecast import *
+
+
+class BaseTests(TestCase):
+
+    def test_linear_trend_forecast(self):
+        self.assertAlmostEqual(linear_trend_forecast([0, 60, 120], [40, 50, 60], 240), 100)
+        self.assertEqual(linear_trend_forecast([0], [40], 240), 40)
+        self.assertEqual(linear_trend_forecast([60, 60], [40, 50], 240), 50)
+
+    def test_holt_forecast(self):
+        self.assertAlmostEqual(holt_forecast([0, 60, 120, 180], [40, 50, 60, 70], 240), 110)
+        self.assertEqual(holt_forecast([0], [40], 240), 40)
+        self.assertAlmostEqual(holt_forecast([0, 60, 120], [50, 50, 50], 240), 50)
+
+    def test_forecast_usage(self):
+        samples = [(0, 40, 30), (60, 50, 30), (120, 60, 30)]
+        self.assertEqual(forecast_usage(samples, method="linear", horizon_seconds=240), (100, 30))
+        self.assertEqual(forecast_usage([(0, 40, 30), (60, 10, 30), (120, 0, 30)], method="linear",
+                                        horizon_seconds=240), (0, 30))
+        self.assertIsNone(forecast_usage([], method="linear", horizon_seconds=240))
+        with self.assertRaises(ValueError):
+            forecast_usage(samples, method="arima", horizon_seconds=240)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+from spotinst_kubernetes_cluster_autoscaler.utilization_history import *
+import tempfile
+import httpretty
+
+kube_test_token = os.getenv("TEST_TOKEN", "test")
+kube_test_api = os.getenv("TEST_API_ENDPOINT", "https://test:443")
+
+
+class BaseTests(TestCase):
+
+    def test_ewma(self):
+        self.assertEqual(ewma([10], 0.5), 10)
+        self.assertEqual(ewma([10, 20, 40], 0.5), 27.5)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([30, 10, 20], 50), 20)
+        self.assertEqual(percentile([10, 20], 50), 15)
+        self.assertEqual(percentile([10, 20, 30, 40, 50], 100), 50)
+        self.assertEqual(percentile([10, 20, 30, 40, 50], 0), 10)
+
+    def test_UtilizationHistory_ring_buffer(self):
+        usage_history = UtilizationHistory(max_samples=3)
+        for index in range(5):
+            usage_history.add_sample("sig-123", index, index * 10, timestamp=1000 + index)
+        self.assertEqual([sample[1] for sample in usage_history.samples["sig-123"]], [2, 3, 4])
+
+    def test_UtilizationHistory_window_samples(self):
+        usage_history = UtilizationHistory(window_seconds=60)
+        usage_history.add_sample("sig-123", 90, 90, timestamp=1000)
+        usage_history.add_sample("sig-123", 10, 10, timestamp=1100)
+        self.assertEqual(usage_history.window_samples("sig-123", now=1120), [(1100, 10, 10)])
+        self.assertEqual(usage_history.window_samples("sig-456", now=1120), [])
+
+    def test_UtilizationHistory_smoothed_usage(self):
+        usage_history = UtilizationHistory()
+        for timestamp, cpu in ((1000, 40), (1060, 40), (1120, 100)):
+            usage_history.add_sample("sig-123", cpu, 50, timestamp=timestamp)
+        self.assertEqual(usage_history.smoothed_usage("sig-123", method=None, now=1130), (100, 50))
+        self.assertEqual(usage_history.smoothed_usage("sig-123", method="ewma", ewma_alpha=0.3, now=1130), (58, 50))
+        self.assertEqual(usage_history.smoothed_usage("sig-123", method="percentile", usage_percentile=50,
+                                                      now=1130), (40, 50))
+        self.assertIsNone(usage_history.smoothed_usage("sig-456", now=1130))
+        with self.assertRaises(ValueError):
+            usage_history.smoothed_usage("sig-123", method="median", now=1130)
+
+    def test_UtilizationHistory_file_store_round_trip(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = FileHistoryStore(os.path.join(temp_dir, "history.json"))
+            usage_history = UtilizationHistory(store=store)
+            usage_history.load()
+            usage_history.add_sample("sig-123", 10, 20, timestamp=1000)
+            usage_history.save()
+            loaded_usage_history = UtilizationHistory(store=store)
+            loaded_usage_history.load()
+        self.assertEqual(list(loaded_usage_history.samples["sig-123"]), [(1000, 10, 20)])
+
+    def test_UtilizationHistory_load_corrupt_history(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            history_path = os.path.join(temp_dir, "history.json")
+            with open(history_path, "w") as history_file:
+                history_file.write("not json")
+            usage_history = UtilizationHistory(store=FileHistoryStore(history_path))
+            usage_history.load()
+        self.assertEqual(usage_history.samples, {})
+
+    def test_ConfigMapHistoryStore_creates_missing_config_map(self):
+        httpretty.enable()
+        config_map_uri = kube_test_api + "/api/v1/namespaces/default/configmaps"
+        httpretty.register_uri(httpretty.GET, config_map_uri + "/history", status=404, body='{}')
+        httpretty.register_uri(httpretty.PUT, config_map_uri + "/history", status=404, body='{}')
+        httpretty.register_uri(httpretty.POST, config_map_uri, status=201, body='{}')
+        kube_config_object = client.Configuration()
+        kube_config_object.host = kube_test_api
+        kube_config_object.verify_ssl = False
+        v1 = client.CoreV1Api(client.ApiClient(kube_config_object))
+        store = ConfigMapHistoryStore(v1, name="history", namespace="default")
+        self.assertIsNone(store.read())
+        store.write('{"sig-123": []}')
+        self.assertEqual(httpretty.last_request().method, "POST")
+        self.assertEqual(json.loads(httpretty.last_request().body)["data"], {"history.json": '{"sig-123": []}'})
+        httpretty.disable()
+        httpretty.reset()